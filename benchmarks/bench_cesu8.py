@@ -0,0 +1,51 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Encoding and decoding of text with the CESU-8 codec"""
+
+import codecs
+import functools
+###
+import pyhdb.cesu8  # registers the codec
+from benchmarks.runner import register
+from pyhdb.compat import unichr
+
+NUM_CHARS = 10000
+
+TEXTS = (
+    ('ascii', u'pyhdb speaks cesu-8 '),
+    # Characters of the basic multilingual plane, encoded like in UTF-8
+    ('bmp', u'Gr\u00fc\u00dfe \u4f60\u597d \u0417\u0434\u0440\u0430\u0432\u0441\u0442\u0432\u0443\u0439 '),
+    # Characters outside of the BMP, encoded as surrogate pairs of 6 bytes
+    ('supplementary', u'emoji %s%s ' % (unichr(0x1F600), unichr(0x1F680))),
+)
+
+
+def build_text(sample, num_chars):
+    return (sample * (num_chars // len(sample) + 1))[:num_chars]
+
+
+def encode(sample):
+    text = build_text(sample, NUM_CHARS)
+    return functools.partial(codecs.encode, text, 'cesu-8'), len(text)
+
+
+def decode(sample):
+    text = build_text(sample, NUM_CHARS)
+    return functools.partial(codecs.decode, codecs.encode(text, 'cesu-8'), 'cesu-8'), len(text)
+
+
+for name, sample in TEXTS:
+    register('cesu8.encode[%s]' % name, functools.partial(encode, sample), unit='chars')
+    register('cesu8.decode[%s]' % name, functools.partial(decode, sample), unit='chars')
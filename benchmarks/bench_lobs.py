@@ -0,0 +1,128 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Decoding, reading and appending of LOB data"""
+
+import functools
+###
+from benchmarks.runner import register
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol import lobs
+from pyhdb.protocol.constants import type_codes
+from pyhdb.protocol.headers import ReadLobHeader
+from pyhdb.testing.server import READ_LOB_HEADER_STRUCT, FakeTable
+
+# Size of LOB data included in a result set
+CHUNK_SIZE = 64 * 2**10
+# Size of a LOB read in pieces
+LOB_SIZE = 2**20
+READ_SIZE = 4096
+# Number of items per READLOB request when reading missing data
+READLOB_SIZE = 64 * 2**10
+
+LOB_TYPES = (
+    ('BLOB', type_codes.BLOB),
+    ('CLOB', type_codes.CLOB),
+    ('NCLOB', type_codes.NCLOB),
+)
+
+
+def build_lob_data(type_code, length):
+    """Return synthetic LOB data (bytes or text) of the given length"""
+    return FakeTable([('DATA', type_code, length)], 1).row(0)[0]
+
+
+def _encode(type_code, data):
+    if type_code == type_codes.BLOB:
+        return data
+    return data.encode(lobs.LOB_TYPE_CODE_MAP[type_code].encoding)
+
+
+def build_lob_payload(type_code, data, chunk_length, is_last_data=True):
+    """Pack a LOB into the format of result sets including the first chunk_length items of data"""
+    chunk = _encode(type_code, data[:chunk_length])
+    options = ReadLobHeader.LOB_OPTION_DATAINCLUDED
+    if is_last_data:
+        options |= ReadLobHeader.LOB_OPTION_LASTDATA
+    return READ_LOB_HEADER_STRUCT.pack(ReadLobHeader.LOB_TYPES[type_code], options, b"\x00\x00", len(data),
+                                       len(_encode(type_code, data)), b"\x00" * 8, len(chunk)) + chunk
+
+
+class _InMemoryLobMixin(object):
+    """Serve READLOB requests from memory instead of a database"""
+    encoded_data = None
+
+    def _make_read_lob_request(self, readoffset, readlength):
+        return self.encoded_data[readoffset:readoffset + readlength]
+
+
+class _InMemoryBlob(_InMemoryLobMixin, lobs.Blob):
+    pass
+
+
+class _InMemoryClob(_InMemoryLobMixin, lobs.Clob):
+    pass
+
+
+class _InMemoryNClob(_InMemoryLobMixin, lobs.NClob):
+    """NCLOB offsets count characters, so the data is kept as text and encoded on request"""
+
+    def _make_read_lob_request(self, readoffset, readlength):
+        return self.encoded_data[readoffset:readoffset + readlength].encode(self.encoding)
+
+
+IN_MEMORY_LOB_CLASSES = {
+    type_codes.BLOB: _InMemoryBlob,
+    type_codes.CLOB: _InMemoryClob,
+    type_codes.NCLOB: _InMemoryNClob,
+}
+
+
+def from_payload(type_code):
+    data = build_lob_data(type_code, CHUNK_SIZE)
+    payload = build_lob_payload(type_code, data, CHUNK_SIZE)
+
+    def run():
+        lobs.from_payload(type_code, BufferReader(payload), None)
+    return run, len(payload)
+
+
+def read(type_code):
+    lob = lobs.LOB_TYPE_CODE_MAP[type_code](build_lob_data(type_code, LOB_SIZE))
+
+    def run():
+        lob.seek(0)
+        while lob.read(READ_SIZE):
+            pass
+    return run, len(_encode(type_code, lob.getvalue()))
+
+
+def read_missing(type_code):
+    data = build_lob_data(type_code, LOB_SIZE)
+    header_payload = build_lob_payload(type_code, data, 0, is_last_data=False)
+    _LobClass = IN_MEMORY_LOB_CLASSES[type_code]
+    encoded_data = data if type_code == type_codes.NCLOB else _encode(type_code, data)
+
+    def run():
+        lob = _LobClass(u'' if type_code != type_codes.BLOB else b'', ReadLobHeader(BufferReader(header_payload)))
+        lob.encoded_data = encoded_data
+        while lob.read(READLOB_SIZE):
+            pass
+    return run, len(_encode(type_code, data))
+
+
+for name, type_code in LOB_TYPES:
+    register('lobs.from_payload[%s]' % name, functools.partial(from_payload, type_code), unit='bytes')
+    register('lobs.read[%s]' % name, functools.partial(read, type_code), unit='bytes')
+    register('lobs.read_missing[%s]' % name, functools.partial(read_missing, type_code), unit='bytes')
@@ -0,0 +1,78 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Packing of executemany() parameter rows with Parameters.pack_data()"""
+
+import functools
+import collections
+###
+from benchmarks.runner import register
+from pyhdb.cursor import PreparedStatement
+from pyhdb.protocol.constants import parameter_direction
+from pyhdb.protocol.parts import Parameters
+from pyhdb.testing.server import FakeTable
+
+NUM_ROWS = 1000
+# Large enough for all rows, so that a single call packs all of them
+REMAINING_SIZE = 2**30
+
+ParameterMetadata = collections.namedtuple('ParameterMetadata', 'mode datatype iotype id length fraction')
+
+NARROW_COLUMNS = (
+    ('ID', 'INTEGER'),
+    ('NAME', 'NVARCHAR', 32),
+)
+
+WIDE_COLUMNS = (
+    ('ID', 'BIGINT'),
+    ('AMOUNT', 'INTEGER'),
+    ('PRICE', 'DECIMAL', 18, 2),
+    ('RATE', 'DOUBLE'),
+    ('NAME', 'NVARCHAR', 40),
+    ('HASH', 'VARBINARY', 16),
+    ('DAY', 'DATE'),
+    ('CREATED', 'TIMESTAMP'),
+)
+
+LOB_COLUMNS = (
+    ('ID', 'INTEGER'),
+    ('DATA', 'BLOB', 1024),
+)
+
+
+def build_statement(columns, num_rows):
+    """Build a prepared statement with synthetic parameter rows
+    :returns: tuple (statement, rows)
+    """
+    table = FakeTable(columns, num_rows)
+    params_metadata = tuple(
+        ParameterMetadata(0, column.type_code, parameter_direction.IN, index, column.length, column.fraction)
+        for index, column in enumerate(table.columns)
+    )
+    statement = PreparedStatement(None, b"\x00" * 8, params_metadata, None)
+    rows = [tuple(table.row(index)) for index in range(num_rows)]
+    return statement, rows
+
+
+def pack_data(columns):
+    statement, rows = build_statement(columns, NUM_ROWS)
+
+    def run():
+        Parameters(statement.prepare_parameters(rows)).pack_data(REMAINING_SIZE)
+    return run, NUM_ROWS
+
+
+register('parameters.pack_data[narrow]', functools.partial(pack_data, NARROW_COLUMNS))
+register('parameters.pack_data[wide]', functools.partial(pack_data, WIDE_COLUMNS))
+register('parameters.pack_data[lob]', functools.partial(pack_data, LOB_COLUMNS))
@@ -0,0 +1,86 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parsing of reply messages into segments and parts
+
+The replies are recorded once from a session with the fake server, so they have exactly the wire format of
+the protocol implementation.
+"""
+
+import functools
+###
+from benchmarks.runner import register
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol.message import ReplyMessage
+from pyhdb.protocol.segments import ReplySegment
+from pyhdb.protocol.parts import Part
+from pyhdb.testing import FakeHanaServer, FakeTable, RecordingConnection
+
+NUM_ROWS = 1000
+NUM_STATEMENTS = 500
+
+COLUMNS = (
+    ('ID', 'BIGINT'),
+    ('PRICE', 'DECIMAL', 18, 2),
+    ('NAME', 'NVARCHAR', 40),
+    ('CREATED', 'TIMESTAMP'),
+)
+
+_replies = {}
+
+
+def recorded_replies():
+    """Record the replies of a query and of a batch of statements
+    :returns: dictionary mapping 'select' and 'batch' to a (MessageHeader, payload) tuple
+    """
+    if not _replies:
+        tables = {'ITEMS': FakeTable(COLUMNS, NUM_ROWS)}
+        with FakeHanaServer(tables, fetch_size=NUM_ROWS) as server:
+            connection = RecordingConnection(server.host, server.port, server.user, server.password)
+            connection.connect()
+            cursor = connection.cursor()
+            cursor.execute("SELECT * FROM ITEMS")
+            cursor.execute_batch(["DELETE FROM ITEMS"] * NUM_STATEMENTS)
+            connection.close()
+        # Authenticate, connect, select, batch, disconnect
+        messages = [(header, payload.tobytes()) for header, payload in connection.recording.messages()]
+        _replies['select'] = messages[2]
+        _replies['batch'] = messages[3]
+    return _replies
+
+
+def unpack_reply(name):
+    header, payload = recorded_replies()[name]
+    reply = ReplyMessage.unpack_reply(header, BufferReader(payload))
+    return functools.partial(_unpack_reply, header, payload), len(reply.segments)
+
+
+def _unpack_reply(header, payload):
+    ReplyMessage.unpack_reply(header, BufferReader(payload))
+
+
+def unpack_parts(name):
+    header, payload = recorded_replies()[name]
+    segment = ReplyMessage.unpack_reply(header, BufferReader(payload)).segments[0]
+    segment_payload = payload[ReplySegment.header_size:segment.header.segment_length]
+    num_parts = segment.header.num_parts
+
+    def run():
+        tuple(Part.unpack_from(BufferReader(segment_payload), num_parts))
+    return run, num_parts
+
+
+register('parsing.unpack_reply[select]', functools.partial(unpack_reply, 'select'), unit='segments')
+register('parsing.unpack_reply[batch]', functools.partial(unpack_reply, 'batch'), unit='segments')
+register('parsing.Part.unpack_from[select]', functools.partial(unpack_parts, 'select'), unit='parts')
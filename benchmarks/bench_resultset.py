@@ -0,0 +1,111 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Decoding of result set rows with ResultSet.unpack_rows()"""
+
+import functools
+import collections
+###
+from benchmarks.runner import register
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol import types
+from pyhdb.protocol.parts import ResultSet
+from pyhdb.protocol.decoding import row_decoder
+from pyhdb.testing.server import FakeTable, pack_value
+
+NUM_ROWS = 10000
+
+# One single column result set per type class
+COLUMNS = (
+    ('TINYINT', 'TINYINT'),
+    ('SMALLINT', 'SMALLINT'),
+    ('INT', 'INTEGER'),
+    ('BIGINT', 'BIGINT'),
+    ('DECIMAL', 'DECIMAL', 18, 2),
+    ('REAL', 'REAL'),
+    ('DOUBLE', 'DOUBLE'),
+    ('NVARCHAR', 'NVARCHAR', 32),
+    ('VARBINARY', 'VARBINARY', 16),
+    ('DATE', 'DATE'),
+    ('TIME', 'TIME'),
+    ('TIMESTAMP', 'TIMESTAMP'),
+)
+
+# Typical row of a wide table, every tenth value is NULL
+MIXED_COLUMNS = (
+    ('ID', 'BIGINT'),
+    ('AMOUNT', 'INTEGER'),
+    ('PRICE', 'DECIMAL', 18, 2),
+    ('RATE', 'DOUBLE'),
+    ('NAME', 'NVARCHAR', 40),
+    ('CODE', 'VARCHAR', 8),
+    ('HASH', 'VARBINARY', 16),
+    ('DAY', 'DATE'),
+    ('CREATED', 'TIMESTAMP'),
+)
+NULL_EVERY = 10
+
+# Row of a fact table with fixed width columns only
+FIXED_COLUMNS = (
+    ('ID', 'BIGINT'),
+    ('CUSTOMER', 'INTEGER'),
+    ('PRODUCT', 'INTEGER'),
+    ('QUANTITY', 'INTEGER'),
+    ('PRICE', 'DOUBLE'),
+    ('DISCOUNT', 'DOUBLE'),
+    ('DAY', 'DATE'),
+    ('CREATED', 'TIMESTAMP'),
+)
+
+
+def build_resultset(columns, num_rows, null_every=None):
+    """Build the payload of a result set part with synthetic rows
+    :returns: tuple (payload, column_types)
+    """
+    table = FakeTable(columns, num_rows)
+    values = []
+    for index in range(num_rows):
+        for column_index, (column, value) in enumerate(zip(table.columns, table.row(index))):
+            if null_every and (index + column_index) % null_every == 0:
+                value = None
+            values.append(pack_value(column.type_code, value))
+    column_types = tuple(types.by_type_code[column.type_code] for column in table.columns)
+    return b"".join(values), column_types
+
+
+def unpack_rows(columns, null_every=None):
+    payload, column_types = build_resultset(columns, NUM_ROWS, null_every)
+
+    def run():
+        resultset = ResultSet(BufferReader(payload), NUM_ROWS)
+        collections.deque(resultset.unpack_rows(column_types, None), maxlen=0)
+    return run, NUM_ROWS
+
+
+def unpack_lazy_rows(columns, null_every=None):
+    """Unpack LazyRow instances and access their first column only"""
+    payload, column_types = build_resultset(columns, NUM_ROWS, null_every)
+    decode_row = row_decoder(column_types, lazy=True)
+
+    def run():
+        resultset = ResultSet(BufferReader(payload), NUM_ROWS)
+        collections.deque((row[0] for row in resultset.unpack_rows(column_types, None, decode_row)), maxlen=0)
+    return run, NUM_ROWS
+
+
+for column in COLUMNS:
+    register('resultset.unpack_rows[%s]' % column[0], functools.partial(unpack_rows, (column,)))
+register('resultset.unpack_rows[mixed]', functools.partial(unpack_rows, MIXED_COLUMNS, NULL_EVERY))
+register('resultset.unpack_rows[fixed]', functools.partial(unpack_rows, FIXED_COLUMNS))
+register('resultset.unpack_lazy_rows[mixed]', functools.partial(unpack_lazy_rows, MIXED_COLUMNS, NULL_EVERY))
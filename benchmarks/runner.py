@@ -0,0 +1,176 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import sys
+import json
+import time
+import optparse
+import platform
+import collections
+from timeit import default_timer
+
+BENCHMARK_MODULES = (
+    'benchmarks.bench_resultset',
+    'benchmarks.bench_parameters',
+    'benchmarks.bench_cesu8',
+    'benchmarks.bench_parsing',
+    'benchmarks.bench_lobs',
+)
+
+DEFAULT_MIN_TIME = 0.1
+DEFAULT_REPEAT = 5
+
+Benchmark = collections.namedtuple('Benchmark', 'name unit setup')
+
+# All registered benchmarks in the order of registration
+REGISTRY = []
+
+
+def register(name, setup, unit='rows'):
+    """Register a benchmark
+    :param name: unique name of the benchmark, e.g. 'resultset.unpack_rows[INTEGER]'
+    :param setup: function without arguments which builds the payload of the benchmark. It returns a tuple
+                  (function, items) of the function to measure and the number of items (rows, bytes, ...)
+                  processed by a single call of it.
+    :param unit: name of the items processed by the benchmark
+    """
+    REGISTRY.append(Benchmark(name, unit, setup))
+
+
+def benchmark(name, unit='rows'):
+    """Decorator registering a setup function as benchmark, see register()"""
+    def decorator(setup):
+        register(name, setup, unit)
+        return setup
+    return decorator
+
+
+def load_benchmarks(pattern=None):
+    """Import all benchmark modules
+    :param pattern: regular expression, only benchmarks with a matching name are returned
+    :returns: list of Benchmark instances
+    """
+    for module_name in BENCHMARK_MODULES:
+        __import__(module_name)
+    if pattern is None:
+        return list(REGISTRY)
+    return [bench for bench in REGISTRY if re.search(pattern, bench.name)]
+
+
+def _time_loops(function, loops):
+    start = default_timer()
+    for _ in range(loops):
+        function()
+    return default_timer() - start
+
+
+def measure(function, min_time=DEFAULT_MIN_TIME, repeat=DEFAULT_REPEAT):
+    """Measure the execution time of a function.
+    The number of loops is increased until they take at least min_time seconds, afterwards the loops are
+    repeated.
+    :returns: tuple (loops, timings) where timings is a list of the durations of single calls in seconds
+    """
+    loops = 1
+    while True:
+        elapsed = _time_loops(function, loops)
+        if elapsed >= min_time:
+            break
+        # Aim a bit higher than required to avoid another round of calibration
+        loops = max(loops * 2, int(loops * 1.2 * min_time / max(elapsed, 1e-9)))
+    timings = [elapsed / loops] + [_time_loops(function, loops) / loops for _ in range(repeat - 1)]
+    return loops, timings
+
+
+def run_benchmark(bench, min_time=DEFAULT_MIN_TIME, repeat=DEFAULT_REPEAT):
+    """Run a single benchmark
+    :returns: dictionary with the results of the benchmark
+    """
+    function, items = bench.setup()
+    loops, timings = measure(function, min_time, repeat)
+    best = min(timings)
+    return dict([
+        ('name', bench.name),
+        ('unit', bench.unit),
+        ('items', items),
+        ('loops', loops),
+        ('timings', timings),
+        ('best', best),
+        ('mean', sum(timings) / len(timings)),
+        ('items_per_second', items / best),
+    ])
+
+
+def environment():
+    return dict([
+        ('python_implementation', platform.python_implementation()),
+        ('python_version', platform.python_version()),
+        ('platform', platform.platform()),
+        ('machine', platform.machine()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+    ])
+
+
+def _format_rate(result):
+    rate = result['items_per_second']
+    if result['unit'] == 'bytes':
+        return '%10.1f MB/s' % (rate / 2**20)
+    return '%10.0f %s/s' % (rate, result['unit'])
+
+
+def format_result(result):
+    return '%-50s %10.3f ms %10.3f ms %s' % (result['name'], result['best'] * 1000, result['mean'] * 1000,
+                                             _format_rate(result))
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='python -m benchmarks [options]')
+    parser.add_option('-f', '--filter', help='only run benchmarks whose name matches this regular expression')
+    parser.add_option('-l', '--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_option('--json', metavar='FILE', help="write the results as JSON to FILE ('-' for stdout)")
+    parser.add_option('--min-time', type='float', default=DEFAULT_MIN_TIME,
+                      help='minimal duration of a repetition in seconds [default: %default]')
+    parser.add_option('--repeat', type='int', default=DEFAULT_REPEAT,
+                      help='number of repetitions [default: %default]')
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error('unexpected arguments: %s' % ' '.join(args))
+    if options.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    benchmarks = load_benchmarks(options.filter)
+    if options.list:
+        for bench in benchmarks:
+            print(bench.name)
+        return 0
+
+    # Keep stdout clean for JSON output
+    log = sys.stderr if options.json == '-' else sys.stdout
+    log.write('%-50s %13s %13s %s\n' % ('benchmark', 'best', 'mean', 'rate'))
+    results = []
+    for bench in benchmarks:
+        result = run_benchmark(bench, options.min_time, options.repeat)
+        log.write(format_result(result) + '\n')
+        log.flush()
+        results.append(result)
+
+    if options.json:
+        report = dict([('environment', environment()), ('benchmarks', results)])
+        if options.json == '-':
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write('\n')
+        else:
+            with open(options.json, 'w') as report_file:
+                json.dump(report, report_file, indent=2, sort_keys=True)
+    return 0
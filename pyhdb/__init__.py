@@ -25,12 +25,47 @@ paramstyle = "numeric"
 tracing = os.environ.get('HDB_TRACE', 'FALSE').upper() in ('TRUE', '1')
 
 
-def connect(host, port, user, password, autocommit=False):
-    conn = Connection(host, port, user, password, autocommit)
+def connect(host, port, user, password, autocommit=False, **kwargs):
+    """
+    Open a new database connection.
+    :param kwargs: further arguments of Connection, e.g. timeout, packet_size or socket options like tcp_nodelay
+    :return: connection object
+    """
+    conn = Connection(host, port, user, password, autocommit, **kwargs)
     conn.connect()
     return conn
 
 
+def _ini_str(value):
+    return value
+
+
+def _ini_bool(value):
+    return value.lower() in ('1', 'yes', 'true', 'on')
+
+
+# Parameters of pyhdb.connect() which can be set in an ini file, with the function to convert their values
+_INI_PARAMETERS = {
+    'host': _ini_str,
+    'port': int,
+    'user': _ini_str,
+    'password': _ini_str,
+    'autocommit': _ini_bool,
+    'timeout': float,
+    'packet_size': int,
+    'compression': _ini_str,
+    'compression_threshold': int,
+    'statement_cache_size': int,
+    'tcp_nodelay': _ini_bool,
+    'tcp_keepalive': _ini_bool,
+    'keepalive_idle': int,
+    'keepalive_interval': int,
+    'keepalive_count': int,
+    'recv_buffer_size': int,
+    'send_buffer_size': int,
+}
+
+
 def from_ini(ini_file, section=None):
     """
     Make connection to database by reading connection parameters from an ini file.
@@ -45,7 +80,11 @@ def from_ini(ini_file, section=None):
         hana_port = 30015
         hana_user = D037732
         hana_password = Abcd1234
+        tcp_nodelay = true
+        recv_buffer_size = 4194304
 
+    Besides host, port, user and password all keyword arguments of pyhdb.connect() can be given, e.g. packet_size
+    or socket options like tcp_nodelay, tcp_keepalive or recv_buffer_size.
     For historical reasons a 'hana_' prefix is allowed, but will be removed automatically.
     """
     if not os.path.exists(ini_file):
@@ -80,8 +119,8 @@ def from_ini(ini_file, section=None):
     def rm_prefix(param):
         return param[5:] if param.startswith('hana_') else param
 
-    valid_keys = ('host', 'port', 'user', 'password')
-    clean_params = dict([('%s' % rm_prefix(key), val) for key, val in params.items() if rm_prefix(key) in valid_keys])
+    clean_params = dict([(rm_prefix(key), _INI_PARAMETERS[rm_prefix(key)](val)) for key, val in params.items()
+                         if rm_prefix(key) in _INI_PARAMETERS])
 
     # make actual connection:
     return connect(**clean_params)
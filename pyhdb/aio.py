@@ -0,0 +1,343 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio based connection and cursor classes (requires Python 3.5+).
+
+The API mirrors pyhdb.Connection and pyhdb.Cursor, except that all methods which talk to the
+database are coroutines:
+
+    connection = await pyhdb.aio.connect(host, port, user, password)
+    cursor = connection.cursor()
+    await cursor.execute('SELECT * FROM DUMMY')
+    rows = await cursor.fetchall()
+    await connection.close()
+
+Instead of fetching all rows at once they can be streamed with 'async for row in cursor'.
+
+LOBs only contain the data delivered together with the result set, reading missing LOB data
+requires a blocking pyhdb.Connection.
+"""
+
+import os
+import socket
+import asyncio
+import logging
+###
+from pyhdb.auth import AuthManager
+from pyhdb.connection import SOCKET_OPTIONS, configure_socket
+from pyhdb.cursor import Cursor, RequestFlow, StatementCache, DEFAULT_STATEMENT_CACHE_SIZE
+from pyhdb.exceptions import Error, OperationalError, ConnectionTimedOutError
+from pyhdb.protocol.segments import RequestSegment
+from pyhdb.protocol.message import RequestMessage
+from pyhdb.protocol.state import ProtocolState
+from pyhdb.protocol.compression import get_compression, DEFAULT_COMPRESSION_THRESHOLD
+from pyhdb.protocol.parts import ClientId, ConnectOptions
+from pyhdb.protocol.constants import message_types, function_codes
+
+logger = logging.getLogger('pyhdb')
+debug = logger.debug
+
+# Calling get_event_loop() from a coroutine is deprecated, get_running_loop() is only available on Python 3.7+
+get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncConnection(object):
+    """
+    Database connection class based on asyncio streams
+    """
+    is_async = True
+
+    def __init__(self, host, port, user, password, autocommit=False, timeout=None, packet_size=None,
+                 compression=None, compression_threshold=DEFAULT_COMPRESSION_THRESHOLD,
+                 statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE, **socket_options):
+        unknown_options = set(socket_options) - set(SOCKET_OPTIONS)
+        if unknown_options:
+            raise TypeError("Unknown socket options: %s" % ", ".join(sorted(unknown_options)))
+
+        self.host = host
+        self.port = port
+        self.user = user
+
+        self.autocommit = autocommit
+        self.product_version = None
+        self.protocol_version = None
+
+        # Framing of the wire protocol, shared with the blocking Connection:
+        self._protocol = ProtocolState(packet_size, get_compression(compression, compression_threshold))
+
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._socket_options = socket_options
+        self._auth_manager = AuthManager(self, user, password)
+        # Serializes request/reply round trips of concurrent tasks on this connection:
+        self._lock = asyncio.Lock()
+        # Prepared statements reused by all cursors, they are only valid within the current session
+        self._statement_cache = StatementCache(statement_cache_size)
+
+    def __repr__(self):
+        return '<Hana async connection host=%s port=%s user=%s>' % (self.host, self.port, self.user)
+
+    @property
+    def session_id(self):
+        return self._protocol.session_id
+
+    @property
+    def packet_size(self):
+        """Maximum size of request messages sent by this connection"""
+        return self._protocol.packet_size
+
+    @property
+    def compression(self):
+        """Compression negotiated with the server, None if messages are sent uncompressed"""
+        return self._protocol.compression
+
+    @property
+    def packet_count(self):
+        return self._protocol.packet_count
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if not self.closed:
+            await self.close()
+
+    async def _with_timeout(self, coro):
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except asyncio.TimeoutError:
+            # The state of the stream is unknown after a timeout, so the connection cannot be used anymore:
+            self._abort()
+            raise ConnectionTimedOutError()
+        except asyncio.CancelledError:
+            # The reply of a request which has already been sent would be received by the next request
+            self._abort()
+            raise
+
+    def _abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._statement_cache.clear()
+
+    async def _create_socket(self):
+        """Open TCP connection with configured socket options"""
+        loop = get_running_loop()
+        error = None
+        for family, socktype, proto, _, address in await loop.getaddrinfo(self.host, self.port,
+                                                                         type=socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                configure_socket(sock, **self._socket_options)
+                sock.setblocking(False)
+                await loop.sock_connect(sock, address)
+                return sock
+            except OSError as err:
+                error = err
+                sock.close()
+        if error is not None:
+            raise error
+        raise OSError("getaddrinfo returns an empty list")
+
+    async def _open_socket_and_init_protocoll(self):
+        self._reader, self._writer = await asyncio.open_connection(sock=await self._create_socket())
+
+        # Initialization Handshake
+        self._writer.write(self._protocol.initiate())
+        await self._writer.drain()
+        while not self._protocol.handshake_done:
+            await self._receive()
+
+        self.product_version = self._protocol.product_version
+        self.protocol_version = self._protocol.protocol_version
+
+    async def _receive(self):
+        """Receive data from the stream and pass it to the protocol state"""
+        data = await self._reader.read(self._protocol.read_size)
+        if not data:
+            raise OperationalError("Lost connection to HANA server (connection closed by server)")
+        self._protocol.receive_data(data)
+
+    async def send_request(self, message):
+        """Send message request to HANA db and return reply message
+        :param message: Instance of Message object containing segments and parts of a HANA db request
+        :returns: Instance of reply Message object
+        """
+        async with self._lock:
+            if self._writer is None:
+                raise OperationalError("Lost connection to HANA server")
+            return await self._with_timeout(self._send_message_recv_reply(message))
+
+    async def _send_message_recv_reply(self, message):
+        try:
+            self._writer.writelines(self._protocol.pack_request(message))
+            await self._writer.drain()
+
+            reply = self._protocol.next_reply()
+            while reply is None:
+                await self._receive()
+                reply = self._protocol.next_reply()
+        except OperationalError:
+            self._abort()
+            raise
+        except (IOError, OSError) as error:
+            self._abort()
+            raise OperationalError("Lost connection to HANA server (%r)" % error)
+        return reply
+
+    def get_next_packet_count(self):
+        # No lock required, all tasks of an event loop run in the same thread
+        return self._protocol.get_next_packet_count()
+
+    async def connect(self):
+        if self._writer is not None:
+            # Connection already established
+            return
+
+        await self._with_timeout(self._open_socket_and_init_protocoll())
+
+        # Perform the authenication handshake and get the part
+        # with the agreed authentication data
+        response = await self.send_request(
+            RequestMessage.new(self, self._auth_manager.get_initial_request())
+        )
+        agreed_auth_part = self._auth_manager.process_initial_reply(response)
+
+        request = RequestMessage.new(
+            self,
+            RequestSegment(
+                message_types.CONNECT,
+                (
+                    agreed_auth_part,
+                    ClientId(
+                        "pyhdb-%s@%s" % (os.getpid(), socket.getfqdn())
+                    ),
+                    ConnectOptions(self._protocol.connect_options())
+                )
+            )
+        )
+        reply = await self.send_request(request)
+        self._protocol.process_connect_reply(reply)
+
+    async def close(self):
+        if self._writer is None:
+            raise Error("Connection already closed")
+
+        try:
+            request = RequestMessage.new(
+                self,
+                RequestSegment(message_types.DISCONNECT)
+            )
+            reply = await self.send_request(request)
+            if reply.segments[0].function_code != function_codes.DISCONNECT:
+                raise Error("Connection wasn't closed correctly")
+        finally:
+            self._abort()
+
+    @property
+    def closed(self):
+        return self._writer is None
+
+    def _check_closed(self):
+        if self.closed:
+            raise Error("Connection closed")
+
+    def cursor(self):
+        """Return a new AsyncCursor Object using the connection."""
+        self._check_closed()
+
+        return AsyncCursor(self)
+
+    async def commit(self):
+        self._check_closed()
+
+        request = RequestMessage.new(
+            self,
+            RequestSegment(message_types.COMMIT)
+        )
+        await self.send_request(request)
+
+    async def rollback(self):
+        self._check_closed()
+
+        request = RequestMessage.new(
+            self,
+            RequestSegment(message_types.ROLLBACK)
+        )
+        await self.send_request(request)
+
+
+class _AsyncBatches(object):
+    """Asynchronous iterator over the rows of a result set in lists of rows, see AsyncCursor.iter_batches()"""
+
+    def __init__(self, cursor, size):
+        self._cursor = cursor
+        self._size = size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        rows = await self._cursor.fetchmany(self._size)
+        if not rows:
+            raise StopAsyncIteration
+        return rows
+
+
+class AsyncCursor(Cursor):
+    """Database cursor class for AsyncConnection.
+    Requests are built and their replies are handled by the request flows of Cursor, only sending the
+    requests is asynchronous: all methods performing requests return a coroutine. Prefetching is not
+    supported.
+    """
+
+    async def _run(self, flow):
+        """Send the requests of a request flow and return its result"""
+        flow = RequestFlow(flow)
+        request = flow.start()
+        while request is not None:
+            try:
+                reply = await self.connection.send_request(request)
+            except BaseException as error:
+                request = flow.throw(error)
+            else:
+                request = flow.send(reply)
+        return flow.result
+
+    def __iter__(self):
+        raise TypeError("AsyncCursor is iterated with 'async for'")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    def iter_batches(self, size=None):
+        """Iterate over the remaining rows of the result set in lists of rows with 'async for'
+        :param size: maximum number of rows of every list, defaults to arraysize
+        """
+        return _AsyncBatches(self, size)
+
+
+async def connect(host, port, user, password, autocommit=False, timeout=None, **kwargs):
+    conn = AsyncConnection(host, port, user, password, autocommit, timeout, **kwargs)
+    await conn.connect()
+    return conn
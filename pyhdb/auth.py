@@ -40,15 +40,21 @@ class AuthManager(object):
         self.client_proof = None
 
     def perform_handshake(self):
-        request = RequestMessage.new(
-            self.connection,
-            RequestSegment(
-                message_types.AUTHENTICATE,
-                Authentication(self.user, {self.method: self.client_key})
-            )
-        )
+        request = RequestMessage.new(self.connection, self.get_initial_request())
         response = self.connection.send_request(request)
+        return self.process_initial_reply(response)
+
+    def get_initial_request(self):
+        """Return the AUTHENTICATE request segment which starts the handshake"""
+        return RequestSegment(
+            message_types.AUTHENTICATE,
+            Authentication(self.user, {self.method: self.client_key})
+        )
 
+    def process_initial_reply(self, response):
+        """Calculate the client proof from the reply to the initial request
+        :returns: Authentication part with the agreed authentication data
+        """
         auth_part = response.segments[0].parts[0]
         if self.method not in auth_part.methods:
             raise Exception(
@@ -65,8 +65,12 @@ class IncrementalDecoder(codecs.BufferedIncrementalDecoder):
                 )
                 return unichr(codepoint), 6
 
-        # Fallback to UTF-8
-        return codecs.utf_8_decode(input, errors, final)
+        # Fallback to UTF-8 up to the next possible CESU-8 sequence
+        # (the UTF-8 codec of Python 3 rejects encoded surrogates)
+        end = input.find(b'\xed', 1)
+        if end == -1:
+            return codecs.utf_8_decode(input, errors, final)
+        return codecs.utf_8_decode(input[:end], errors, True)
 
 
 class IncrementalEncoder(codecs.BufferedIncrementalEncoder):
@@ -135,7 +139,8 @@ CESU8_CODEC_INFO = codecs.CodecInfo(
 
 
 def search_function(encoding):
-    if encoding == 'cesu-8':
+    # Python 3.9+ normalizes the name to 'cesu_8' before calling search functions
+    if encoding in ('cesu-8', 'cesu_8'):
         return CESU8_CODEC_INFO
     else:
         return None
@@ -0,0 +1,201 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Column oriented fetching of result sets into arrays, NumPy arrays and pandas data frames"""
+
+import array
+import importlib
+import collections
+###
+from pyhdb.exceptions import InterfaceError
+from pyhdb.protocol.types import column_container, TinyInt, SmallInt, Int, BigInt, Real, Double
+from pyhdb.compat import izip
+
+# Columns returned by Cursor.fetch_columns(): values holds one array.array (fixed width numeric types) or list
+# (all other types) per column, nulls holds one array.array('B') per column flagging NULL values with 1
+ColumnBatch = collections.namedtuple('ColumnBatch', 'values nulls')
+
+# Types whose values are preceded by a NULL indicator byte in result sets, NULL values consist of the indicator only
+NULL_INDICATOR_TYPES = (TinyInt, SmallInt, Int, BigInt)
+# Types whose NULL values are encoded with all bits set
+NULL_PATTERN_TYPES = (Real, Double)
+
+
+def _import_optional(name, feature):
+    # NumPy and pandas are imported on first use, importing pyhdb must not pay for them
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise InterfaceError("%s requires the %s package" % (feature, name))
+
+
+def import_numpy():
+    """Return the numpy module, raise InterfaceError if it is not installed"""
+    return _import_optional('numpy', "Fetching NumPy arrays")
+
+
+def import_pandas():
+    """Return the pandas module, raise InterfaceError if it is not installed"""
+    return _import_optional('pandas', "Fetching data frames")
+
+
+class ColumnBuilder(object):
+    """Collect the rows of a result set column by column into a ColumnBatch"""
+
+    def __init__(self, column_types):
+        self.column_types = column_types
+        self.batch = self._new_batch()
+
+    def _new_batch(self):
+        return ColumnBatch([column_container(typ) for typ in self.column_types],
+                           [array.array('B') for _ in self.column_types])
+
+    def unpack_part(self, part, connection, max_rows):
+        """Unpack up to max_rows rows from a ResultSet part
+        :returns: number of unpacked rows
+        """
+        return part.unpack_columns(self.column_types, connection, self.batch.values, self.batch.nulls, max_rows)
+
+    def append_rows(self, rows):
+        """Append rows which have already been unpacked into tuples"""
+        for row in rows:
+            for value, values, nulls in izip(row, self.batch.values, self.batch.nulls):
+                if value is None:
+                    values.append(0 if isinstance(values, array.array) else None)
+                    nulls.append(1)
+                else:
+                    values.append(value)
+                    nulls.append(0)
+
+    def result(self):
+        return self.batch
+
+
+def resultset_dtype(column_types):
+    """Return the structured NumPy dtype of result set rows without NULL values of integer columns
+    :param column_types: a tuple of column descriptors
+    :returns: numpy.dtype instance, None if the row size is not fixed (e.g. the result set contains strings)
+    """
+    fields = []
+    for index, typ in enumerate(column_types):
+        if typ.array_typecode is None:
+            return None
+        if issubclass(typ, NULL_INDICATOR_TYPES):
+            fields.append(('n%d' % index, 'u1'))
+        fields.append(('v%d' % index, '<' + typ.array_typecode))
+    return import_numpy().dtype(fields)
+
+
+class NumpyColumnBuilder(ColumnBuilder):
+    """
+    Collect the rows of a result set column by column into NumPy arrays.
+
+    Result set parts of tables with only numeric columns are decoded with a structured dtype as long as all rows
+    have the same size, which is the case if no integer column contains NULL values. All other rows are unpacked
+    per column and converted to NumPy arrays afterwards.
+    """
+
+    def __init__(self, column_types):
+        self.numpy = import_numpy()
+        super(NumpyColumnBuilder, self).__init__(column_types)
+        self.dtype = resultset_dtype(column_types)
+        self._chunks = []
+
+    def unpack_part(self, part, connection, max_rows):
+        numpy = self.numpy
+        if self.dtype is not None:
+            data = part.read_fixed_size_rows(self.dtype.itemsize, max_rows)
+            if data is not None:
+                self._flush()
+                self._chunks.append(self._decode_records(numpy.frombuffer(data, dtype=self.dtype)))
+                return len(data) // self.dtype.itemsize
+        return super(NumpyColumnBuilder, self).unpack_part(part, connection, max_rows)
+
+    def _decode_records(self, records):
+        numpy = self.numpy
+        values = []
+        nulls = []
+        for index, typ in enumerate(self.column_types):
+            # Copy the values into a contiguous array per column, field views of the records would keep the
+            # buffer of the whole reply message alive
+            column = records['v%d' % index].astype(numpy.dtype(typ.array_typecode))
+            values.append(column)
+            if issubclass(typ, NULL_PATTERN_TYPES):
+                nulls.append(column.view('u%d' % column.itemsize) == numpy.iinfo('u%d' % column.itemsize).max)
+            else:
+                nulls.append(numpy.zeros(len(column), dtype=bool))
+        return ColumnBatch(values, nulls)
+
+    def _flush(self):
+        """Convert the rows collected per column so far to NumPy arrays"""
+        numpy = self.numpy
+        if not self.batch.nulls or not len(self.batch.nulls[0]):
+            return
+        values = []
+        for typ, column, nulls in izip(self.column_types, self.batch.values, self.batch.nulls):
+            if isinstance(column, array.array):
+                column = numpy.array(column, dtype=column.typecode)
+                if issubclass(typ, NULL_PATTERN_TYPES):
+                    column[numpy.array(nulls, dtype=bool)] = numpy.nan
+            else:
+                column = _object_array(numpy, column)
+            values.append(column)
+        self._chunks.append(ColumnBatch(values, [numpy.array(nulls, dtype=bool) for nulls in self.batch.nulls]))
+        self.batch = self._new_batch()
+
+    def result(self):
+        """Return a ColumnBatch with one NumPy array per column in values and one boolean array per column
+        in nulls. NULL values are NaN in floating point columns, 0 in integer columns and None in object columns.
+        """
+        numpy = self.numpy
+        self._flush()
+        if len(self._chunks) == 1:
+            return self._chunks[0]
+        values = []
+        nulls = []
+        for index, typ in enumerate(self.column_types):
+            if self._chunks:
+                values.append(numpy.concatenate([chunk.values[index] for chunk in self._chunks]))
+                nulls.append(numpy.concatenate([chunk.nulls[index] for chunk in self._chunks]))
+            else:
+                values.append(numpy.empty(0, dtype=typ.array_typecode or object))
+                nulls.append(numpy.empty(0, dtype=bool))
+        return ColumnBatch(values, nulls)
+
+
+def _object_array(numpy, values):
+    # numpy.array() would create nested dimensions for values which are sequences themselves
+    column = numpy.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def to_dataframe(batch, description):
+    """Convert a ColumnBatch of NumPy arrays to a pandas DataFrame
+    :param batch: ColumnBatch as returned by NumpyColumnBuilder.result()
+    :param description: cursor description of the result set
+    :returns: pandas.DataFrame instance, integer columns with NULL values are converted to floating point with NaN
+    """
+    pandas = import_pandas()
+    numpy = import_numpy()
+    columns = []
+    for values, nulls in izip(batch.values, batch.nulls):
+        if values.dtype.kind in 'iu' and nulls.any():
+            values = values.astype(float)
+            values[nulls] = numpy.nan
+        columns.append(values)
+    # Columns are passed by position as names of result set columns do not need to be unique
+    frame = pandas.DataFrame(dict(enumerate(columns)), columns=list(range(len(columns))))
+    frame.columns = [column[0] for column in description or ()]
+    return frame
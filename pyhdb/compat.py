@@ -27,8 +27,13 @@ if PY2:
     iter_range = xrange
     import ConfigParser as configparser
     from itertools import izip
+    from urlparse import urlparse
+    from urllib import unquote
     import StringIO as _StringIO
     StringIO = _StringIO.StringIO
+
+    def bytes_io_buffer(bytes_io):
+        return bytes_io.getvalue()
 else:
     text_type = str
     byte_type = bytes
@@ -38,9 +43,14 @@ else:
     iter_range = range
     import configparser
     izip = zip
+    from urllib.parse import urlparse, unquote
     import io
     StringIO = io.StringIO
 
+    def bytes_io_buffer(bytes_io):
+        # Return a view on the content of the BytesIO instance without copying it
+        return bytes_io.getbuffer()
+
 # workaround for 'narrow' Python builds
 if sys.maxunicode <= 65535:
     unichr = lambda n: ('\\U%08x' % n).decode('unicode-escape')
@@ -12,35 +12,110 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import io
 import os
 import socket
-import struct
 import threading
 import logging
+import weakref
+import collections
 ###
 from pyhdb.auth import AuthManager
-from pyhdb.cursor import Cursor
+from pyhdb.cursor import Cursor, StatementCache, DEFAULT_STATEMENT_CACHE_SIZE
 from pyhdb.exceptions import Error, OperationalError, ConnectionTimedOutError
 from pyhdb.protocol.segments import RequestSegment
-from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.message import RequestMessage
 from pyhdb.protocol.parts import ClientId, ConnectOptions
-from pyhdb.protocol.constants import message_types, function_codes, DEFAULT_CONNECTION_OPTIONS
-
-INITIALIZATION_BYTES = bytearray([
-    255, 255, 255, 255, 4, 20, 0, 4, 1, 0, 0, 1, 1, 1
-])
+from pyhdb.protocol.state import ProtocolState
+from pyhdb.protocol.compression import get_compression, DEFAULT_COMPRESSION_THRESHOLD
+# Kept importable from here for backwards compatibility:
+from pyhdb.protocol.state import INITIALIZATION_BYTES, version_struct
+from pyhdb.protocol.constants import message_types, function_codes
 
 logger = logging.getLogger('pyhdb')
 debug = logger.debug
-version_struct = struct.Struct('<bH')
+# Maximum number of buffers passed to a single sendmsg() call (IOV_MAX on most platforms)
+SENDMSG_MAX_BUFFERS = 1024
+SOCKET_OPTIONS = ('tcp_nodelay', 'tcp_keepalive', 'keepalive_idle', 'keepalive_interval', 'keepalive_count',
+                  'recv_buffer_size', 'send_buffer_size')
+
+
+def configure_socket(sock, tcp_nodelay=True, tcp_keepalive=True, keepalive_idle=None, keepalive_interval=None,
+                     keepalive_count=None, recv_buffer_size=None, send_buffer_size=None):
+    """Apply tuning options to a TCP socket. Options which are None keep the defaults of the operating system.
+    :param sock: socket instance
+    :param tcp_nodelay: disable Nagle's algorithm, so that small requests are sent immediately
+    :param tcp_keepalive: enable TCP keepalive probes for idle connections
+    :param keepalive_idle: seconds of idle time before the first keepalive probe is sent
+    :param keepalive_interval: seconds between keepalive probes
+    :param keepalive_count: number of unanswered probes after which the connection is dropped
+    :param recv_buffer_size: size of the socket receive buffer (SO_RCVBUF) in bytes
+    :param send_buffer_size: size of the socket send buffer (SO_SNDBUF) in bytes
+    """
+    # Buffer sizes should be set before connecting, so that the TCP window scaling can be negotiated for them
+    if recv_buffer_size is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer_size)
+    if send_buffer_size is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer_size)
+
+    if tcp_nodelay is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(tcp_nodelay))
+
+    if tcp_keepalive is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(tcp_keepalive))
+    if not tcp_keepalive:
+        return
+
+    if hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+        # Windows only supports setting idle time and interval together (in milliseconds)
+        if keepalive_idle is not None or keepalive_interval is not None:
+            sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, int((keepalive_idle or 7200) * 1000),
+                                                   int((keepalive_interval or 1) * 1000)))
+        return
+
+    # TCP_KEEPIDLE is called TCP_KEEPALIVE on OSX
+    keepalive_options = (
+        (getattr(socket, 'TCP_KEEPIDLE', getattr(socket, 'TCP_KEEPALIVE', None)), keepalive_idle),
+        (getattr(socket, 'TCP_KEEPINTVL', None), keepalive_interval),
+        (getattr(socket, 'TCP_KEEPCNT', None), keepalive_count),
+    )
+    for option, value in keepalive_options:
+        if value is None:
+            continue
+        if option is None:
+            debug('TCP keepalive option not supported on this platform, ignoring value %r', value)
+            continue
+        sock.setsockopt(socket.IPPROTO_TCP, option, int(value))
+
+
+class PendingReply(object):
+    """Reply of a request which has been sent without waiting for its reply, see Connection.submit_request()"""
+    __slots__ = ('reply', 'error')
+
+    def __init__(self):
+        self.reply = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.reply is not None or self.error is not None
 
 
 class Connection(object):
     """
     Database connection class
     """
-    def __init__(self, host, port, user, password, autocommit=False, timeout=None):
+    def __init__(self, host, port, user, password, autocommit=False, timeout=None, packet_size=None,
+                 compression=None, compression_threshold=DEFAULT_COMPRESSION_THRESHOLD,
+                 statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE, **socket_options):
+        """
+        :param packet_size: maximum size of request messages, defaults to 128 KB
+        :param compression: codec for compressing message payloads ('zlib' or 'lz4'), used if the server agrees
+        :param compression_threshold: payloads smaller than this number of bytes are sent uncompressed
+        :param statement_cache_size: number of prepared statements kept for reuse by execute() and executemany()
+               of all cursors, 0 disables the cache
+        :param socket_options: tuning options of the TCP socket (tcp_nodelay, tcp_keepalive, keepalive_idle,
+               keepalive_interval, keepalive_count, recv_buffer_size, send_buffer_size), see configure_socket()
+        """
         self.host = host
         self.port = port
         self.user = user
@@ -49,84 +124,203 @@ class Connection(object):
         self.product_version = None
         self.protocol_version = None
 
-        self.session_id = -1
-        self.packet_count = -1
+        # Framing of the wire protocol, the connection only moves bytes between socket and protocol state:
+        self._protocol = ProtocolState(packet_size, get_compression(compression, compression_threshold))
+
+        unknown_options = set(socket_options) - set(SOCKET_OPTIONS)
+        if unknown_options:
+            raise TypeError("Unknown socket options: %s" % ", ".join(sorted(unknown_options)))
 
         self._socket = None
+        self._socket_options = socket_options
         self._timeout = timeout
         self._auth_manager = AuthManager(self, user, password)
         # It feels like the RLock has a poorer performance
         self._socket_lock = threading.RLock()
         self._packet_count_lock = threading.Lock()
+        # Cursors opened on this connection, used to drop their result sets when a connection is reset
+        self._cursors = weakref.WeakSet()
+        # PendingReply instances of sent requests in the order of their replies
+        self._pending_replies = collections.deque()
+        # Prepared statements reused by all cursors, they are only valid within the current session
+        self._statement_cache = StatementCache(statement_cache_size)
 
     def __repr__(self):
         return '<Hana connection host=%s port=%s user=%s>' % (self.host, self.port, self.user)
 
+    @property
+    def session_id(self):
+        return self._protocol.session_id
+
+    @session_id.setter
+    def session_id(self, value):
+        self._protocol.session_id = value
+
+    @property
+    def packet_size(self):
+        """Maximum size of request messages sent by this connection"""
+        return self._protocol.packet_size
+
+    @property
+    def compression(self):
+        """Compression negotiated with the server, None if messages are sent uncompressed"""
+        return self._protocol.compression
+
+    @property
+    def packet_count(self):
+        return self._protocol.packet_count
+
+    @packet_count.setter
+    def packet_count(self, value):
+        self._protocol.packet_count = value
+
+    def _create_socket(self):
+        """Open TCP connection, like socket.create_connection() but with configured socket options"""
+        error = None
+        for family, socktype, proto, _, address in socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                configure_socket(sock, **self._socket_options)
+                sock.settimeout(self._timeout)
+                sock.connect(address)
+                return sock
+            except socket.error as err:
+                error = err
+                sock.close()
+        if error is not None:
+            raise error
+        raise socket.error("getaddrinfo returns an empty list")
+
     def _open_socket_and_init_protocoll(self):
-        self._socket = socket.create_connection((self.host, self.port), self._timeout)
+        self._socket = self._create_socket()
 
         # Initialization Handshake
-        self._socket.sendall(INITIALIZATION_BYTES)
+        self._socket.sendall(self._protocol.initiate())
+        while not self._protocol.handshake_done:
+            self._receive()
 
-        response = self._socket.recv(8)
-        if len(response) != 8:
-            raise Exception("Connection failed")
+        self.product_version = self._protocol.product_version
+        self.protocol_version = self._protocol.protocol_version
 
-        self.product_version = version_struct.unpack(response[0:3])
-        self.protocol_version = version_struct.unpack_from(response[3:8])
+    def _receive(self):
+        """Receive data from the socket directly into the buffer of the protocol state.
+        Usually a complete small reply (header and payload) is received with a single call.
+        """
+        nbytes = self._socket.recv_into(self._protocol.get_buffer())
+        if not nbytes:
+            # The stream ends within a reply, the connection cannot be used anymore
+            self._abort()
+            raise OperationalError("Lost connection to HANA server (connection closed by server)")
+        self._protocol.buffer_updated(nbytes)
 
     def send_request(self, message):
         """Send message request to HANA db and return reply message
         :param message: Instance of Message object containing segments and parts of a HANA db request
         :returns: Instance of reply Message object
         """
-        payload = message.pack()  # obtain BytesIO instance
-        return self.__send_message_recv_reply(payload.getvalue())
+        return self.wait_for_reply(self.submit_request(message))
 
-    def __send_message_recv_reply(self, packed_message):
+    def submit_request(self, message):
+        """Send message request to HANA db without waiting for its reply.
+        Several requests can be in flight at the same time, their replies arrive in the order of the requests.
+        :param message: RequestMessage instance
+        :returns: PendingReply instance, to be passed to wait_for_reply()
+        """
+        pending = PendingReply()
+        with self._socket_lock:
+            buffers = self._protocol.pack_request(message)
+            try:
+                self._sendall_buffers(buffers)
+            except socket.timeout:
+                self._abort()
+                raise ConnectionTimedOutError()
+            except (IOError, OSError) as error:
+                self._abort()
+                raise OperationalError("Lost connection to HANA server (%r)" % error)
+            except Exception:
+                # The request is already queued in the protocol state and may have been sent partially
+                self._abort()
+                raise
+            self._pending_replies.append(pending)
+        return pending
+
+    def wait_for_reply(self, pending):
+        """Wait for the reply of a submitted request. Replies of requests submitted before are stored in their
+        PendingReply instances, so that they can be obtained later.
+        :param pending: PendingReply instance returned by submit_request()
+        :returns: Instance of reply Message object
         """
-        Private method to send packed message and receive the reply message.
-        :param packed_message: a binary string containing the entire message payload
+        with self._socket_lock:
+            try:
+                while not pending.done:
+                    self.__receive_reply()
+            except socket.timeout:
+                raise ConnectionTimedOutError()
+            except (IOError, OSError) as error:
+                self._abort()
+                raise OperationalError("Lost connection to HANA server (%r)" % error)
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.reply
+
+    def _sendall_buffers(self, buffers):
+        """Send all given buffers, using scatter-gather I/O (sendmsg) if the platform supports it.
+        :param buffers: a list of binary strings/buffers which together make up the message
+        """
+        if not hasattr(self._socket, 'sendmsg'):
+            # Buffers may be bytearrays or memoryviews, which cannot be joined with bytes on Python 2
+            data = bytearray()
+            for buf in buffers:
+                data += buf
+            self._socket.sendall(data)
+            return
+
+        views = [memoryview(buf) for buf in buffers if len(buf)]
+        index = 0
+        while index < len(views):
+            sent = self._socket.sendmsg(views[index:index + SENDMSG_MAX_BUFFERS])
+            # Skip all buffers which have been sent completely, and slice the one sent only partially:
+            while sent:
+                if sent >= len(views[index]):
+                    sent -= len(views[index])
+                    index += 1
+                else:
+                    views[index] = views[index][sent:]
+                    sent = 0
+
+    def __receive_reply(self):
+        """
+        Private method to receive the next reply message and store it in the PendingReply of its request.
         """
-        payload = io.BytesIO()
+        # Receive complete reply message directly into the buffers of the protocol state.
+        # Segments and parts are later unpacked from slices of these buffers without copying them.
+        while not self._protocol.has_reply:
+            self._receive()
         try:
-            with self._socket_lock:
-                self._socket.sendall(packed_message)
-
-                # Read first message header
-                raw_header = self._socket.recv(32)
-                header = ReplyMessage.header_from_raw_header_data(raw_header)
-
-                # from pyhdb.lib.stringlib import allhexlify
-                # print 'Raw msg header:', allhexlify(raw_header)
-                msg = 'Message header (32 bytes): sessionid: %d, packetcount: %d, length: %d, size: %d, noofsegm: %d'
-                debug(msg, *(header[:5]))
-
-                # Receive complete message payload
-                while payload.tell() < header.payload_length:
-                    _payload = self._socket.recv(header.payload_length - payload.tell())
-                    if not _payload:
-                        break   # jump out without any warning??
-                    payload.write(_payload)
-
-                debug('Read %d bytes payload from socket', payload.tell())
-
-                # Keep session id of connection up to date
-                if self.session_id != header.session_id:
-                    self.session_id = header.session_id
-                    self.packet_count = -1
-        except socket.timeout:
-            raise ConnectionTimedOutError()
-        except (IOError, OSError) as error:
-            raise OperationalError("Lost connection to HANA server (%r)" % error)
-
-        payload.seek(0)  # set pointer position to beginning of buffer
-        return ReplyMessage.unpack_reply(header, payload)
+            reply = self._protocol.next_reply()
+        except Exception as error:
+            # The reply has been consumed anyway (also if it could not be unpacked), so the replies of the
+            # following requests are still assigned to their requests
+            self._pending_replies.popleft().error = error
+        else:
+            self._pending_replies.popleft().reply = reply
+
+    def _abort(self):
+        """Close the socket without a DISCONNECT request, e.g. if the state of the stream is unknown after a
+        failed send. Requests still waiting for their replies fail.
+        """
+        if self._socket is not None:
+            self._socket.close()
+        self._socket = None
+        self._statement_cache.clear()
+        for pending in self._pending_replies:
+            pending.error = OperationalError("Lost connection to HANA server")
+        self._pending_replies.clear()
 
     def get_next_packet_count(self):
         with self._packet_count_lock:
-            self.packet_count += 1
-            return self.packet_count
+            return self._protocol.get_next_packet_count()
 
     def connect(self):
         with self._socket_lock:
@@ -149,11 +343,12 @@ class Connection(object):
                         ClientId(
                             "pyhdb-%s@%s" % (os.getpid(), socket.getfqdn())
                         ),
-                        ConnectOptions(DEFAULT_CONNECTION_OPTIONS)
+                        ConnectOptions(self._protocol.connect_options())
                     )
                 )
             )
-            self.send_request(request)
+            reply = self.send_request(request)
+            self._protocol.process_connect_reply(reply)
 
     def close(self):
         with self._socket_lock:
@@ -170,8 +365,7 @@ class Connection(object):
                    function_codes.DISCONNECT:
                     raise Error("Connection wasn't closed correctly")
             finally:
-                self._socket.close()
-                self._socket = None
+                self._abort()
 
     @property
     def closed(self):
@@ -185,7 +379,15 @@ class Connection(object):
         """Return a new Cursor Object using the connection."""
         self._check_closed()
 
-        return Cursor(self)
+        cursor = Cursor(self)
+        self._cursors.add(cursor)
+        return cursor
+
+    def _close_cursors(self):
+        """Close all cursors opened on this connection, dropping their open result sets"""
+        for cursor in list(self._cursors):
+            cursor.close()
+        self._cursors.clear()
 
     def commit(self):
         self._check_closed()
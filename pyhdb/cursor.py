@@ -12,16 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+import sys
+import copy
+import types
+import threading
 import collections
 ###
+from pyhdb.protocol import constants
 from pyhdb.protocol.message import RequestMessage
 from pyhdb.protocol.segments import RequestSegment
 from pyhdb.protocol.types import escape_values, by_type_code
-from pyhdb.protocol.parts import Command, FetchSize, ResultSetId, StatementId, Parameters, WriteLobRequest
+from pyhdb.protocol.decoding import row_decoder
+from pyhdb.protocol.parts import Command, FetchSize, ResultSet, ResultSetId, StatementId, Parameters, \
+    WriteLobRequest
 from pyhdb.protocol.constants import message_types, function_codes, part_kinds
 from pyhdb.exceptions import ProgrammingError, InterfaceError, DatabaseError
+from pyhdb.columns import ColumnBuilder, NumpyColumnBuilder, to_dataframe, import_pandas
 from pyhdb.compat import izip
 
+# Number of prepared statements a connection keeps for reuse by default
+DEFAULT_STATEMENT_CACHE_SIZE = 32
+# Maximum number of rows of a result set part, its argument count is a signed 16 bit integer
+MAX_FETCH_SIZE = 2**15 - 1
+# Minimum number of rows requested by the first FETCHNEXT request of a result set, the number of requested
+# rows is doubled with every further request
+INITIAL_FETCH_SIZE = 128
+
+# Unqualified table names of statements refer to the default schema, which is changed by this statement
+SET_SCHEMA_RE = re.compile(r'\s*SET\s+SCHEMA\b', re.I)
+
 FORMAT_OPERATION_ERRORS = [
     'not enough arguments for format string',
     'not all arguments converted during string formatting'
@@ -111,20 +131,235 @@ class PreparedStatement(object):
         self._iter_row_count -= 1
 
 
+class StatementCache(object):
+    """Prepared statements of a connection keyed by their SQL text, shared by all cursors of the connection.
+    If the cache is full the least recently used statement is evicted.
+
+    Statements are checked out by get() and put() and have to be released after their execution. A statement
+    which is not cached (evicted, or not added because the cache is disabled or already contains its SQL text)
+    has to be dropped on the server once it is no longer checked out by any cursor, take_dropped() returns
+    these statements.
+    """
+
+    def __init__(self, size=DEFAULT_STATEMENT_CACHE_SIZE):
+        """
+        :param size: maximum number of cached statements, 0 disables caching
+        """
+        if size < 0:
+            raise ValueError("Statement cache size must not be negative")
+        self.size = size
+        self._statements = {}
+        # SQL texts of the cached statements, least recently used first
+        self._order = []
+        # Number of executions using a statement, keyed by statement id
+        self._uses = {}
+        # Statements which are neither cached nor in use anymore
+        self._dropped = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._statements)
+
+    def __contains__(self, statement):
+        return statement in self._statements
+
+    def get(self, statement):
+        """Check out the cached prepared statement for a SQL text
+        :returns: a copy of the PreparedStatement instance, so that every execution has its own row iterator,
+                  None if the statement is not cached
+        """
+        with self._lock:
+            prepared_statement = self._statements.get(statement)
+            if prepared_statement is None:
+                return None
+            self._order.remove(statement)
+            self._order.append(statement)
+            self._checkout(prepared_statement)
+        return copy.copy(prepared_statement)
+
+    def put(self, statement, prepared_statement):
+        """Add a newly prepared statement to the cache and check it out
+        :returns: a copy of the PreparedStatement instance
+        """
+        with self._lock:
+            self._checkout(prepared_statement)
+            if self.size and statement not in self._statements:
+                self._statements[statement] = prepared_statement
+                self._order.append(statement)
+                evicted = self._order[:-self.size]
+                del self._order[:-self.size]
+                for evicted_statement in evicted:
+                    self._discard(self._statements.pop(evicted_statement))
+        return copy.copy(prepared_statement)
+
+    def release(self, prepared_statement):
+        """Release a statement checked out by get() or put() after its execution"""
+        statement_id = prepared_statement.statement_id
+        with self._lock:
+            if statement_id not in self._uses:
+                # The cache has been cleared since, the statement has been released together with its session
+                return
+            self._uses[statement_id] -= 1
+            if not self._uses[statement_id]:
+                del self._uses[statement_id]
+                if not self._is_cached(prepared_statement):
+                    self._dropped.append(prepared_statement)
+
+    def take_dropped(self):
+        """Return the statements which have to be dropped on the server and forget them"""
+        with self._lock:
+            dropped, self._dropped = self._dropped, []
+        return dropped
+
+    def invalidate(self):
+        """Remove all statements from the cache, e.g. after the default schema of the session has been changed.
+        Unlike clear() the statements still exist on the server, they are dropped once they are no longer in use.
+        """
+        with self._lock:
+            statements = list(self._statements.values())
+            self._statements.clear()
+            del self._order[:]
+            for prepared_statement in statements:
+                self._discard(prepared_statement)
+
+    def clear(self):
+        """Forget all statements, e.g. after the session they were prepared in has been closed"""
+        with self._lock:
+            self._statements.clear()
+            del self._order[:]
+            self._uses.clear()
+            del self._dropped[:]
+
+    def _checkout(self, prepared_statement):
+        self._uses[prepared_statement.statement_id] = self._uses.get(prepared_statement.statement_id, 0) + 1
+
+    def _discard(self, prepared_statement):
+        """Drop an evicted statement unless it is still in use (it is dropped on release then)"""
+        if prepared_statement.statement_id not in self._uses:
+            self._dropped.append(prepared_statement)
+
+    def _is_cached(self, prepared_statement):
+        return any(cached.statement_id == prepared_statement.statement_id for cached in self._statements.values())
+
+
+class FlowResult(object):
+    """Finishes a request flow with a value, generators cannot return values on Python 2"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class RequestFlow(object):
+    """Runs a request flow, a generator which yields the requests to send and receives their replies.
+    A flow may also yield another flow, which runs to its end before the yielding flow is resumed with its
+    result, and is finished by yielding a FlowResult. The error of a request is raised within the flow which
+    yielded the request.
+
+    Flows build the requests and handle the replies, sending the requests is left to the caller. This way
+    the flows are shared by Cursor and AsyncCursor.
+    """
+
+    def __init__(self, flow):
+        self._flows = [flow]
+        self.result = None
+
+    def start(self):
+        """Start the flow
+        :returns: the first request, None if the flow is finished
+        """
+        flow = self._flows[-1]
+        try:
+            item = next(flow)
+        except StopIteration:
+            item = FlowResult(None)
+        if isinstance(item, FlowResult):
+            # Shortcut for flows without requests, e.g. fetching rows which have been received already
+            flow.close()
+            self._flows.pop()
+            self.result = item.value
+            return None
+        return self._resume(None, None, item)
+
+    def send(self, reply):
+        """Resume the flow with the reply of the last request
+        :returns: the next request, None if the flow is finished
+        """
+        return self._resume(reply, None)
+
+    def throw(self, error):
+        """Raise the error of the last request within the flow
+        :returns: the next request, None if the flow is finished
+        """
+        return self._resume(None, error)
+
+    def _resume(self, value, error, item=None):
+        """Run the flows until a request is yielded
+        :param item: an item yielded by the current flow which has not been processed yet
+        """
+        while self._flows:
+            flow = self._flows[-1]
+            if item is None:
+                try:
+                    item = flow.send(value) if error is None else flow.throw(error)
+                except StopIteration:
+                    item = FlowResult(None)
+                except BaseException as exc:
+                    self._flows.pop()
+                    if not self._flows:
+                        raise
+                    # Raise the error within the parent flow
+                    value, error = None, exc
+                    continue
+
+            value = error = None
+            if isinstance(item, FlowResult):
+                flow.close()
+                self._flows.pop()
+                value = item.value
+            elif isinstance(item, types.GeneratorType):
+                self._flows.append(item)
+            else:
+                return item
+            item = None
+        self.result = value
+        return None
+
+
 class Cursor(object):
-    """Database cursor class"""
+    """Database cursor class.
+    Requests are built and their replies are handled by request flows (see RequestFlow), all methods
+    performing requests run a flow with _run().
+    """
     def __init__(self, connection):
         self.connection = connection
         self._buffer = iter([])
+        self._resultset_part = None  # ResultSet part the rows of self._buffer are unpacked from
         self._received_last_resultset_part = False
         self._executed = None
+        self._resultset_id = None
+        # True while the result set of the last execution is open on the server
+        self._resultset_open = False
 
         self.rowcount = -1
         self._column_types = None
+        self._row_decoder = None
         self.description = None
         self.rownumber = None
         self.arraysize = 1
+        # Return rows of result sets of subsequent executions as LazyRow instances, which decode the value of
+        # a column on first access, instead of tuples
+        self.lazy_rows = False
+        # Upper limit of rows requested with a single FETCHNEXT request
+        self.max_fetch_size = MAX_FETCH_SIZE
+        self._fetch_size = INITIAL_FETCH_SIZE
+        self._bytes_per_row = None
+        # Number of FETCHNEXT requests kept in flight while fetched rows are processed, 0 disables prefetching.
+        # Prefetching requires a blocking connection, AsyncCursor ignores it.
+        self.prefetch = 0
+        self._prefetched = collections.deque()  # PendingReply instances of prefetch requests
         self._prepared_statements = {}
+        # LOB buffers whose data is written after the reply of an INSERT or UPDATE, see _write_lobs_flow()
+        self._unwritten_lobs = None
 
     @property
     def prepared_statement_ids(self):
@@ -133,14 +368,37 @@ class Cursor(object):
     def get_prepared_statement(self, statement_id):
         return self._prepared_statements[statement_id]
 
+    def _run(self, flow):
+        """Send the requests of a request flow and return its result.
+        This is the only step of a request which differs between Cursor and AsyncCursor.
+        """
+        flow = RequestFlow(flow)
+        request = flow.start()
+        while request is not None:
+            try:
+                reply = self._send(request)
+            except BaseException as error:
+                request = flow.throw(error)
+            else:
+                request = flow.send(reply)
+        return flow.result
+
+    def _send(self, request):
+        """Send a request message, or wait for the reply of a submitted prefetch request"""
+        if isinstance(request, RequestMessage):
+            return self.connection.send_request(request)
+        return self.connection.wait_for_reply(request)
+
     def prepare(self, statement):
         """Prepare SQL statement in HANA and cache it
         :param statement; a valid SQL statement
         :returns: statement_id (of prepared and cached statement)
         """
+        return self._run(self._prepare_flow(statement))
+
+    def _prepare_flow(self, statement):
         self._check_closed()
         self._column_types = None
-        statement_id = params_metadata = result_metadata_part = None
 
         request = RequestMessage.new(
             self.connection,
@@ -149,9 +407,22 @@ class Cursor(object):
                 Command(statement)
             )
         )
-        response = self.connection.send_request(request)
+        response = yield request
+        yield FlowResult(self._handle_prepare(response.segments[0]))
 
-        for part in response.segments[0].parts:
+    def _handle_prepare(self, segment):
+        """Handle reply segment of a PREPARE request and cache the prepared statement in the cursor
+        :returns: statement_id (of prepared and cached statement)
+        """
+        prepared_statement = self._prepared_statement_from_reply(segment)
+        self._prepared_statements[prepared_statement.statement_id] = prepared_statement
+        return prepared_statement.statement_id
+
+    def _prepared_statement_from_reply(self, segment):
+        """Create a PreparedStatement instance from the reply segment of a PREPARE request"""
+        statement_id = params_metadata = result_metadata_part = None
+
+        for part in segment.parts:
             if part.kind == part_kinds.STATEMENTID:
                 statement_id = part.statement_id
             elif part.kind == part_kinds.PARAMETERMETADATA:
@@ -162,17 +433,48 @@ class Cursor(object):
         # Check that both variables have been set in previous loop, we need them:
         assert statement_id is not None
         assert params_metadata is not None
-        # cache statement:
-        self._prepared_statements[statement_id] = PreparedStatement(self.connection, statement_id,
-                                                                    params_metadata, result_metadata_part)
-        return statement_id
+        return PreparedStatement(self.connection, statement_id, params_metadata, result_metadata_part)
+
+    def _prepare_cached_flow(self, statement):
+        """Check out a prepared statement for a SQL text from the statement cache of the connection.
+        Only statements which are not cached yet are prepared in HANA. The statement has to be released with
+        _release_statements() after its execution.
+        """
+        cache = self.connection._statement_cache
+        prepared_statement = cache.get(statement)
+        if prepared_statement is None:
+            request = RequestMessage.new(
+                self.connection,
+                RequestSegment(
+                    message_types.PREPARE,
+                    Command(statement)
+                )
+            )
+            response = yield request
+            prepared_statement = cache.put(statement, self._prepared_statement_from_reply(response.segments[0]))
+        yield FlowResult(prepared_statement)
+
+    def _release_statements(self, prepared_statements):
+        """Release statements checked out from the statement cache and drop the statements in HANA which are
+        no longer cached nor used by another cursor.
+        Dropping is piggybacked onto the next request of the connection, so it does not take a round trip.
+        """
+        cache = self.connection._statement_cache
+        for prepared_statement in prepared_statements:
+            cache.release(prepared_statement)
+        for prepared_statement in cache.take_dropped():
+            self.connection._protocol.drop_statement(prepared_statement.statement_id)
 
     def execute_prepared(self, prepared_statement, multi_row_parameters):
         """
         :param prepared_statement: A PreparedStatement instance
         :param multi_row_parameters: A list/tuple containing list/tuples of parameters (for multiple rows)
         """
+        return self._run(self._execute_prepared_flow(prepared_statement, multi_row_parameters))
+
+    def _execute_prepared_flow(self, prepared_statement, multi_row_parameters):
         self._check_closed()
+        self._release_resultset()
 
         # Convert parameters into a generator producing lists with parameters as named tuples (incl. some meta data):
         parameters = prepared_statement.prepare_parameters(multi_row_parameters)
@@ -186,27 +488,16 @@ class Cursor(object):
                      Parameters(parameters))
                 )
             )
-            reply = self.connection.send_request(request)
-
-            parts = reply.segments[0].parts
-            function_code = reply.segments[0].function_code
-            if function_code == function_codes.SELECT:
-                self._handle_select(parts, prepared_statement.result_metadata_part)
-            elif function_code in function_codes.DML:
-                self._handle_upsert(parts, request.segments[0].parts[1].unwritten_lobs)
-            elif function_code == function_codes.DDL:
-                # No additional handling is required
-                pass
-            elif function_code in (function_codes.DBPROCEDURECALL, function_codes.DBPROCEDURECALLWITHRESULT):
-                self._handle_dbproc_call(parts, prepared_statement._params_metadata) # resultset metadata set in prepare
-            else:
-                raise InterfaceError("Invalid or unsupported function code received: %d" % function_code)
+            reply = yield request
+            self._handle_execute(reply.segments[0], prepared_statement, request.segments[0].parts[1].unwritten_lobs)
+            yield self._write_lobs_flow()
 
-    def _execute_direct(self, operation):
+    def _execute_direct_flow(self, operation):
         """Execute statements which are not going through 'prepare_statement' (aka 'direct execution').
         Either their have no parameters, or Python's string expansion has been applied to the SQL statement.
         :param operation:
         """
+        self._release_resultset()
         request = RequestMessage.new(
             self.connection,
             RequestSegment(
@@ -214,19 +505,33 @@ class Cursor(object):
                 Command(operation)
             )
         )
-        reply = self.connection.send_request(request)
+        reply = yield request
+        self._handle_execute(reply.segments[0])
+        if SET_SCHEMA_RE.match(operation):
+            # Cached statements might refer to tables of the previous schema
+            self.connection._statement_cache.invalidate()
+            self._release_statements(())
 
-        parts = reply.segments[0].parts
-        function_code = reply.segments[0].function_code
+    def _handle_execute(self, segment, prepared_statement=None, unwritten_lobs=()):
+        """Handle reply segment of an EXECUTE or EXECUTEDIRECT request
+        :param segment: reply segment
+        :param prepared_statement: PreparedStatement instance, None for direct execution
+        :param unwritten_lobs: lob buffers which did not fit into the parameters part of the request
+        """
+        parts = segment.parts
+        function_code = segment.function_code
         if function_code == function_codes.SELECT:
-            self._handle_select(parts)
+            result_metadata = prepared_statement.result_metadata_part if prepared_statement is not None else None
+            self._handle_select(parts, result_metadata)
         elif function_code in function_codes.DML:
-            self._handle_upsert(parts)
+            self._handle_upsert(parts, unwritten_lobs)
         elif function_code == function_codes.DDL:
             # No additional handling is required
             pass
         elif function_code in (function_codes.DBPROCEDURECALL, function_codes.DBPROCEDURECALLWITHRESULT):
-            self._handle_dbproc_call(parts, None)
+            # resultset metadata set in prepare
+            params_metadata = prepared_statement._params_metadata if prepared_statement is not None else None
+            self._handle_dbproc_call(parts, params_metadata)
         else:
             raise InterfaceError("Invalid or unsupported function code received: %d" % function_code)
 
@@ -251,14 +556,17 @@ class Cursor(object):
         are handle by Python's own string expansion mechanism.
         Note that case 3 is not yet supported by this method!
         """
+        return self._run(self._execute_flow(statement, parameters))
+
+    def _execute_flow(self, statement, parameters):
         self._check_closed()
 
         if not parameters:
             # Directly execute the statement, nothing else to prepare:
-            self._execute_direct(statement)
+            yield self._execute_direct_flow(statement)
         else:
-            self.executemany(statement, parameters=[parameters])
-        return self
+            yield self._executemany_flow(statement, [parameters])
+        yield FlowResult(self)
 
     def executemany(self, statement, parameters):
         """Execute statement on database with multiple rows to be inserted/updated
@@ -266,9 +574,13 @@ class Cursor(object):
         :param parameters: a nested list/tuple of parameters for multiple rows
         :returns: this cursor
         """
+        return self._run(self._executemany_flow(statement, parameters))
+
+    def _executemany_flow(self, statement, parameters):
+        self._check_closed()
         # First try safer hana-style parameter expansion:
         try:
-            statement_id = self.prepare(statement)
+            prepared_statement = yield self._prepare_cached_flow(statement)
         except DatabaseError as msg:
             # Hana expansion failed, check message to be sure of reason:
             if 'incorrect syntax near "%"' not in str(msg):
@@ -277,13 +589,145 @@ class Cursor(object):
             # Statement contained percentage char, so perform Python style parameter expansion:
             for row_params in parameters:
                 operation = format_operation(statement, row_params)
-                self._execute_direct(operation)
+                yield self._execute_direct_flow(operation)
         else:
             # Continue with Hana style statement execution:
-            prepared_statement = self.get_prepared_statement(statement_id)
-            self.execute_prepared(prepared_statement, parameters)
+            try:
+                yield self._execute_prepared_flow(prepared_statement, parameters)
+            finally:
+                self._release_statements([prepared_statement])
         # Return cursor object:
-        return self
+        yield FlowResult(self)
+
+    def execute_batch(self, operations):
+        """Execute many statements with as few round trips as possible.
+        Every statement is sent as a separate segment, as many segments as fit are combined into one request
+        message. Statements are executed in the given order and the cursor reflects the state after the last
+        statement, just as if the statements had been executed one after the other.
+        If a statement fails its error is raised, all statements sent before it have been executed.
+        Statements with parameters are prepared before the first statement is executed, so a SET SCHEMA
+        statement of the batch does not apply to them.
+        :param operations: a list of SQL statements (executed directly), or of (statement, parameters) tuples
+               for statements with HANA style parameters ('?' or ':1') which are prepared first
+        :returns: a list with the row count of every statement (-1 for statements without row count)
+        """
+        return self._run(self._execute_batch_flow(operations))
+
+    def _execute_batch_flow(self, operations):
+        self._check_closed()
+        self._release_resultset()
+        operations = [self._batch_operation(operation) for operation in operations]
+
+        # All statements of the batch are checked out from the statement cache until the batch is done
+        prepared_statements = self._batch_cached_statements(operations)
+        try:
+            max_segment_size = self.connection.packet_size - constants.general.MESSAGE_HEADER_SIZE
+            prepare_segments = self._batch_prepare_segments(operations, prepared_statements)
+            for chunk in self._split_batch(prepare_segments, max_segment_size):
+                reply = yield RequestMessage.new(self.connection, [segment for segment, _ in chunk])
+                self._handle_prepare_batch(chunk, reply, prepared_statements)
+
+            rowcounts = []
+            execute_segments = self._batch_execute_segments(operations, prepared_statements)
+            for chunk in self._split_batch(execute_segments, max_segment_size):
+                reply = yield RequestMessage.new(self.connection, [segment for segment, _ in chunk])
+                for (request_segment, prepared_statement), segment in self._batch_replies(chunk, reply):
+                    rowcounts.append(self._handle_batch_execute(segment, request_segment, prepared_statement))
+                    yield self._write_lobs_flow()
+        finally:
+            if any(SET_SCHEMA_RE.match(statement) for statement, parameters in operations if not parameters):
+                self.connection._statement_cache.invalidate()
+            self._release_statements(prepared_statements.values())
+        yield FlowResult(rowcounts)
+
+    @staticmethod
+    def _batch_operation(operation):
+        """Normalize an operation of a batch into a (statement, parameters) tuple"""
+        if isinstance(operation, (list, tuple)):
+            if len(operation) != 2:
+                raise ProgrammingError("Batch operations shall be statements or (statement, parameters) tuples")
+            return tuple(operation)
+        return operation, None
+
+    def _batch_cached_statements(self, operations):
+        """Return a dictionary with the statements of a batch found in the statement cache of the connection"""
+        cache = self.connection._statement_cache
+        prepared_statements = {}
+        for statement, parameters in operations:
+            if parameters and statement not in prepared_statements:
+                prepared_statement = cache.get(statement)
+                if prepared_statement is not None:
+                    prepared_statements[statement] = prepared_statement
+        return prepared_statements
+
+    @staticmethod
+    def _batch_prepare_segments(operations, prepared_statements):
+        """Return (segment, statement) tuples for preparing all distinct statements with parameters
+        which are not contained in prepared_statements yet
+        """
+        statements = []
+        for statement, parameters in operations:
+            if parameters and statement not in statements and statement not in prepared_statements:
+                statements.append(statement)
+        return [(RequestSegment(message_types.PREPARE, Command(statement)), statement) for statement in statements]
+
+    def _handle_prepare_batch(self, chunk, reply, prepared_statements):
+        """Add the statements prepared by a batch request to the statement cache and to prepared_statements"""
+        cache = self.connection._statement_cache
+        for (_, statement), segment in self._batch_replies(chunk, reply):
+            prepared_statements[statement] = cache.put(statement, self._prepared_statement_from_reply(segment))
+
+    @staticmethod
+    def _batch_execute_segments(operations, prepared_statements):
+        """Return (segment, prepared_statement) tuples for executing all operations"""
+        for statement, parameters in operations:
+            if not parameters:
+                yield RequestSegment(message_types.EXECUTEDIRECT, Command(statement)), None
+            else:
+                prepared_statement = prepared_statements[statement]
+                # Every segment requires its own row iterator, the prepared statement is shared:
+                row_parameters = copy.copy(prepared_statement).prepare_parameters([parameters])
+                yield RequestSegment(
+                    message_types.EXECUTE,
+                    (StatementId(prepared_statement.statement_id), Parameters(row_parameters))
+                ), prepared_statement
+
+    @staticmethod
+    def _split_batch(items, max_segment_size):
+        """Split (segment, ...) tuples into chunks whose segments fit together into one request message
+        :param max_segment_size: maximum size of all segments of a message
+        """
+        chunk = []
+        chunk_size = 0
+        for item in items:
+            segment_size = sum(len(buf) for buf in item[0].pack_buffers(segment_size=max_segment_size))
+            if chunk and chunk_size + segment_size > max_segment_size:
+                yield chunk
+                chunk = []
+                chunk_size = 0
+            chunk.append(item)
+            chunk_size += segment_size
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _batch_replies(chunk, reply):
+        """Pair the items of a chunk with the reply segments of their request segments"""
+        if len(reply.segments) != len(chunk):
+            raise InterfaceError("Batch request with %d segments, received %d reply segments" %
+                                 (len(chunk), len(reply.segments)))
+        return izip(chunk, reply.segments)
+
+    def _handle_batch_execute(self, segment, request_segment, prepared_statement):
+        """Handle reply segment of a batched EXECUTE or EXECUTEDIRECT request
+        :returns: row count of the statement
+        """
+        self.rowcount = -1
+        if prepared_statement is None:
+            self._handle_execute(segment)
+        else:
+            self._handle_execute(segment, prepared_statement, request_segment.parts[1].unwritten_lobs)
+        return self.rowcount
 
     def _handle_upsert(self, parts, unwritten_lobs=()):
         """Handle reply messages from INSERT or UPDATE statements"""
@@ -304,17 +748,17 @@ class Cursor(object):
                 for lob_buffer, lob_locator_id in izip(unwritten_lobs, part.locator_ids):
                     # store locator_id in every lob buffer instance for later reference:
                     lob_buffer.locator_id = lob_locator_id
-                self._perform_lob_write_requests(unwritten_lobs)
+                self._unwritten_lobs = unwritten_lobs
             else:
                 raise InterfaceError("Prepared insert statement response, unexpected part kind %d." % part.kind)
         self._executed = True
 
-    def _perform_lob_write_requests(self, unwritten_lobs):
-        """After sending incomplete LOB data during an INSERT or UPDATE this method will be called.
+    def _write_lobs_flow(self):
+        """After sending incomplete LOB data during an INSERT or UPDATE this flow runs.
         It sends missing LOB data possibly in multiple LOBWRITE requests for all LOBs.
-        :param unwritten_lobs: A deque list of LobBuffer instances containing LOB data.
-               Those buffers have been assembled in the parts.Parameter.pack_lob_data() method.
+        The LobBuffer instances have been assembled in the parts.Parameter.pack_lob_data() method.
         """
+        unwritten_lobs, self._unwritten_lobs = self._unwritten_lobs, None
         while unwritten_lobs:
             request = RequestMessage.new(
                 self.connection,
@@ -323,23 +767,24 @@ class Cursor(object):
                     WriteLobRequest(unwritten_lobs)
                 )
             )
-            self.connection.send_request(request)
+            yield request
 
     def _handle_select(self, parts, result_metadata=None):
         """Handle reply messages from SELECT statements"""
         self.rowcount = -1
         if result_metadata is not None:
             # Select was prepared and we can use the already received metadata
-            self.description, self._column_types = self._handle_result_metadata(result_metadata)
+            self._set_result_metadata(result_metadata)
 
         for part in parts:
             if part.kind == part_kinds.RESULTSETID:
-                self._resultset_id = part.value
+                self._handle_resultset_id(part.value)
             elif part.kind == part_kinds.RESULTSETMETADATA:
-                self.description, self._column_types = self._handle_result_metadata(part)
+                self._set_result_metadata(part)
             elif part.kind == part_kinds.RESULTSET:
-                self._buffer = part.unpack_rows(self._column_types, self.connection)
+                self._buffer = part.unpack_rows(self._column_types, self.connection, self._row_decoder)
                 self._received_last_resultset_part = part.attribute & 1
+                self._handle_resultset_part(part)
                 self._executed = True
             elif part.kind in (part_kinds.STATEMENTCONTEXT, part_kinds.TRANSACTIONFLAGS):
                 pass
@@ -357,20 +802,27 @@ class Cursor(object):
                 pass
             elif part.kind == part_kinds.OUTPUTPARAMETERS:
                 self._buffer = part.unpack_rows(parameters_metadata, self.connection)
+                self._resultset_part = None
                 self._received_last_resultset_part = True
                 self._executed = True
             elif part.kind == part_kinds.RESULTSETMETADATA:
-                self.description, self._column_types = self._handle_result_metadata(part)
+                self._set_result_metadata(part)
             elif part.kind == part_kinds.RESULTSETID:
-                self._resultset_id = part.value
+                self._handle_resultset_id(part.value)
             elif part.kind == part_kinds.RESULTSET:
-                self._buffer = part.unpack_rows(self._column_types, self.connection)
+                self._buffer = part.unpack_rows(self._column_types, self.connection, self._row_decoder)
                 self._received_last_resultset_part = part.attribute & 1
+                self._handle_resultset_part(part)
                 self._executed = True
             else:
                 raise InterfaceError("Stored procedure call, unexpected part kind %d." % part.kind)
         self._executed = True
 
+    def _set_result_metadata(self, result_metadata):
+        self.description, self._column_types = self._handle_result_metadata(result_metadata)
+        # Rows of all parts of the result set are unpacked with the same decoder
+        self._row_decoder = row_decoder(self._column_types, self.lazy_rows)
+
     def _handle_result_metadata(self, result_metadata):
         description = []
         column_types = []
@@ -388,12 +840,60 @@ class Cursor(object):
         :param size: Number of rows to return.
         :returns: list of row records (tuples)
         """
-        self._check_closed()
-        if not self._executed:
-            raise ProgrammingError("Require execute() first")
+        return self._run(self._fetchmany_flow(size))
+
+    def _fetchmany_flow(self, size):
+        self._check_executed()
         if size is None:
             size = self.arraysize
 
+        result = self._fetch_buffered(size)
+        while len(result) < size and not self._received_last_resultset_part:
+            yield self._fetch_more_flow(size - len(result))
+            result.extend(self._fetch_buffered(size - len(result)))
+        yield FlowResult(result)
+
+    def _fetch_more_flow(self, missing):
+        """Receive the next batch of rows of the result set into the buffer.
+        Rows exceeding the number of missing rows are kept for the next fetch.
+        :param missing: number of rows required by the caller
+        """
+        if self._prefetching:
+            self._submit_prefetch(missing)
+            reply = yield self._prefetched.popleft()
+        else:
+            request = RequestMessage.new(
+                self.connection,
+                self._fetchnext_segment(self._next_fetch_size(missing))
+            )
+            reply = yield request
+        self._buffer = self._handle_fetchnext(reply.segments[0])
+
+        if self._received_last_resultset_part:
+            # Replies of requests sent after the last rows are not needed (the result set is closed already)
+            self._prefetched.clear()
+        elif self._prefetching:
+            # The server delivers the next batches while the caller processes the rows of this one
+            self._submit_prefetch(missing)
+
+    @property
+    def _prefetching(self):
+        # Prefetch requests are submitted without waiting for their replies, which requires a blocking connection
+        return self.prefetch and not getattr(self.connection, 'is_async', False)
+
+    def _submit_prefetch(self, missing):
+        """Submit FETCHNEXT requests until self.prefetch requests are in flight
+        :param missing: number of rows required by the caller
+        """
+        while len(self._prefetched) < self.prefetch:
+            request = RequestMessage.new(
+                self.connection,
+                self._fetchnext_segment(self._next_fetch_size(missing))
+            )
+            self._prefetched.append(self.connection.submit_request(request))
+
+    def _fetch_buffered(self, size):
+        """Return up to size rows which have already been received from the server"""
         result = []
         cnt = 0
         while cnt != size:
@@ -402,34 +902,36 @@ class Cursor(object):
                 cnt += 1
             except StopIteration:
                 break
+        return result
 
-        if cnt == size or self._received_last_resultset_part:
-            # No rows are missing or there are no additional rows
-            return result
-
-        request = RequestMessage.new(
-            self.connection,
-            RequestSegment(
-                message_types.FETCHNEXT,
-                (ResultSetId(self._resultset_id), FetchSize(size - cnt))
-            )
+    def _fetchnext_segment(self, size):
+        return RequestSegment(
+            message_types.FETCHNEXT,
+            (ResultSetId(self._resultset_id), FetchSize(size))
         )
-        response = self.connection.send_request(request)
 
-        resultset_part = response.segments[0].parts[1]
+    def _handle_fetchnext(self, segment):
+        """Handle reply segment of a FETCHNEXT request
+        :returns: a generator object producing the received rows
+        """
+        resultset_part = segment.parts[1]
         if resultset_part.attribute & 1:
             self._received_last_resultset_part = True
-        result.extend(resultset_part.unpack_rows(self._column_types, self.connection))
-        return result
+        self._handle_resultset_part(resultset_part)
+        return resultset_part.unpack_rows(self._column_types, self.connection, self._row_decoder)
 
     def fetchone(self):
         """Fetch one row from select result set.
         :returns: a single row tuple
         """
-        result = self.fetchmany(size=1)
-        if result:
-            return result[0]
-        return None
+        return self._run(self._fetchone_flow())
+
+    def _fetchone_flow(self):
+        self._check_executed()
+        result = self._fetch_buffered(1)
+        if not result and not self._received_last_resultset_part:
+            result = yield self._fetchmany_flow(1)
+        yield FlowResult(result[0] if result else None)
 
     FETCHALL_BLOCKSIZE = 1024
 
@@ -437,15 +939,142 @@ class Cursor(object):
         """Fetch all available rows from select result set.
         :returns: list of row tuples
         """
-        result = r = self.fetchmany(size=self.FETCHALL_BLOCKSIZE)
+        return self._run(self._fetchall_flow())
+
+    def _fetchall_flow(self):
+        result = r = yield self._fetchmany_flow(self.FETCHALL_BLOCKSIZE)
         while len(r) == self.FETCHALL_BLOCKSIZE or not self._received_last_resultset_part:
-            r = self.fetchmany(size=self.FETCHALL_BLOCKSIZE)
+            r = yield self._fetchmany_flow(self.FETCHALL_BLOCKSIZE)
             result.extend(r)
-        return result
+        yield FlowResult(result)
+
+    def _handle_resultset_id(self, resultset_id):
+        # A batch returns a result set per SELECT statement, only the last one is kept open for fetching
+        self._release_resultset()
+        self._resultset_id = resultset_id
+        self._resultset_open = True
+        self._fetch_size = INITIAL_FETCH_SIZE
+        self._bytes_per_row = None
+
+    def _handle_resultset_part(self, part):
+        self._resultset_part = part
+        if part.attribute & ResultSet.RESULTSET_CLOSED:
+            # The server closed the result set after sending its last rows
+            self._resultset_open = False
+        if part.num_rows and part.header is not None:
+            self._bytes_per_row = part.header.payload_size // part.num_rows + 1
+
+    def _next_fetch_size(self, missing):
+        """Return the number of rows to request with the next FETCHNEXT request of the current result set.
+        The number grows geometrically with every request. It is limited by max_fetch_size and by the number
+        of rows fitting into a packet, estimated from the size of the rows received so far.
+        :param missing: number of rows required by the caller
+        """
+        limit = min(self.max_fetch_size, MAX_FETCH_SIZE)
+        if self._bytes_per_row:
+            limit = min(limit, self.connection.packet_size // self._bytes_per_row)
+        size = max(min(max(missing, self._fetch_size), limit), 1)
+        self._fetch_size = max(min(2 * size, limit), 1)
+        return size
+
+    def _release_resultset(self):
+        """Close the result set of the last execution on the server if it is still open.
+        Closing is piggybacked onto the next request of the connection, so it does not take a round trip.
+        """
+        if self._resultset_open and self.connection is not None and not self.connection.closed:
+            self.connection._protocol.close_resultset(self._resultset_id)
+        self._resultset_open = False
+        # Replies of outstanding prefetch requests are received (and discarded) by the connection
+        self._prefetched.clear()
+
+    def __iter__(self):
+        """Iterate over the remaining rows of the result set.
+        Rows are unpacked one at a time from the received batch, the next batch is fetched once it is consumed.
+        """
+        self._check_executed()
+        while True:
+            for row in self._buffer:
+                yield row
+            if self._received_last_resultset_part:
+                return
+            self._run(self._fetch_more_flow(self.arraysize))
+
+    def iter_batches(self, size=None):
+        """Iterate over the remaining rows of the result set in lists of rows.
+        :param size: maximum number of rows of every list, defaults to arraysize
+        :returns: a generator producing lists of row tuples
+        """
+        while True:
+            rows = self.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+
+    def fetch_columns(self, size=None):
+        """Fetch many rows from select result set as columns.
+        Values are unpacked from the received result set parts straight into one container per column,
+        no tuple is created per row.
+        :param size: Number of rows to return, defaults to arraysize
+        :returns: a ColumnBatch instance
+        """
+        return self._run(self._fetch_columns_flow(ColumnBuilder, self.arraysize if size is None else size))
+
+    def fetch_numpy(self, size=None):
+        """Fetch many rows from select result set as NumPy arrays (requires numpy).
+        Result set parts with numeric columns only are decoded without unpacking single values.
+        :param size: Number of rows to return, defaults to all remaining rows
+        :returns: a ColumnBatch instance with one NumPy array per column in values and one boolean array
+                  per column in nulls
+        """
+        return self._run(self._fetch_columns_flow(NumpyColumnBuilder, sys.maxsize if size is None else size))
+
+    def fetch_dataframe(self, size=None):
+        """Fetch many rows from select result set as pandas DataFrame (requires numpy and pandas).
+        :param size: Number of rows to return, defaults to all remaining rows
+        :returns: a pandas.DataFrame instance with the column names of the result set
+        """
+        return self._run(self._fetch_dataframe_flow(sys.maxsize if size is None else size))
+
+    def _fetch_dataframe_flow(self, size):
+        # Fail before rows are consumed if pandas is not installed
+        import_pandas()
+        columns = yield self._fetch_columns_flow(NumpyColumnBuilder, size)
+        yield FlowResult(to_dataframe(columns, self.description))
+
+    def _fetch_columns_flow(self, builder_class, size):
+        """Unpack up to size rows with a ColumnBuilder, fetching more rows from the server as required"""
+        self._check_executed()
+        builder = builder_class(self._column_types or ())
+        count = self._fetch_buffered_into(builder, size)
+        while count < size and not self._received_last_resultset_part:
+            yield self._fetch_more_flow(size - count)
+            count += self._fetch_buffered_into(builder, size - count)
+        yield FlowResult(builder.result())
+
+    def _fetch_buffered_into(self, builder, size):
+        """Unpack up to size rows which have already been received from the server with a ColumnBuilder
+        :returns: number of unpacked rows
+        """
+        if self._resultset_part is not None:
+            return builder.unpack_part(self._resultset_part, self.connection, size)
+        rows = self._fetch_buffered(size)
+        builder.append_rows(rows)
+        return len(rows)
 
     def close(self):
+        self._release_resultset()
         self.connection = None
 
+    def __del__(self):
+        # Result sets of cursors which are not closed explicitly are released on garbage collection
+        if getattr(self, '_resultset_open', False):
+            self._release_resultset()
+
     def _check_closed(self):
         if self.connection is None or self.connection.closed:
             raise ProgrammingError("Cursor closed")
+
+    def _check_executed(self):
+        self._check_closed()
+        if not self._executed:
+            raise ProgrammingError("Require execute() first")
@@ -47,6 +47,12 @@ class ConnectionTimedOutError(OperationalError):
         super(ConnectionTimedOutError, self).__init__(message)
 
 
+class PoolTimeoutError(OperationalError):
+
+    def __init__(self, message=None):
+        super(PoolTimeoutError, self).__init__(message)
+
+
 class ProgrammingError(DatabaseError):
     pass
 
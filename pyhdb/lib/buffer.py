@@ -0,0 +1,81 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+from os import SEEK_SET, SEEK_CUR, SEEK_END
+
+
+class BufferReader(object):
+    """Read-only file-like object on top of a memoryview.
+    In contrast to io.BytesIO no copy of the underlying data is made. Readers for sub-ranges
+    (e.g. the payload of a segment or a part) share the buffer of their parent reader.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._size = len(self._view)
+        self._pos = 0
+
+    @classmethod
+    def from_payload(cls, payload, size=-1):
+        """Return a reader for the next size bytes of payload.
+        If payload is a BufferReader itself the new reader shares its buffer, otherwise the data is read
+        from the (file-like) payload object.
+        """
+        if isinstance(payload, cls):
+            return payload.subreader(size)
+        return cls(payload.read(size))
+
+    def __len__(self):
+        return self._size
+
+    def read_view(self, n=-1):
+        """Read up to n bytes and return them as memoryview (without copying)"""
+        start = self._pos
+        if n is None or n < 0:
+            end = max(start, self._size)
+        else:
+            end = max(start, min(start + n, self._size))
+        self._pos = end
+        return self._view[start:end]
+
+    def read(self, n=-1):
+        """Read up to n bytes and return them as bytes object. If n is -1 all remaining data is returned."""
+        return self.read_view(n).tobytes()
+
+    def subreader(self, n=-1):
+        """Return a new reader for the next n bytes sharing the same buffer"""
+        return self.__class__(self.read_view(n))
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=SEEK_SET):
+        if whence == SEEK_SET:
+            pos = offset
+        elif whence == SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("Invalid whence (%r)" % whence)
+        if pos < 0:
+            raise ValueError("Negative seek position %d" % pos)
+        self._pos = pos
+        return pos
+
+    def getbuffer(self):
+        return self._view
+
+    def getvalue(self):
+        return self._view.tobytes()
@@ -0,0 +1,257 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import logging
+import threading
+import collections
+from contextlib import contextmanager
+###
+from pyhdb.connection import Connection
+from pyhdb.exceptions import Error, InterfaceError, PoolTimeoutError
+
+logger = logging.getLogger('pyhdb')
+debug = logger.debug
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of database connections.
+
+    Connections are handed out in LIFO order, so that the most recently used (and therefore most likely still
+    alive) connection is reused first. Connections returned to the pool are rolled back and all their cursors
+    are closed. Connections which have been idle for more than validation_interval seconds are checked with a
+    cheap query before being handed out again.
+    """
+    VALIDATION_QUERY = 'SELECT 1 FROM DUMMY'
+
+    def __init__(self, host, port, user, password, autocommit=False, timeout=None,
+                 min_size=0, max_size=10, checkout_timeout=None, validation_interval=30, **connection_options):
+        """Initialize connection pool
+        :param host, port, user, password, autocommit, timeout: parameters for every new Connection
+        :param min_size: number of connections opened when the pool is created, discarded connections are
+               replaced until the pool has min_size connections again
+        :param max_size: maximum number of connections (idle and checked out)
+        :param checkout_timeout: seconds to wait for a free connection, None means waiting forever
+        :param validation_interval: idle time in seconds after which a connection is validated on checkout,
+               None disables validation
+        :param connection_options: further keyword arguments for every new Connection (e.g. packet_size or
+               socket options like tcp_nodelay)
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise InterfaceError("Invalid pool size: min_size=%d, max_size=%d" % (min_size, max_size))
+
+        self.host = host
+        self.port = port
+        self.user = user
+        self._password = password
+        self.autocommit = autocommit
+        self.timeout = timeout
+        self.connection_options = connection_options
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.validation_interval = validation_interval
+
+        self._closed = False
+        self._init_state()
+
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.time()))
+            self._size += 1
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = collections.deque()  # stack of (connection, time of return) tuples
+        self._checked_out = set()
+        self._size = 0  # number of idle and checked out connections
+
+    def __repr__(self):
+        return '<ConnectionPool host=%s port=%s user=%s size=%d idle=%d>' % \
+               (self.host, self.port, self.user, self._size, len(self._idle))
+
+    def _new_connection(self):
+        connection = Connection(self.host, self.port, self.user, self._password, self.autocommit, self.timeout,
+                                **self.connection_options)
+        connection.connect()
+        return connection
+
+    def _check_fork(self):
+        """Drop all connections inherited from a parent process.
+        The sockets are shared with the parent, so the connections must neither be used nor closed properly
+        (closing would disconnect the session of the parent process).
+        """
+        if self._pid != os.getpid():
+            debug('Process fork detected, discarding %d inherited connections', self._size)
+            self._init_state()
+
+    def _fill(self):
+        """Open idle connections until the pool has min_size connections again, e.g. after broken connections
+        have been discarded. Failures are only logged, the pool is filled again later.
+        """
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                # Reserve slot for a new connection which is opened outside of the lock
+                self._size += 1
+            try:
+                connection = self._new_connection()
+            except Exception as error:
+                debug('Opening connection to refill the pool failed: %r', error)
+                self._discard(None)
+                return
+            with self._lock:
+                self._idle.append((connection, time.time()))
+                self._lock.notify()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def get_connection(self, timeout=-1):
+        """Check out a connection from the pool
+        :param timeout: seconds to wait for a free connection, defaults to the checkout_timeout of the pool
+        :returns: Connection instance
+        """
+        if timeout == -1:
+            timeout = self.checkout_timeout
+        deadline = None if timeout is None else time.time() + timeout
+
+        self._check_fork()
+        self._fill()
+        while True:
+            with self._lock:
+                connection = last_used = None
+                while connection is None:
+                    if self._closed:
+                        raise Error("Connection pool closed")
+                    if self._idle:
+                        connection, last_used = self._idle.pop()
+                    elif self._size < self.max_size:
+                        # Reserve slot for a new connection which is opened outside of the lock
+                        self._size += 1
+                        break
+                    else:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            raise PoolTimeoutError("No free connection available in pool within %s seconds" %
+                                                   timeout)
+                        self._lock.wait(remaining)
+
+            if connection is None:
+                try:
+                    connection = self._new_connection()
+                except Exception:
+                    self._discard(None)
+                    raise
+            elif not self._validate(connection, last_used):
+                self._discard(connection)
+                continue
+
+            with self._lock:
+                self._checked_out.add(connection)
+            return connection
+
+    def _validate(self, connection, last_used):
+        """Return True if connection can be handed out again"""
+        if connection.closed:
+            return False
+        if self.validation_interval is None or time.time() - last_used < self.validation_interval:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.VALIDATION_QUERY)
+            cursor.fetchall()
+            cursor.close()
+        except Error as error:
+            debug('Validation of idle connection %r failed: %r', connection, error)
+            return False
+        return True
+
+    def _discard(self, connection):
+        """Close connection (if possible) and release its slot in the pool"""
+        if connection is not None and not connection.closed:
+            try:
+                connection.close()
+            except Error:
+                pass
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+    def _reset(self, connection):
+        """Reset connection before it is reused: drop open result sets and roll back the transaction"""
+        connection._close_cursors()
+        connection.rollback()
+
+    def release(self, connection):
+        """Return a checked out connection to the pool"""
+        if self._pid != os.getpid():
+            # Connection was checked out in the parent process, just forget about it:
+            self._check_fork()
+            self._fill()
+            return
+
+        with self._lock:
+            if connection not in self._checked_out:
+                raise InterfaceError("Connection %r does not belong to this pool" % connection)
+            self._checked_out.remove(connection)
+
+        if self._closed or connection.closed:
+            self._discard(connection)
+            self._fill()
+            return
+        try:
+            self._reset(connection)
+        except Error as error:
+            debug('Reset of returned connection %r failed: %r', connection, error)
+            self._discard(connection)
+            self._fill()
+            return
+
+        with self._lock:
+            self._idle.append((connection, time.time()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=-1):
+        """Context manager which checks out a connection and returns it to the pool afterwards"""
+        connection = self.get_connection(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Close all idle connections. Checked out connections are closed when they are returned."""
+        self._check_fork()
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._lock.notify_all()
+        for connection in idle:
+            self._discard(connection)
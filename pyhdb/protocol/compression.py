@@ -0,0 +1,110 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zlib
+###
+from pyhdb.exceptions import InterfaceError, OperationalError
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+# Message payloads smaller than this number of bytes are sent uncompressed
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+
+
+class Compression(object):
+    """
+    Base class of codecs for compressing message payloads.
+
+    The client proposes a codec with the connect option 'compression_level_and_flags' (codec id in the
+    upper, compression level in the lowest byte). Compression is only used if the server confirms the same
+    value in the connect options of its reply.
+    """
+    name = None
+    codec_id = None
+    default_level = None
+
+    def __init__(self, level=None, threshold=DEFAULT_COMPRESSION_THRESHOLD):
+        self.level = self.default_level if level is None else level
+        self.threshold = threshold
+
+    def __repr__(self):
+        return '<%s level=%d threshold=%d>' % (self.__class__.__name__, self.level, self.threshold)
+
+    @property
+    def option_value(self):
+        """Value of the connect option 'compression_level_and_flags'"""
+        return self.codec_id << 8 | self.level
+
+    def compress(self, data):
+        raise NotImplementedError
+
+    def decompress(self, data, uncompressed_size):
+        raise NotImplementedError
+
+
+class ZlibCompression(Compression):
+    name = 'zlib'
+    codec_id = 1
+    default_level = 1  # fastest
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, uncompressed_size):
+        try:
+            payload = zlib.decompress(data, zlib.MAX_WBITS, uncompressed_size)
+        except zlib.error as error:
+            raise OperationalError("Invalid compressed message payload (%s)" % error)
+        if len(payload) != uncompressed_size:
+            raise OperationalError("Decompressed message payload has %d bytes, expected %d" %
+                                   (len(payload), uncompressed_size))
+        return payload
+
+
+class LZ4Compression(Compression):
+    name = 'lz4'
+    codec_id = 2
+    default_level = 0  # lz4 default mode
+
+    def __init__(self, level=None, threshold=DEFAULT_COMPRESSION_THRESHOLD):
+        if lz4 is None:
+            raise InterfaceError("lz4 compression requires the lz4 package")
+        super(LZ4Compression, self).__init__(level, threshold)
+
+    def compress(self, data):
+        return lz4.block.compress(bytes(data), compression=self.level, store_size=False)
+
+    def decompress(self, data, uncompressed_size):
+        try:
+            return lz4.block.decompress(bytes(data), uncompressed_size=uncompressed_size)
+        except lz4.block.LZ4BlockError as error:
+            raise OperationalError("Invalid compressed message payload (%s)" % error)
+
+
+CODECS = dict((codec.name, codec) for codec in (ZlibCompression, LZ4Compression))
+
+
+def get_compression(name, threshold=DEFAULT_COMPRESSION_THRESHOLD):
+    """Return compression instance for codec name ('zlib' or 'lz4'), None if name is None"""
+    if name is None:
+        return None
+    try:
+        codec = CODECS[name]
+    except KeyError:
+        raise InterfaceError("Unknown compression codec %r, supported codecs are: %s" %
+                             (name, ", ".join(sorted(CODECS))))
+    return codec(threshold=threshold)
@@ -31,4 +31,4 @@ DEFAULT_CONNECTION_OPTIONS = {
     "data_format_version2": 1
 }
 
-from pyhdb.protocol.constants.general import MAX_MESSAGE_SIZE, MAX_SEGMENT_SIZE
+from pyhdb.protocol.constants.general import MAX_MESSAGE_SIZE, MAX_SEGMENT_SIZE, MIN_PACKET_SIZE, MAX_PACKET_SIZE
@@ -12,6 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-MAX_MESSAGE_SIZE = 2**17
+MAX_MESSAGE_SIZE = 2**17  # default packet size of a connection
 MESSAGE_HEADER_SIZE = 32  # this will be verified on 'Message'-class creation
 MAX_SEGMENT_SIZE = MAX_MESSAGE_SIZE - MESSAGE_HEADER_SIZE
+
+# Range of packet sizes which can be configured for a connection. The upper limit is imposed by the server
+# (message and segment lengths are signed 4 byte integers).
+MIN_PACKET_SIZE = 2**16
+MAX_PACKET_SIZE = 2**31 - 1
+
+# Bit of the packet options in the message header which marks a compressed message payload
+PACKET_OPTION_COMPRESSED = 0x02
@@ -25,5 +25,7 @@ AUTHENTICATE = 65
 CONNECT = 66
 COMMIT = 67
 ROLLBACK = 68
+CLOSERESULTSET = 69
+DROPSTATEMENTID = 70
 FETCHNEXT = 71
 DISCONNECT = 77
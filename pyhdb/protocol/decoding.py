@@ -0,0 +1,311 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Row decoders compiled for the column types of a result set.
+
+A row decoder is generated once per tuple of column types and unpacks a whole row with straight-line code.
+Runs of adjacent fixed width columns are unpacked together with a single struct, NULL markers and the bit
+fields of dates and times are handled afterwards. Values of single integer and floating point columns are
+unpacked with precompiled structs directly from the memoryview of the part payload, all other values are
+unpacked with the from_buffer() method of their type.
+
+Lazy row decoders only determine the offsets of the values of a row and return LazyRow instances, which
+decode a value on first access.
+"""
+
+from __future__ import absolute_import
+
+import struct
+import datetime
+import threading
+###
+from pyhdb.protocol.types import TinyInt, SmallInt, Int, BigInt, Decimal, Real, Double, Date, Time, Timestamp, \
+    MixinStringType, MixinLobType
+from pyhdb.protocol.headers import ReadLobHeader
+from pyhdb.compat import PY2
+
+# Integer types, values are preceded by a NULL indicator byte (0 for NULL values, without further data)
+INDICATOR_TYPES = (TinyInt, SmallInt, Int, BigInt)
+# Floating point types, NULL values have all bits set
+NULL_PATTERN_TYPES = (Real, Double)
+# Struct format of the fields of fixed width values, integers including their NULL indicator. A run of adjacent
+# columns of these types is unpacked at once, integer values only as long as none of them is NULL.
+FIXED_WIDTH_FORMATS = {
+    TinyInt: 'BB',
+    SmallInt: 'Bh',
+    Int: 'Bi',
+    BigInt: 'Bq',
+    Real: 'f',
+    Double: 'd',
+    Date: 'HBB',
+    Time: 'BBH',
+    Timestamp: 'HBBBBH',
+}
+
+# Maximum number of cached row decoders, the cache is cleared once it is full
+ROW_DECODER_CACHE_SIZE = 256
+
+_row_decoders = {}
+_row_decoders_lock = threading.Lock()
+
+
+def row_decoder(column_types, lazy=False):
+    """Return the (cached) row decoder for a tuple of column types
+    :param column_types: a tuple of column descriptors
+    :param lazy: if True rows are returned as LazyRow instances instead of tuples
+    :returns: function decode_row(view, offset, connection) returning a tuple (row, offset of the next row) for
+              the row starting at offset of the memoryview
+    """
+    key = (column_types, lazy)
+    try:
+        return _row_decoders[key]
+    except KeyError:
+        pass
+    decode_row = compile_lazy_row_decoder(column_types) if lazy else compile_row_decoder(column_types)
+    with _row_decoders_lock:
+        if len(_row_decoders) >= ROW_DECODER_CACHE_SIZE:
+            _row_decoders.clear()
+        _row_decoders[key] = decode_row
+    return decode_row
+
+
+def _byte_at(expression):
+    return ('ord(view[%s])' if PY2 else 'view[%s]') % expression
+
+
+def compile_row_decoder(column_types):
+    """Generate the source of a row decoder for column types and compile it, see row_decoder()"""
+    namespace = {'struct_error': struct.error, 'date': datetime.date, 'time': datetime.time,
+                 'datetime': datetime.datetime}
+    lines = ['def decode_row(view, offset, connection):']
+    index = 0
+    while index < len(column_types):
+        run = 0
+        while index + run < len(column_types) and column_types[index + run] in FIXED_WIDTH_FORMATS:
+            run += 1
+        if run > 1:
+            lines.extend(_run_lines(index, column_types[index:index + run], namespace))
+            index += run
+        else:
+            lines.extend(_column_lines(index, column_types[index], namespace, '    '))
+            index += 1
+    lines.append('    return (%s), offset' % ''.join('v%d, ' % index for index in range(len(column_types))))
+    exec(compile('\n'.join(lines), '<row decoder>', 'exec'), namespace)
+    return namespace['decode_row']
+
+
+def _column_lines(index, typ, namespace, indent):
+    """Return the source lines unpacking the value v<index> of a single column"""
+    if typ in INDICATOR_TYPES:
+        namespace['unpack_%d' % index] = typ._struct.unpack_from
+        lines = [
+            'if %s:' % _byte_at('offset'),
+            '    v%d = unpack_%d(view, offset + 1)[0]' % (index, index),
+            '    offset += %d' % (typ._struct.size + 1),
+            'else:',
+            '    v%d = None' % index,
+            '    offset += 1',
+        ]
+    elif typ in NULL_PATTERN_TYPES:
+        namespace['unpack_%d' % index] = typ._struct.unpack_from
+        lines = [
+            'v%d = unpack_%d(view, offset)[0]' % (index, index),
+        ] + _null_pattern_lines(index, typ, 'offset', namespace) + [
+            'offset += %d' % typ._struct.size,
+        ]
+    else:
+        namespace['from_buffer_%d' % index] = typ.from_buffer
+        lines = ['v%d, offset = from_buffer_%d(view, offset, connection)' % (index, index)]
+    return [indent + line for line in lines]
+
+
+def _null_pattern_lines(index, typ, position, namespace):
+    size = typ._struct.size
+    namespace['null_%d' % index] = b'\xff' * size
+    # All bits set is a NaN, so only NaN values need to be compared with the NULL value
+    return [
+        'if v%d != v%d and view[%s:%s + %d].tobytes() == null_%d:' % (index, index, position, position, size, index),
+        '    v%d = None' % index,
+    ]
+
+
+def _run_lines(first_index, run_types, namespace):
+    """Return the source lines unpacking the values of a run of adjacent fixed width columns with a single struct"""
+    run_struct = struct.Struct('<' + ''.join(FIXED_WIDTH_FORMATS[typ] for typ in run_types))
+    namespace['unpack_run_%d' % first_index] = run_struct.unpack_from
+
+    fields = []
+    indicators = []
+    post_lines = []
+    position = 0
+    for index, typ in enumerate(run_types, first_index):
+        if typ in INDICATOR_TYPES:
+            fields.extend(['n%d' % index, 'v%d' % index])
+            indicators.append('n%d' % index)
+        elif typ in NULL_PATTERN_TYPES:
+            fields.append('v%d' % index)
+            post_lines.extend(_null_pattern_lines(index, typ, 'offset + %d' % position, namespace))
+        elif typ is Date:
+            fields.extend(['y%d' % index, 'mo%d' % index, 'd%d' % index])
+            post_lines.append('v%d = date(y%d & 0x3FFF, mo%d + 1, d%d) if y%d & 0x8000 else None' %
+                              ((index,) * 5))
+        elif typ is Time:
+            fields.extend(['h%d' % index, 'mi%d' % index, 'ms%d' % index])
+            post_lines.append('v%d = time(h%d & 0x7F, mi%d, ms%d // 1000, ms%d %% 1000 * 1000) '
+                              'if h%d & 0x80 else None' % ((index,) * 6))
+        else:  # Timestamp
+            fields.extend(['y%d' % index, 'mo%d' % index, 'd%d' % index,
+                           'h%d' % index, 'mi%d' % index, 'ms%d' % index])
+            post_lines.append('v%d = datetime(y%d & 0x3FFF, mo%d + 1, d%d, h%d & 0x7F, mi%d, ms%d // 1000, '
+                              'ms%d %% 1000 * 1000) if y%d & 0x8000 and h%d & 0x80 else None' % ((index,) * 10))
+        position += struct.calcsize('<' + FIXED_WIDTH_FORMATS[typ])
+    post_lines.append('offset += %d' % run_struct.size)
+
+    unpack_line = '%s = unpack_run_%d(view, offset)' % (', '.join(fields), first_index)
+    if not indicators:
+        # Fixed width even with NULL values
+        return ['    ' + line for line in [unpack_line] + post_lines]
+
+    # A NULL integer consists of its indicator only, the values are unpacked one by one in this case. This also
+    # applies if the run would exceed the buffer.
+    lines = [
+        '    try:',
+        '        ' + unpack_line,
+        '    except struct_error:',
+        '        %s = 0' % indicators[0],
+        '    if %s:' % ' and '.join(indicators),
+    ]
+    lines.extend('        ' + line for line in post_lines)
+    lines.append('    else:')
+    for index, typ in enumerate(run_types, first_index):
+        lines.extend(_column_lines(index, typ, namespace, '        '))
+    return lines
+
+
+# Size of values which are not preceded by a NULL indicator or length
+FIXED_SIZES = {
+    Decimal: 16,
+    Real: 4,
+    Double: 8,
+    Date: 4,
+    Time: 4,
+    Timestamp: 8,
+}
+
+
+def _skip_length_indicated(view, offset, connection):
+    length, offset = MixinStringType.get_length_from_buffer(view, offset)
+    return offset + (length or 0)
+
+
+def _skip_lob(view, offset, connection):
+    lob_type, options = ReadLobHeader.header_struct_part1.unpack_from(view, offset)
+    offset += ReadLobHeader.header_struct_part1.size
+    if options & ReadLobHeader.LOB_OPTION_ISNULL:
+        return offset
+    chunk_length = ReadLobHeader.header_struct_part2.unpack_from(view, offset)[-1]
+    return offset + ReadLobHeader.header_struct_part2.size + chunk_length
+
+
+def _skip_function(typ):
+    """Return a function skip(view, offset, connection) returning the offset of the value after a value of typ"""
+    if issubclass(typ, MixinStringType):
+        return _skip_length_indicated
+    if issubclass(typ, MixinLobType):
+        return _skip_lob
+    # Values of other types are skipped by decoding them
+    return lambda view, offset, connection: typ.from_buffer(view, offset, connection)[1]
+
+
+def compile_lazy_row_decoder(column_types):
+    """Generate the source of a lazy row decoder for column types and compile it, see row_decoder()"""
+    namespace = {'LazyRow': LazyRow, 'decoders': tuple(typ.from_buffer for typ in column_types)}
+    lines = ['def decode_row(view, offset, connection):']
+    # Sizes of fixed width values are summed up, offset is only updated before values of variable size
+    pending = 0
+    for index, typ in enumerate(column_types):
+        if typ in FIXED_SIZES:
+            lines.append('    o%d = offset + %d' % (index, pending))
+            pending += FIXED_SIZES[typ]
+            continue
+        if pending:
+            lines.append('    offset += %d' % pending)
+            pending = 0
+        lines.append('    o%d = offset' % index)
+        if typ in INDICATOR_TYPES:
+            lines.append('    offset += %d if %s else 1' % (typ._struct.size + 1, _byte_at('offset')))
+        else:
+            namespace['skip_%d' % index] = _skip_function(typ)
+            lines.append('    offset = skip_%d(view, offset, connection)' % index)
+    if pending:
+        lines.append('    offset += %d' % pending)
+    lines.append('    return LazyRow(view, (%s), decoders, connection), offset' %
+                 ''.join('o%d, ' % index for index in range(len(column_types))))
+    exec(compile('\n'.join(lines), '<lazy row decoder>', 'exec'), namespace)
+    return namespace['decode_row']
+
+
+_NOT_DECODED = object()
+
+
+class LazyRow(object):
+    """
+    Row of a result set which decodes the value of a column on its first access.
+
+    Rows support indexing, slicing, iteration and len() like tuples and compare equal to the tuple of their
+    values. A row keeps the buffer of the reply message it was received with.
+    """
+    __slots__ = ('_view', '_offsets', '_decoders', '_connection', '_values')
+
+    def __init__(self, view, offsets, decoders, connection):
+        self._view = view
+        self._offsets = offsets
+        self._decoders = decoders
+        self._connection = connection
+        self._values = [_NOT_DECODED] * len(offsets)
+
+    def _value(self, index):
+        value = self._values[index]
+        if value is _NOT_DECODED:
+            value = self._decoders[index](self._view, self._offsets[index], self._connection)[0]
+            self._values[index] = value
+        return value
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._value(i) for i in range(*index.indices(len(self._offsets))))
+        return self._value(index)
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self._value(index)
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, LazyRow)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(tuple(self))
@@ -22,6 +22,7 @@ from pyhdb.protocol.segments import RequestSegment
 from pyhdb.protocol.constants import message_types, type_codes
 from pyhdb.protocol.parts import ReadLobRequest
 from pyhdb.compat import PY2, PY26, PY3, byte_type, StringIO
+from pyhdb.exceptions import NotSupportedError
 
 if PY2:
     # Depending on the Python version we use different underlying containers for CLOB strings
@@ -166,6 +167,8 @@ class Lob(object):
         """Make low level request to HANA database (READLOBREQUEST).
         Compose request message with proper parameters and read lob data from second part object of reply.
         """
+        if getattr(self._connection, 'is_async', False):
+            raise NotSupportedError("Reading missing lob data is not supported on asynchronous connections")
         self._connection._check_closed()
 
         request = RequestMessage.new(
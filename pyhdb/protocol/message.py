@@ -19,6 +19,8 @@ from os import SEEK_SET, SEEK_CUR, SEEK_END
 from pyhdb.protocol import constants
 from pyhdb.protocol.headers import MessageHeader
 from pyhdb.protocol.segments import ReplySegment
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.exceptions import InterfaceError
 from pyhdb.lib.tracing import trace
 
 
@@ -40,10 +42,23 @@ class BaseMessage(object):
 
 
 class RequestMessage(BaseMessage):
+    def __init__(self, session_id, packet_count, segments=(), autocommit=False, header=None,
+                 packet_size=constants.MAX_MESSAGE_SIZE, compression=None):
+        super(RequestMessage, self).__init__(session_id, packet_count, segments, autocommit, header)
+        self.packet_size = packet_size
+        # Negotiated compression (a pyhdb.protocol.compression.Compression instance), None if disabled
+        self.compression = compression
+
+    @property
+    def max_segment_size(self):
+        return self.packet_size - self.header_size
+
     def build_payload(self, payload):
         """ Build payload of message. """
-        for segment in self.segments:
-            segment.pack(payload, commit=self.autocommit)
+        start = payload.tell()
+        for number, segment in enumerate(self.segments, 1):
+            segment.pack(payload, number=number, offset=payload.tell() - start, segment_size=self.max_segment_size,
+                         commit=self.autocommit)
 
     def pack(self):
         """ Pack message to binary stream. """
@@ -56,9 +71,14 @@ class RequestMessage(BaseMessage):
         self.build_payload(payload)
 
         packet_length = len(payload.getvalue()) - self.header_size
-        self.header = MessageHeader(self.session_id, self.packet_count, packet_length, constants.MAX_SEGMENT_SIZE,
-                                    num_segments=len(self.segments), packet_options=0)
-        packed_header = self.header_struct.pack(*self.header)
+        compressed = None
+        if self.compression is not None:
+            compressed = self._compress([payload.getvalue()[self.header_size:]])
+        if compressed is not None:
+            payload.seek(self.header_size)
+            payload.truncate()
+            payload.write(compressed)
+        packed_header = self.header_struct.pack(*self._build_header(packet_length, compressed))
 
         # Go back to begining of payload for writing message header:
         payload.seek(0)
@@ -69,6 +89,68 @@ class RequestMessage(BaseMessage):
 
         return payload
 
+    def pack_buffers(self, piggyback=()):
+        """Pack message into a list of buffers (message header, segment headers, part headers and payloads).
+        The buffers are meant to be sent with a single scatter-gather call, without joining them first.
+        :param piggyback: small segments which are appended to the message as long as they fit into the packet,
+               the appended ones are added to self.segments
+        """
+        buffers = []
+        offset = 0
+        for number, segment in enumerate(self.segments, 1):
+            buffers.extend(segment.pack_buffers(number=number, offset=offset, segment_size=self.max_segment_size,
+                                                commit=self.autocommit))
+            offset += segment.header.segment_length
+
+        if piggyback:
+            segments = list(self.segments)
+            for segment in piggyback:
+                segment_buffers = segment.pack_buffers(number=len(segments) + 1, offset=offset,
+                                                       segment_size=self.max_segment_size)
+                if offset + segment.header.segment_length > self.max_segment_size:
+                    break
+                buffers.extend(segment_buffers)
+                offset += segment.header.segment_length
+                segments.append(segment)
+            self.segments = segments
+
+        packet_length = sum(len(buf) for buf in buffers)
+        compressed = self._compress(buffers)
+        if compressed is not None:
+            buffers = [compressed]
+        buffers.insert(0, self.header_struct.pack(*self._build_header(packet_length, compressed)))
+
+        trace(self)
+
+        return buffers
+
+    def _compress(self, buffers):
+        """Compress payload if compression is enabled and the payload is large enough
+        :param buffers: list of buffers which make up the payload
+        :returns: compressed payload, None if the payload shall be sent uncompressed
+        """
+        if self.compression is None:
+            return None
+        packet_length = sum(len(buf) for buf in buffers)
+        if packet_length < self.compression.threshold:
+            return None
+        compressed = self.compression.compress(b"".join(buffers))
+        if len(compressed) >= packet_length:
+            # Incompressible data
+            return None
+        return compressed
+
+    def _build_header(self, packet_length, compressed=None):
+        if compressed is None:
+            self.header = MessageHeader(self.session_id, self.packet_count, packet_length, self.max_segment_size,
+                                        num_segments=len(self.segments), packet_options=0)
+        else:
+            # The varpartsize of a compressed message contains the size of the uncompressed payload
+            self.header = MessageHeader(self.session_id, self.packet_count, len(compressed), packet_length,
+                                        num_segments=len(self.segments),
+                                        packet_options=constants.general.PACKET_OPTION_COMPRESSED)
+        return self.header
+
     @classmethod
     def new(cls, connection, segments=()):
         """Return a new request message instance - extracts required data from connection object
@@ -77,20 +159,29 @@ class RequestMessage(BaseMessage):
         :returns: RequestMessage instance
         """
         return cls(connection.session_id, connection.get_next_packet_count(), segments,
-                   autocommit=connection.autocommit)
+                   autocommit=connection.autocommit, packet_size=connection.packet_size)
 
 
 class ReplyMessage(BaseMessage):
     """Reply message class"""
     @classmethod
-    def unpack_reply(cls, header, payload):
+    def unpack_reply(cls, header, payload, compression=None, num_request_segments=None):
         """Take already unpacked header and binary payload of received request reply and creates message instance
         :param header: a namedtuple header object providing header information
-        :param payload: payload (BytesIO instance) of message
+        :param payload: payload (BufferReader or BytesIO instance) of message
+        :param compression: negotiated compression, required for unpacking compressed replies
+        :param num_request_segments: number of segments of the request without piggybacked segments,
+               the replies of piggybacked segments are skipped (see ReplySegment.unpack_from())
         """
+        if header.packet_options & constants.general.PACKET_OPTION_COMPRESSED:
+            if compression is None:
+                raise InterfaceError("Received compressed reply without negotiated compression")
+            # The varpartsize of a compressed message contains the size of the uncompressed payload
+            payload = BufferReader(compression.decompress(payload.read(), header.varpartsize))
         reply = cls(
             header.session_id, header.packet_count,
-            segments=tuple(ReplySegment.unpack_from(payload, expected_segments=header.num_segments)),
+            segments=tuple(ReplySegment.unpack_from(payload, expected_segments=header.num_segments,
+                                                    num_request_segments=num_request_segments)),
             header=header
         )
         trace(reply)
@@ -17,6 +17,7 @@ from __future__ import absolute_import
 import collections
 
 import io
+import array
 import struct
 import logging
 from collections import namedtuple
@@ -25,11 +26,13 @@ from os import SEEK_SET, SEEK_CUR, SEEK_END
 ###
 import pyhdb
 from pyhdb.lib.stringlib import humanhexlify
+from pyhdb.lib.buffer import BufferReader
 from pyhdb.protocol import types
 from pyhdb.protocol import constants
 from pyhdb.protocol.types import by_type_code
+from pyhdb.protocol.decoding import row_decoder
 from pyhdb.exceptions import InterfaceError, DatabaseError, DataError, IntegrityError
-from pyhdb.compat import is_text, iter_range, with_metaclass, string_types, byte_type
+from pyhdb.compat import is_text, iter_range, izip, with_metaclass, string_types, byte_type, bytes_io_buffer
 from pyhdb.protocol.headers import ReadLobHeader, PartHeader, WriteLobHeader
 from pyhdb.protocol.constants import parameter_direction
 
@@ -37,6 +40,7 @@ logger = logging.getLogger('pyhdb')
 debug = logger.debug
 
 PART_MAPPING = WeakValueDictionary()
+PADDING = b"\x00" * 8
 
 
 class Fields(object):
@@ -101,20 +105,27 @@ class Part(with_metaclass(PartMeta, object)):
 
     def pack(self, remaining_size):
         """Pack data of part into binary format"""
+        return b"".join(self.pack_buffers(remaining_size))
+
+    def pack_buffers(self, remaining_size):
+        """Pack data of part into a list of buffers (header, payload and padding).
+        The buffers are not joined so that the payload can be sent without being copied again.
+        """
         arguments_count, payload = self.pack_data(remaining_size - self.header_size)
         payload_length = len(payload)
 
-        # align payload length to multiple of 8
-        if payload_length % 8 != 0:
-            payload += b"\x00" * (8 - payload_length % 8)
-
         self.header = PartHeader(self.kind, self.attribute, arguments_count, self.bigargumentcount,
                                  payload_length, remaining_size)
         hdr = self.header_struct.pack(*self.header)
         if pyhdb.tracing:
             self.trace_header = humanhexlify(hdr, 30)
             self.trace_payload = humanhexlify(payload, 30)
-        return hdr + payload
+
+        buffers = [hdr, payload]
+        # align payload length to multiple of 8
+        if payload_length % 8 != 0:
+            buffers.append(PADDING[:8 - payload_length % 8])
+        return buffers
 
     def pack_data(self, remaining_size):
         raise NotImplemented()
@@ -134,8 +145,8 @@ class Part(with_metaclass(PartMeta, object)):
                 part_payload_size = part_header.payload_size + 8 - (part_header.payload_size % 8)
             else:
                 part_payload_size = part_header.payload_size
-            pl = payload.read(part_payload_size)
-            part_payload = io.BytesIO(pl)
+            # Payload of part shares the buffer of the segment payload, no data is copied here:
+            part_payload = BufferReader.from_payload(payload, part_payload_size)
             try:
                 _PartClass = PART_MAPPING[part_header.part_kind]
             except KeyError:
@@ -152,7 +163,7 @@ class Part(with_metaclass(PartMeta, object)):
             part.source = 'server'
             if pyhdb.tracing:
                 part.trace_header = humanhexlify(hdr[:part_header.payload_size])
-                part.trace_payload = humanhexlify(pl, 30)
+                part.trace_payload = humanhexlify(part_payload.getbuffer(), 30)
             yield part
 
 
@@ -187,23 +198,81 @@ class ResultSet(Part):
     kind = constants.part_kinds.RESULTSET
     __tracing_attrs__ = Part.__tracing_attrs__ + ['num_rows']
 
+    # Part attributes
+    LAST_PACKET = 0x01
+    RESULTSET_CLOSED = 0x10
+
     def __init__(self, payload, num_rows):
         self.payload = payload
         self.num_rows = num_rows
+        # Number of rows unpacked so far, by unpack_rows() or unpack_columns()
+        self.rows_read = 0
 
     @classmethod
     def unpack_data(cls, argument_count, payload):
         return payload, argument_count
 
-    def unpack_rows(self, column_types, connection):
+    def unpack_rows(self, column_types, connection, decode_row=None):
         """Unpack rows for data (from a select statement) from payload and yield a single row at a time.
         :param column_types: a tuple of column descriptors
                e.g. (<class 'pyhdb.protocol.types.String'>, <class 'pyhdb.protocol.types.ClobType'>)
         :param connection: a db connection object
+        :param decode_row: row decoder of column_types (see decoding.row_decoder()), looked up if not given
         :returns: a generator object
         """
-        for _ in iter_range(self.num_rows):
-            yield tuple(typ.from_resultset(self.payload, connection) for typ in column_types)
+        if decode_row is None:
+            decode_row = row_decoder(column_types)
+        payload = self.payload
+        view = payload.getbuffer()
+        while self.rows_read < self.num_rows:
+            self.rows_read += 1
+            row, offset = decode_row(view, payload.tell(), connection)
+            payload.seek(offset)
+            yield row
+
+    def unpack_columns(self, column_types, connection, values, nulls, max_rows):
+        """Unpack rows from payload and append their values to one container per column
+        :param column_types: a tuple of column descriptors
+        :param connection: a db connection object
+        :param values: list of containers (see types.column_container()), NULL values are appended as None to
+               lists and as 0 to arrays
+        :param nulls: list of array.array('B') instances, 1 is appended for NULL values and 0 for other values
+        :param max_rows: maximum number of rows to unpack
+        :returns: number of unpacked rows
+        """
+        num_rows = min(max_rows, self.num_rows - self.rows_read)
+        columns = [(typ, container.append, null_flags.append, 0 if isinstance(container, array.array) else None)
+                   for typ, container, null_flags in izip(column_types, values, nulls)]
+        view = self.payload.getbuffer()
+        offset = self.payload.tell()
+        for _ in iter_range(num_rows):
+            for typ, append, append_null_flag, null_value in columns:
+                value, offset = typ.from_buffer(view, offset, connection)
+                if value is None:
+                    append(null_value)
+                    append_null_flag(1)
+                else:
+                    append(value)
+                    append_null_flag(0)
+        self.payload.seek(offset)
+        self.rows_read += num_rows
+        return num_rows
+
+    def read_fixed_size_rows(self, row_size, max_rows):
+        """Read the raw data of up to max_rows rows if all remaining rows consist of row_size bytes
+        :param row_size: size of a row in bytes
+        :param max_rows: maximum number of rows to read
+        :returns: memoryview of the rows, None if the size of the remaining data does not match the
+                  number of remaining rows (nothing is read in this case)
+        """
+        if self.header is None or not isinstance(self.payload, BufferReader):
+            return None
+        num_rows = self.num_rows - self.rows_read
+        if self.header.payload_size - self.payload.tell() != num_rows * row_size:
+            return None
+        num_rows = min(num_rows, max_rows)
+        self.rows_read += num_rows
+        return self.payload.read_view(num_rows * row_size)
 
 
 class OutputParameters(Part):
@@ -229,10 +298,14 @@ class OutputParameters(Part):
         :returns: parameter values
         """
         values = []
+        view = self.payload.getbuffer()
+        offset = self.payload.tell()
         for param in parameters_metadata:
             # Unpack OUT or INOUT parameters' values
             if param.iotype != parameter_direction.IN:
-                values.append( by_type_code[param.datatype].from_resultset(self.payload) )
+                value, offset = by_type_code[param.datatype].from_buffer(view, offset, connection)
+                values.append(value)
+        self.payload.seek(offset)
         yield tuple(values)
 
 
@@ -413,7 +486,7 @@ class WriteLobRequest(Part):
         if not lob_options & WriteLobHeader.LOB_OPTION_LASTDATA:
             # last lob object was not written entirely -> put it back into lob_buffers for next round of writing:
             self.lob_buffers.appendleft(lb)
-        return num_lobs, payload.getvalue()
+        return num_lobs, bytes_io_buffer(payload)
 
 
 class WriteLobReply(Part):
@@ -540,7 +613,7 @@ class Parameters(Part):
                     # all the rest of the segment is filled with lob data, no more rows can be added:
                     break
 
-        return num_rows, payload.getvalue()
+        return num_rows, bytes_io_buffer(payload)
 
     @staticmethod
     def pack_lob_data(remaining_size, payload, row_header_start_pos, row_lobs):
@@ -822,7 +895,8 @@ class ConnectOptions(OptionPart):
         "use_transaction_flags_only": (19, 28),
         "row_and_column_optimized_format": (20, 28),
         "ignore_unknown_parts": (21, 28),
-        "data_format_version2": (23, 3)
+        "data_format_version2": (23, 3),
+        "compression_level_and_flags": (49, 3)
     }
 
 
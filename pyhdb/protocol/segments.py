@@ -12,14 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import io
 import struct
 import logging
-from io import BytesIO
-from os import SEEK_SET, SEEK_CUR, SEEK_END
 ###
 from pyhdb.protocol.constants import part_kinds
 from pyhdb.compat import iter_range
+from pyhdb.lib.buffer import BufferReader
 from pyhdb.protocol import constants
 from pyhdb.protocol.parts import Part
 from pyhdb.protocol.headers import RequestSegmentHeader, ReplySegmentHeader
@@ -60,50 +58,46 @@ class RequestSegment(BaseSegment):
     def __init__(self, message_type, parts=None, header=None):
         super(RequestSegment, self).__init__(parts, header)
         self.message_type = message_type
+        self._part_buffers = None
 
     @property
     def command_options(self):
         return 0
 
-    @property
-    def offset(self):
-        return 0
-
-    @property
-    def number(self):
-        return 1
-
-    def build_payload(self, payload):
-        """Build payload of all parts and write them into the payload buffer"""
-        remaining_size = self.MAX_SEGMENT_PAYLOAD_SIZE
+    def build_buffers(self, max_payload_size=MAX_SEGMENT_PAYLOAD_SIZE):
+        """Build payload of all parts and return it as a list of buffers
+        :param max_payload_size: maximum size of the payload of all parts (incl. part headers)
+        """
+        remaining_size = max_payload_size
+        buffers = []
 
         for part in self.parts:
-            part_payload = part.pack(remaining_size)
-            payload.write(part_payload)
-            remaining_size -= len(part_payload)
-
-    def pack(self, payload, **kwargs):
-
-        # remember position in payload object:
-        segment_payload_start_pos = payload.tell()
-
-        # Advance num bytes equal to header size. The header is written later
-        # after the payload of all segments and parts has been written:
-        payload.seek(self.header_size, SEEK_CUR)
-
-        # Generate payload of parts:
-        self.build_payload(payload)
-
-        segment_length = payload.tell() - segment_payload_start_pos  # calc length of parts payload
-        self.header = RequestSegmentHeader(segment_length, self.offset, len(self.parts), self.number, self.segment_kind,
+            part_buffers = part.pack_buffers(remaining_size)
+            buffers.extend(part_buffers)
+            remaining_size -= sum(len(buf) for buf in part_buffers)
+        return buffers
+
+    def pack_buffers(self, number=1, offset=0, segment_size=constants.MAX_SEGMENT_SIZE, **kwargs):
+        """Pack segment into a list of buffers: the segment header followed by the buffers of all parts
+        :param number: number of the segment within its message (starting with 1)
+        :param offset: offset of the segment within the payload of its message
+        :param segment_size: maximum size of the segment (derived from the packet size of the connection)
+        """
+        # Parts are only packed once (packing consumes e.g. parameter rows), only the header is packed again
+        # when a segment is packed another time at a different position within a message:
+        if self._part_buffers is None:
+            self._part_buffers = self.build_buffers(segment_size - self.header_size)
+        buffers = list(self._part_buffers)
+
+        segment_length = self.header_size + sum(len(buf) for buf in buffers)
+        self.header = RequestSegmentHeader(segment_length, offset, len(self.parts), number, self.segment_kind,
                                            self.message_type, int(kwargs.get('commit', 0)), self.command_options)
-        packed_header = self.header_struct.pack(*self.header)
+        buffers.insert(0, self.header_struct.pack(*self.header))
+        return buffers
 
-        # Go back to beginning of payload header for writing segment header:
-        payload.seek(segment_payload_start_pos)
-        payload.write(packed_header)
-        # Put file pointer at the end of the bffer so that next segment can be appended:
-        payload.seek(0, SEEK_END)
+    def pack(self, payload, **kwargs):
+        for buf in self.pack_buffers(**kwargs):
+            payload.write(buf)
 
 
 class ReplySegment(BaseSegment):
@@ -119,8 +113,11 @@ class ReplySegment(BaseSegment):
         self.function_code = function_code
 
     @classmethod
-    def unpack_from(cls, payload, expected_segments):
-
+    def unpack_from(cls, payload, expected_segments, num_request_segments=None):
+        """Unpack reply segments and raise the error of the first error segment
+        :param num_request_segments: number of segments of the request without piggybacked segments (e.g. for
+               closing result sets), replies to piggybacked segments are skipped and their errors are ignored
+        """
         for num_segment in iter_range(expected_segments):
             try:
                 segment_header = ReplySegmentHeader(*cls.header_struct.unpack(payload.read(cls.header_size)))
@@ -135,14 +132,16 @@ class ReplySegment(BaseSegment):
             else:
                 segment_payload_size = segment_header.segment_length - cls.header_size
 
-            # Determinate segment payload
-            pl = payload.read(segment_payload_size)
-            segment_payload = BytesIO(pl)
-            debug('Read %d bytes payload segment %d', len(pl), num_segment + 1)
+            # Determinate segment payload (without copying it if payload is a BufferReader)
+            segment_payload = BufferReader.from_payload(payload, segment_payload_size)
+            debug('Read %d bytes payload segment %d', len(segment_payload), num_segment + 1)
 
             parts = tuple(Part.unpack_from(segment_payload, expected_parts=segment_header.num_parts))
             segment = cls(segment_header.function_code, parts, header=segment_header)
 
+            if num_request_segments is not None and segment_header.segment_number > num_request_segments:
+                debug('Skipped reply to piggybacked segment %d', segment_header.segment_number)
+                continue
             if segment_header.segment_kind == segment_kinds.REPLY:
                 yield segment
             elif segment_header.segment_kind == segment_kinds.ERROR:
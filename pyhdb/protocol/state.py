@@ -0,0 +1,284 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+import logging
+import collections
+###
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol import constants
+from pyhdb.protocol.constants import part_kinds
+from pyhdb.protocol.message import ReplyMessage
+from pyhdb.protocol.segments import RequestSegment
+from pyhdb.protocol.parts import ResultSetId, StatementId
+from pyhdb.protocol.constants import message_types
+from pyhdb.exceptions import InterfaceError, DatabaseError
+
+logger = logging.getLogger('pyhdb')
+debug = logger.debug
+
+INITIALIZATION_BYTES = bytearray([
+    255, 255, 255, 255, 4, 20, 0, 4, 1, 0, 0, 1, 1, 1
+])
+INITIALIZATION_REPLY_SIZE = 8
+# Size of the buffer used for reading ahead. Headers and small payloads are received through this buffer,
+# so that a small reply usually requires a single recv call. Larger payloads are received directly.
+READ_BUFFER_SIZE = 2**16
+
+version_struct = struct.Struct('<bH')
+
+
+class ProtocolState(object):
+    """
+    Sans-IO implementation of the framing of the HANA wire protocol.
+
+    The protocol state never touches a socket. Transports send the data returned by initiate() and
+    pack_request(), and hand received data over either by copying it in with receive_data() or by
+    reading directly into the buffer returned by get_buffer() followed by a call to buffer_updated().
+    Complete replies are obtained with next_reply().
+
+    get_buffer() returns a read-ahead buffer which is reused for all replies, unless a large part of a
+    payload is still missing. In that case the remaining payload is received directly into its own buffer.
+    """
+
+    # Receive phases
+    IDLE = 0        # no data expected before initiate() was called
+    INIT_REPLY = 1  # waiting for the reply of the initialization handshake
+    HEADER = 2      # waiting for (the rest of) a message header
+    PAYLOAD = 3     # waiting for (the rest of) a message payload
+
+    def __init__(self, packet_size=None, compression=None):
+        """
+        :param packet_size: maximum size of request messages, defaults to constants.MAX_MESSAGE_SIZE
+        :param compression: Compression instance which is proposed to the server, None disables compression
+        """
+        if packet_size is None:
+            packet_size = constants.MAX_MESSAGE_SIZE
+        elif not constants.MIN_PACKET_SIZE <= packet_size <= constants.MAX_PACKET_SIZE:
+            raise InterfaceError("Invalid packet size %d, must be between %d and %d bytes" %
+                                 (packet_size, constants.MIN_PACKET_SIZE, constants.MAX_PACKET_SIZE))
+        self.packet_size = packet_size
+        self.requested_compression = compression
+        self.compression = None  # compression negotiated with the server
+        self._read_buffer = bytearray(READ_BUFFER_SIZE)
+        self._header_buffer = bytearray(constants.general.MESSAGE_HEADER_SIZE)
+        self._reading_ahead = False
+        self.session_id = -1
+        self.packet_count = -1
+        self.product_version = None
+        self.protocol_version = None
+        self._reset()
+
+    def _reset(self):
+        self._phase = self.IDLE
+        self._buffer = None
+        self._received = 0
+        self._header = None
+        self._frames = collections.deque()  # complete (header, payload) tuples not yet unpacked
+        self._pending_replies = 0
+        # Segments closing abandoned result sets and dropping released statements, they are piggybacked onto
+        # the next request
+        self._piggyback = collections.deque()
+        # (number of segments, piggybacked segments) of every request whose reply is pending
+        self._requests = collections.deque()
+
+    @property
+    def handshake_done(self):
+        return self._phase in (self.HEADER, self.PAYLOAD)
+
+    @property
+    def pending_replies(self):
+        """Number of requests for which no complete reply has been received yet"""
+        return self._pending_replies
+
+    def get_next_packet_count(self):
+        self.packet_count += 1
+        return self.packet_count
+
+    def initiate(self):
+        """Start a new connection
+        :returns: initialization bytes which the transport has to send to the server
+        """
+        self._reset()
+        self.compression = None
+        self._phase = self.INIT_REPLY
+        self._expect(INITIALIZATION_REPLY_SIZE)
+        return bytes(INITIALIZATION_BYTES)
+
+    def connect_options(self):
+        """Return options for the ConnectOptions part of the CONNECT request"""
+        options = dict(constants.DEFAULT_CONNECTION_OPTIONS)
+        if self.requested_compression is not None:
+            options['compression_level_and_flags'] = self.requested_compression.option_value
+        return options
+
+    def process_connect_reply(self, reply):
+        """Enable the features which the server confirmed in the reply to the CONNECT request"""
+        if self.requested_compression is None:
+            return
+        for part in reply.segments[0].parts:
+            if part.kind == part_kinds.CONNECTOPTIONS:
+                value = part.options.get('compression_level_and_flags')
+                if value == self.requested_compression.option_value:
+                    self.compression = self.requested_compression
+        debug('Message compression: %r', self.compression)
+
+    def pack_request(self, message):
+        """Pack request message and register that a reply is expected for it
+        :param message: RequestMessage instance
+        :returns: list of buffers which the transport has to send to the server
+        """
+        if not self.handshake_done:
+            raise InterfaceError("Initialization handshake not yet done")
+        # Compression is used as soon as it has been negotiated:
+        message.compression = self.compression
+        num_segments = len(message.segments)
+        buffers = message.pack_buffers(self._piggyback_segments(message))
+        piggybacked = message.segments[num_segments:]
+        for _ in piggybacked:
+            self._piggyback.popleft()
+        self._requests.append((num_segments, piggybacked))
+        self._pending_replies += 1
+        return buffers
+
+    def close_resultset(self, resultset_id):
+        """Close a result set on the server without an additional round trip.
+        The CLOSERESULTSET request is piggybacked onto the next request message.
+        """
+        self._piggyback.append(RequestSegment(message_types.CLOSERESULTSET, ResultSetId(resultset_id)))
+
+    def drop_statement(self, statement_id):
+        """Drop a prepared statement on the server without an additional round trip.
+        The DROPSTATEMENTID request is piggybacked onto the next request message.
+        """
+        self._piggyback.append(RequestSegment(message_types.DROPSTATEMENTID, StatementId(statement_id)))
+
+    def _piggyback_segments(self, message):
+        if not self._piggyback:
+            return ()
+        if any(segment.message_type == message_types.DISCONNECT for segment in message.segments):
+            # All result sets and statements of the session are released anyway
+            self._piggyback.clear()
+            return ()
+        return list(self._piggyback)
+
+    def _expect(self, size):
+        self._buffer = bytearray(size)
+        self._received = 0
+
+    def _expect_header(self):
+        # Headers are unpacked immediately, so the header buffer can be reused
+        self._buffer = self._header_buffer
+        self._received = 0
+
+    @property
+    def bytes_expected(self):
+        """Number of bytes missing to complete the currently received header or payload"""
+        if self._phase == self.IDLE:
+            return 0
+        return len(self._buffer) - self._received
+
+    @property
+    def read_size(self):
+        """Number of bytes a transport should try to read at once"""
+        return max(self.bytes_expected, READ_BUFFER_SIZE)
+
+    def get_buffer(self):
+        """Return writable buffer into which the transport can receive the next data"""
+        if self._phase == self.IDLE:
+            raise InterfaceError("No data expected from server")
+        if self.bytes_expected >= READ_BUFFER_SIZE:
+            self._reading_ahead = False
+            return memoryview(self._buffer)[self._received:]
+        self._reading_ahead = True
+        return memoryview(self._read_buffer)
+
+    def buffer_updated(self, nbytes):
+        """Notify that nbytes have been written into the buffer returned by get_buffer()"""
+        if self._reading_ahead:
+            self._reading_ahead = False
+            self.receive_data(memoryview(self._read_buffer)[:nbytes])
+        else:
+            self._advance(nbytes)
+
+    def _advance(self, nbytes):
+        """Process nbytes which have been written into the current header or payload buffer"""
+        self._received += nbytes
+        if self._received < len(self._buffer):
+            return
+
+        if self._phase == self.INIT_REPLY:
+            response = bytes(self._buffer)
+            self.product_version = version_struct.unpack(response[0:3])
+            self.protocol_version = version_struct.unpack_from(response[3:8])
+            self._phase = self.HEADER
+            self._expect_header()
+        elif self._phase == self.HEADER:
+            self._header = ReplyMessage.header_from_raw_header_data(bytes(self._buffer))
+            msg = 'Message header (32 bytes): sessionid: %d, packetcount: %d, length: %d, size: %d, noofsegm: %d'
+            debug(msg, *(self._header[:5]))
+
+            # Keep session id up to date
+            if self.session_id != self._header.session_id:
+                self.session_id = self._header.session_id
+                self.packet_count = -1
+
+            self._phase = self.PAYLOAD
+            self._expect(self._header.payload_length)
+            if not self._header.payload_length:
+                self._payload_complete()
+        else:
+            self._payload_complete()
+
+    def _payload_complete(self):
+        debug('Read %d bytes payload', self._received)
+        self._frames.append((self._header, self._buffer))
+        self._pending_replies -= 1
+        self._header = None
+        self._phase = self.HEADER
+        self._expect_header()
+
+    def receive_data(self, data):
+        """Copy received data into the protocol state.
+        Data may contain any number of (partial) messages.
+        """
+        view = memoryview(data)
+        while view:
+            if self._phase == self.IDLE:
+                raise InterfaceError("No data expected from server")
+            buf = memoryview(self._buffer)[self._received:]
+            nbytes = min(len(buf), len(view))
+            buf[:nbytes] = view[:nbytes]
+            self._advance(nbytes)
+            view = view[nbytes:]
+
+    @property
+    def has_reply(self):
+        """True if a completely received reply message is available from next_reply()"""
+        return bool(self._frames)
+
+    def next_reply(self):
+        """Return the next completely received reply message or None
+        Error segments in the reply are raised as exceptions here.
+        """
+        if not self._frames:
+            return None
+        header, payload = self._frames.popleft()
+        num_segments, piggybacked = self._requests.popleft() if self._requests else (None, ())
+        try:
+            return ReplyMessage.unpack_reply(header, BufferReader(payload), self.compression, num_segments)
+        except DatabaseError:
+            # Segments following a failed segment are not executed, the piggybacked segments are sent again
+            self._piggyback.extend(piggybacked)
+            raise
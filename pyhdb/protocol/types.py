@@ -15,6 +15,7 @@ from __future__ import absolute_import
 
 import types as py_types
 import re
+import array
 import struct
 import binascii
 import decimal
@@ -27,6 +28,7 @@ from pyhdb.exceptions import InterfaceError
 from pyhdb.compat import PY26, PY2, PY3, with_metaclass, iter_range, int_types, \
     string_types, byte_type, text_type
 from pyhdb.protocol.headers import WriteLobHeader
+from pyhdb.lib.buffer import BufferReader
 
 
 logger = logging.getLogger('pyhdb')
@@ -76,8 +78,43 @@ class TypeMeta(type):
         return type_class
 
 
+# Unpacks single unsigned bytes (NULL and length indicators) in from_buffer() methods
+_byte_struct = struct.Struct('<B')
+
+
+def _int64_array_typecode():
+    """Return the array.array typecode of 64 bit integers, 'q' is only available since Python 3.3"""
+    for typecode in ('q', 'l'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+def column_container(type_class):
+    """Return an empty container for the values of a result set column
+    :param type_class: Type class of the column
+    :returns: array.array for fixed width numeric types, a list for all other types
+    """
+    if type_class.array_typecode is None:
+        return []
+    return array.array(type_class.array_typecode)
+
+
 class Type(with_metaclass(TypeMeta, object)):
-    """Base class for all types"""
+    """
+    Base class for all types.
+
+    Values are unpacked from result sets with one of two class methods:
+    - from_resultset(payload, connection) reads the value from a file-like payload object
+    - from_buffer(buffer, offset, connection) unpacks the value at offset of a memoryview without reading
+      intermediate bytes objects and returns a tuple (value, offset of the next value)
+    """
+
+    # Typecode of array.array instances holding values of fixed width types (see column_container())
+    array_typecode = None
 
 
 class NoneType(Type):
@@ -106,6 +143,12 @@ class _IntType(Type):
             # Value is Null
             return None
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        if _byte_struct.unpack_from(buffer, offset)[0] == 1:
+            return cls._struct.unpack_from(buffer, offset + 1)[0], offset + 1 + cls._struct.size
+        return None, offset + 1
+
     @classmethod
     def prepare(cls, value):
         if value is None:
@@ -120,12 +163,14 @@ class TinyInt(_IntType):
 
     type_code = type_codes.TINYINT
     _struct = struct.Struct("B")
+    array_typecode = "B"
 
 
 class SmallInt(_IntType):
 
     type_code = type_codes.SMALLINT
     _struct = struct.Struct("h")
+    array_typecode = "h"
 
 
 class Int(_IntType):
@@ -133,6 +178,7 @@ class Int(_IntType):
     type_code = type_codes.INT
     python_type = int_types
     _struct = struct.Struct("i")
+    array_typecode = "i"
 
     @classmethod
     def to_sql(cls, value):
@@ -143,6 +189,7 @@ class BigInt(_IntType):
 
     type_code = type_codes.BIGINT
     _struct = struct.Struct("q")
+    array_typecode = _int64_array_typecode()
 
 
 class Decimal(Type):
@@ -152,7 +199,14 @@ class Decimal(Type):
 
     @classmethod
     def from_resultset(cls, payload, connection=None):
-        payload = bytearray(payload.read(16))
+        return cls._unpack(bytearray(payload.read(16)))
+
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        return cls._unpack(bytearray(buffer[offset:offset + 16])), offset + 16
+
+    @classmethod
+    def _unpack(cls, payload):
         payload.reverse()
 
         if payload[0] == 0x70:
@@ -206,6 +260,7 @@ class Real(Type):
 
     type_code = type_codes.REAL
     _struct = struct.Struct("<f")
+    array_typecode = "f"
 
     @classmethod
     def from_resultset(cls, payload, connection=None):
@@ -214,6 +269,14 @@ class Real(Type):
             return None
         return cls._struct.unpack(payload)[0]
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        value = cls._struct.unpack_from(buffer, offset)[0]
+        # NULL values (all bits set) are NaN, other values do not need to be compared
+        if value != value and buffer[offset:offset + 4].tobytes() == b"\xFF\xFF\xFF\xFF":
+            value = None
+        return value, offset + 4
+
     @classmethod
     def to_sql(cls, value):
         return text_type(value)
@@ -233,6 +296,7 @@ class Double(Type):
     type_code = type_codes.DOUBLE
     python_type = float
     _struct = struct.Struct("<d")
+    array_typecode = "d"
 
     @classmethod
     def from_resultset(cls, payload, connection=None):
@@ -241,6 +305,14 @@ class Double(Type):
             return None
         return cls._struct.unpack(payload)[0]
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        value = cls._struct.unpack_from(buffer, offset)[0]
+        # NULL values (all bits set) are NaN, other values do not need to be compared
+        if value != value and buffer[offset:offset + 8].tobytes() == b"\xFF\xFF\xFF\xFF\xFF\xFF\xFF\xFF":
+            value = None
+        return value, offset + 8
+
     @classmethod
     def to_sql(cls, value):
         return text_type(value)
@@ -272,6 +344,22 @@ class MixinStringType(object):
             raise InterfaceError("Unknown length inidcator")
         return length
 
+    @staticmethod
+    def get_length_from_buffer(buffer, offset):
+        """Unpack the length indicator at offset of buffer
+        :returns: tuple (length or None for NULL values, offset of the data)
+        """
+        length_indicator = _byte_struct.unpack_from(buffer, offset)[0]
+        if length_indicator <= 245:
+            return length_indicator, offset + 1
+        elif length_indicator == 246:
+            return struct.unpack_from('h', buffer, offset + 1)[0], offset + 3
+        elif length_indicator == 247:
+            return struct.unpack_from('i', buffer, offset + 1)[0], offset + 5
+        elif length_indicator == 255:
+            return None, offset + 1
+        raise InterfaceError("Unknown length inidcator")
+
     @classmethod
     def from_resultset(cls, payload, connection=None):
         length = MixinStringType.get_length(payload)
@@ -279,6 +367,20 @@ class MixinStringType(object):
             return None
         return payload.read(length).decode('cesu-8')
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        length, offset = MixinStringType.get_length_from_buffer(buffer, offset)
+        if length is None:
+            return None, offset
+        return buffer[offset:offset + length].tobytes().decode('cesu-8'), offset + length
+
+    @staticmethod
+    def encode_value(value):
+        if not isinstance(value, string_types):
+            # Value is provided e.g. as integer, but a string is actually required. Try proper casting into string:
+            value = text_type(value)
+        return value.encode('cesu-8')
+
     @classmethod
     def prepare(cls, value, type_code=type_codes.CHAR):
         pfield = struct.pack('b', type_code)
@@ -286,10 +388,7 @@ class MixinStringType(object):
             # length indicator
             pfield += struct.pack('B', 255)
         else:
-            if not isinstance(value, string_types):
-                # Value is provided e.g. as integer, but a string is actually required. Try proper casting into string:
-                value = text_type(value)
-            value = value.encode('cesu-8')
+            value = cls.encode_value(value)
             length = len(value)
             # length indicator
             if length <= 245:
@@ -333,6 +432,22 @@ class Binary(Type, MixinStringType):
             return None
         return byte_type(payload.read(length))
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        length, offset = MixinStringType.get_length_from_buffer(buffer, offset)
+        if length is None:
+            return None, offset
+        return byte_type(buffer[offset:offset + length]), offset + length
+
+    @staticmethod
+    def encode_value(value):
+        # Binary data is sent as it is, without converting it into a string
+        return bytes(value)
+
+    @classmethod
+    def prepare(cls, value, type_code=type_codes.VARBINARY):
+        return super(Binary, cls).prepare(value, type_code)
+
     @classmethod
     def to_sql(cls, value):
         if PY26:
@@ -351,7 +466,14 @@ class Date(Type):
 
     @classmethod
     def from_resultset(cls, payload, connection=None):
-        payload = bytearray(payload.read(4))
+        return cls._unpack(bytearray(payload.read(4)))
+
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        return cls._unpack(bytearray(buffer[offset:offset + 4])), offset + 4
+
+    @classmethod
+    def _unpack(cls, payload):
         if not payload[1] & 0x80:
             return None
 
@@ -423,7 +545,14 @@ class Time(Type):
 
     @classmethod
     def from_resultset(cls, payload, connection=None):
-        hour, minute, millisec = cls._struct.unpack(payload.read(4))
+        return cls._unpack(*cls._struct.unpack(payload.read(4)))
+
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        return cls._unpack(*cls._struct.unpack_from(buffer, offset)), offset + 4
+
+    @classmethod
+    def _unpack(cls, hour, minute, millisec):
         if not hour & 0x80:
             return None
 
@@ -466,6 +595,16 @@ class Timestamp(Type):
 
         return datetime.datetime.combine(date, time)
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        date, offset = Date.from_buffer(buffer, offset)
+        time, offset = Time.from_buffer(buffer, offset)
+
+        if date is None or time is None:
+            return None, offset
+
+        return datetime.datetime.combine(date, time), offset
+
     @classmethod
     def to_sql(cls, value):
         return "'%s.%s'" % (value.strftime("%Y-%m-%d %H:%M:%S"), value.microsecond)
@@ -497,6 +636,13 @@ class MixinLobType(object):
         from . import lobs
         return lobs.from_payload(cls.type_code, payload, connection)
 
+    @classmethod
+    def from_buffer(cls, buffer, offset, connection=None):
+        from . import lobs
+        payload = BufferReader(buffer)
+        payload.seek(offset)
+        return lobs.from_payload(cls.type_code, payload, connection), payload.tell()
+
     @classmethod
     def prepare(cls, value, length=0, position=0, is_last_data=True):
         """Prepare Lob header.
@@ -0,0 +1,239 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import gzip
+import struct
+###
+from pyhdb.connection import Connection
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol.message import BaseMessage, ReplyMessage
+from pyhdb.protocol.headers import MessageHeader
+from pyhdb.protocol.state import INITIALIZATION_BYTES, INITIALIZATION_REPLY_SIZE
+from pyhdb.exceptions import InterfaceError
+
+# Directions of recorded data
+SENT = 0
+RECEIVED = 1
+
+FILE_MAGIC = b"PYHDBREC\x01"
+record_header_struct = struct.Struct('<BI')
+
+
+class Recording(object):
+    """
+    Raw bytes sent and received by a connection, in the order in which they were transferred.
+
+    Consecutive data of the same direction is merged into a single record, so a recording is a sequence of
+    alternating requests and replies (starting with the initialization handshake).
+    Recordings are saved to a compact binary file, which is gzip compressed if its name ends with '.gz'.
+    """
+
+    def __init__(self, records=None):
+        """
+        :param records: list of (direction, data) tuples
+        """
+        self.records = []
+        for direction, data in records or ():
+            self.add(direction, data)
+
+    def __repr__(self):
+        return '<Recording records=%d sent=%d received=%d>' % (len(self.records), len(self.data(SENT)),
+                                                               len(self.data(RECEIVED)))
+
+    def add(self, direction, data):
+        if not len(data):
+            return
+        if self.records and self.records[-1][0] == direction:
+            self.records[-1][1].extend(data)
+        else:
+            self.records.append((direction, bytearray(data)))
+
+    def data(self, direction):
+        """Return all data sent or received as a single byte string"""
+        return b"".join(bytes(data) for record_direction, data in self.records if record_direction == direction)
+
+    def messages(self, direction=RECEIVED):
+        """Split sent or received data into messages (the initialization handshake is skipped)
+        :returns: a generator producing (MessageHeader, payload) tuples
+        """
+        data = memoryview(self.data(direction))
+        position = len(INITIALIZATION_BYTES) if direction == SENT else INITIALIZATION_REPLY_SIZE
+        while position < len(data):
+            header = MessageHeader(*BaseMessage.header_struct.unpack_from(data, position))
+            position += BaseMessage.header_size
+            yield header, data[position:position + header.payload_length]
+            position += header.payload_length
+
+    def replies(self, compression=None):
+        """Unpack all received reply messages
+        :param compression: compression negotiated by the recorded connection, if any
+        :returns: a generator producing ReplyMessage instances
+        """
+        for header, payload in self.messages(RECEIVED):
+            yield ReplyMessage.unpack_reply(header, BufferReader(payload), compression)
+
+    def save(self, path):
+        with self._open(path, 'wb') as recording_file:
+            recording_file.write(FILE_MAGIC)
+            for direction, data in self.records:
+                recording_file.write(record_header_struct.pack(direction, len(data)))
+                # gzip files on Python 2 do not accept bytearrays
+                recording_file.write(bytes(data))
+
+    @classmethod
+    def load(cls, path):
+        recording = cls()
+        with cls._open(path, 'rb') as recording_file:
+            if recording_file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise InterfaceError("%s is not a pyhdb recording" % path)
+            while True:
+                record_header = recording_file.read(record_header_struct.size)
+                if not record_header:
+                    break
+                direction, length = record_header_struct.unpack(record_header)
+                recording.add(direction, recording_file.read(length))
+        return recording
+
+    @staticmethod
+    def _open(path, mode):
+        if path.endswith('.gz'):
+            return gzip.open(path, mode)
+        return io.open(path, mode)
+
+
+class RecordingSocket(object):
+    """Socket wrapper which records all data sent and received through it"""
+
+    def __init__(self, sock, recording):
+        self._socket = sock
+        self.recording = recording
+        if hasattr(sock, 'sendmsg'):
+            self.sendmsg = self._sendmsg
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
+
+    def sendall(self, data):
+        self._socket.sendall(data)
+        self.recording.add(SENT, data)
+
+    def _sendmsg(self, buffers):
+        sent = self._socket.sendmsg(buffers)
+        self.recording.add(SENT, b"".join(bytes(buf) for buf in buffers)[:sent])
+        return sent
+
+    def recv_into(self, buf, nbytes=0):
+        nbytes = self._socket.recv_into(buf, nbytes)
+        self.recording.add(RECEIVED, memoryview(buf)[:nbytes])
+        return nbytes
+
+
+class ReplaySocket(object):
+    """
+    Socket replacement which replays the received data of a recording.
+
+    Data sent to it is discarded: requests of a replayed session differ from the recorded ones anyway (e.g. the
+    random client key of the authentication). Replies are returned in the recorded order, and the data of a
+    reply is only returned once the data of its request has been sent.
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.bytes_sent = 0
+        self._timeout = None
+        self._index = 0
+        self._position = 0
+        self._request_pending = False
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self):
+        return self._timeout
+
+    def close(self):
+        pass
+
+    def sendall(self, data):
+        self.bytes_sent += len(data)
+        self._request_pending = True
+
+    def sendmsg(self, buffers):
+        sent = sum(len(buf) for buf in buffers)
+        self.bytes_sent += sent
+        self._request_pending = True
+        return sent
+
+    def recv_into(self, buf, nbytes=0):
+        records = self.recording.records
+        if self._index < len(records) and records[self._index][0] == SENT:
+            if not self._request_pending:
+                raise InterfaceError("Replayed session expects a request to be sent before receiving data")
+            self._index += 1
+            self._position = 0
+            self._request_pending = False
+        if self._index >= len(records):
+            # End of recording, behave like a connection closed by the server
+            return 0
+
+        data = records[self._index][1]
+        view = memoryview(buf)
+        nbytes = min(nbytes or len(view), len(data) - self._position)
+        view[:nbytes] = data[self._position:self._position + nbytes]
+        self._position += nbytes
+        if self._position == len(data):
+            self._index += 1
+            self._position = 0
+        return nbytes
+
+
+class RecordingConnection(Connection):
+    """Connection which records the raw bytes of its session, see Recording"""
+
+    def __init__(self, host, port, user, password, autocommit=False, recording=None, **kwargs):
+        """
+        :param recording: Recording instance to which data is added, by default a new one is created
+        :param kwargs: further arguments of Connection
+        """
+        super(RecordingConnection, self).__init__(host, port, user, password, autocommit, **kwargs)
+        self.recording = Recording() if recording is None else recording
+
+    def _create_socket(self):
+        return RecordingSocket(super(RecordingConnection, self)._create_socket(), self.recording)
+
+
+class ReplayConnection(Connection):
+    """
+    Connection which replays a recorded session instead of talking to a server.
+
+    The application has to perform the same operations as the recorded one. Options which influence the wire
+    format (autocommit, packet_size, compression) must be the same as for the recorded connection.
+    """
+
+    def __init__(self, recording, user='', password='', autocommit=False, **kwargs):
+        """
+        :param recording: Recording instance or path of a saved recording
+        :param kwargs: further arguments of Connection
+        """
+        super(ReplayConnection, self).__init__('replay', 0, user, password, autocommit, **kwargs)
+        if not isinstance(recording, Recording):
+            recording = Recording.load(recording)
+        self.recording = recording
+
+    def __repr__(self):
+        return '<Hana replay connection %r>' % self.recording
+
+    def _create_socket(self):
+        return ReplaySocket(self.recording)
@@ -0,0 +1,1163 @@
+# Copyright 2014, 2015 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import socket
+import struct
+import logging
+import binascii
+import datetime
+import decimal
+import itertools
+import threading
+import collections
+###
+import pyhdb
+from pyhdb.auth import AuthManager
+from pyhdb.compat import iter_range
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol import types
+from pyhdb.protocol.constants import general, message_types, function_codes, part_kinds, segment_kinds, \
+    type_codes, parameter_direction
+from pyhdb.protocol.compression import CODECS, DEFAULT_COMPRESSION_THRESHOLD
+from pyhdb.protocol.headers import MessageHeader, RequestSegmentHeader, PartHeader, ReadLobHeader
+from pyhdb.protocol.message import BaseMessage
+from pyhdb.protocol.segments import RequestSegment, ReplySegment
+from pyhdb.protocol.parts import Part, Fields, ConnectOptions, TransactionFlags, StatementId, \
+    ResultSet, ResultSetId, ReadLobRequest, ReadLobReply, WriteLobRequest
+from pyhdb.protocol.state import INITIALIZATION_BYTES
+from pyhdb.exceptions import InterfaceError
+
+logger = logging.getLogger('pyhdb.testing')
+debug = logger.debug
+
+DEFAULT_USER = 'SYSTEM'
+DEFAULT_PASSWORD = 'manager'
+# Number of rows sent with the reply of a query, the remaining rows are fetched with FETCHNEXT
+DEFAULT_FETCH_SIZE = 32
+# Number of items (bytes or characters) of a LOB sent within a result set, the rest is read with READLOB
+DEFAULT_LOB_CHUNK_SIZE = 1024
+# The argument count of a part header is a signed 2 byte integer
+MAX_ROWS_PER_PART = 2**15 - 1
+
+# Product version (4.20) and protocol version (4.1) sent in the reply of the initialization handshake
+INITIALIZATION_REPLY = struct.pack('<bHbHxx', 4, 20, 4, 1)
+SCRAMSHA256 = b"SCRAMSHA256"
+SALT_SIZE = 16
+SERVER_KEY_SIZE = 48
+
+# Attributes of result set parts
+RESULTSET_LAST_PACKET = ResultSet.LAST_PACKET
+RESULTSET_CLOSED = ResultSet.RESULTSET_CLOSED
+
+# Option of parameter and column metadata
+OPTION_NULLABLE = 0x02
+
+PARAMETER_METADATA_STRUCT = struct.Struct('bbbbIhhI')
+RESULTSET_METADATA_STRUCT = struct.Struct('bbhhhIIII')
+ERROR_STRUCT = struct.Struct('iIIB5s')
+ROWS_AFFECTED_STRUCT = struct.Struct('<i')
+LOCATOR_ID_STRUCT = struct.Struct('<q')
+READ_LOB_HEADER_STRUCT = struct.Struct('<BB2sQQ8sI')
+# Write LOB header of a parameter after its type code: options, length and position of the data within the row
+LOB_PARAMETER_STRUCT = struct.Struct('<BII')
+NO_NAME = 0xFFFFFFFF
+
+INT_TYPES = (type_codes.TINYINT, type_codes.SMALLINT, type_codes.INT, type_codes.BIGINT)
+STRING_TYPES = types.String.type_code
+BINARY_TYPES = types.Binary.type_code
+LOB_TYPES = (type_codes.CLOB, type_codes.NCLOB, type_codes.BLOB)
+
+TYPE_NAMES = {
+    'TINYINT': type_codes.TINYINT,
+    'SMALLINT': type_codes.SMALLINT,
+    'INT': type_codes.INT,
+    'INTEGER': type_codes.INT,
+    'BIGINT': type_codes.BIGINT,
+    'DECIMAL': type_codes.DECIMAL,
+    'REAL': type_codes.REAL,
+    'DOUBLE': type_codes.DOUBLE,
+    'FLOAT': type_codes.DOUBLE,
+    'CHAR': type_codes.CHAR,
+    'VARCHAR': type_codes.VARCHAR,
+    'NCHAR': type_codes.NCHAR,
+    'NVARCHAR': type_codes.NVARCHAR,
+    'BINARY': type_codes.BINARY,
+    'VARBINARY': type_codes.VARBINARY,
+    'DATE': type_codes.DATE,
+    'TIME': type_codes.TIME,
+    'TIMESTAMP': type_codes.TIMESTAMP,
+    'CLOB': type_codes.CLOB,
+    'NCLOB': type_codes.NCLOB,
+    'BLOB': type_codes.BLOB,
+}
+
+# Length of columns defined without length (precision for decimals)
+DEFAULT_LENGTHS = dict(
+    [(type_code, 32) for type_code in STRING_TYPES] +
+    [(type_code, 16) for type_code in BINARY_TYPES] +
+    [(type_code, DEFAULT_LOB_CHUNK_SIZE) for type_code in LOB_TYPES] + [
+        (type_codes.TINYINT, 3), (type_codes.SMALLINT, 5), (type_codes.INT, 10), (type_codes.BIGINT, 19),
+        (type_codes.DECIMAL, 18), (type_codes.REAL, 24), (type_codes.DOUBLE, 53),
+        (type_codes.DATE, 10), (type_codes.TIME, 8), (type_codes.TIMESTAMP, 27)
+    ]
+)
+
+NULL_VALUES = dict(
+    [(type_code, b"\x00") for type_code in INT_TYPES] +
+    [(type_code, b"\xFF") for type_code in STRING_TYPES + BINARY_TYPES] + [
+        (type_codes.DECIMAL, b"\x00" * 15 + b"\x70"),
+        (type_codes.REAL, b"\xFF" * 4),
+        (type_codes.DOUBLE, b"\xFF" * 8),
+        (type_codes.DATE, b"\x00" * 4),
+        (type_codes.TIME, b"\x00" * 4),
+        (type_codes.TIMESTAMP, b"\x00" * 8),
+    ]
+)
+
+EPOCH = datetime.datetime(2000, 1, 1)
+INT_LIMITS = {
+    type_codes.TINYINT: 2**8,
+    type_codes.SMALLINT: 2**15,
+    type_codes.INT: 2**31,
+    type_codes.BIGINT: 2**63,
+}
+
+Column = collections.namedtuple('Column', 'name type_code length fraction')
+
+
+def make_column(spec):
+    """Create column from a (name, type[, length[, fraction]]) tuple
+    :param spec: Column instance or tuple, type is either a type code or a SQL type name like 'NVARCHAR'
+    """
+    if isinstance(spec, Column):
+        return spec
+    name, type_code = spec[:2]
+    if not isinstance(type_code, int):
+        try:
+            type_code = TYPE_NAMES[type_code.upper()]
+        except KeyError:
+            raise InterfaceError("Unsupported column type %s" % type_code)
+    length = spec[2] if len(spec) > 2 else DEFAULT_LENGTHS[type_code]
+    fraction = spec[3] if len(spec) > 3 else (2 if type_code == type_codes.DECIMAL else 0)
+    return Column(name, type_code, length, fraction)
+
+
+def _fill(value, length):
+    """Repeat value until it has the given length"""
+    return (value * (length // len(value) + 1))[:length]
+
+
+def _synthetic_generator(column):
+    """Return function which generates the value of a column for a given row number"""
+    type_code, length = column.type_code, column.length
+    if type_code in INT_TYPES:
+        limit = INT_LIMITS[type_code]
+        return lambda index: index % limit
+    elif type_code == type_codes.DECIMAL:
+        fraction = column.fraction
+        return lambda index: decimal.Decimal(index).scaleb(-fraction)
+    elif type_code in (type_codes.REAL, type_codes.DOUBLE):
+        return lambda index: index + 0.5
+    elif type_code == type_codes.DATE:
+        return lambda index: (EPOCH + datetime.timedelta(days=index % 36500)).date()
+    elif type_code == type_codes.TIME:
+        return lambda index: (EPOCH + datetime.timedelta(seconds=index % 86400)).time()
+    elif type_code == type_codes.TIMESTAMP:
+        return lambda index: EPOCH + datetime.timedelta(seconds=index)
+    elif type_code in BINARY_TYPES or type_code == type_codes.BLOB:
+        return lambda index: _fill(LOCATOR_ID_STRUCT.pack(index), length)
+    prefix = column.name.lower()
+    return lambda index: _fill(u'%s %d ' % (prefix, index), length)
+
+
+class FakeTable(object):
+    """
+    Table of the fake server.
+
+    The first num_rows rows are synthetic: their values are generated from the row number whenever they are
+    fetched, so that tables of any size take up no memory. Rows inserted by clients are appended after them.
+    """
+
+    def __init__(self, columns, num_rows=0):
+        """
+        :param columns: list of Column instances or (name, type[, length[, fraction]]) tuples,
+               e.g. [('ID', 'INTEGER'), ('NAME', 'NVARCHAR', 100), ('PRICE', 'DECIMAL', 18, 2)]
+        :param num_rows: number of synthetic rows
+        """
+        self.columns = [make_column(column) for column in columns]
+        self.num_rows = num_rows
+        self.rows = []
+        self._generators = [_synthetic_generator(column) for column in self.columns]
+
+    def __repr__(self):
+        return '<FakeTable columns=%s rows=%d>' % (",".join(column.name for column in self.columns), len(self))
+
+    def __len__(self):
+        return self.num_rows + len(self.rows)
+
+    def column_index(self, name):
+        for index, column in enumerate(self.columns):
+            if column.name == name:
+                return index
+        raise _SqlError(260, 'invalid column name: %s' % name)
+
+    def row(self, index):
+        """Return values of a row"""
+        if index < self.num_rows:
+            return [generate(index) for generate in self._generators]
+        return self.rows[index - self.num_rows]
+
+    def value(self, index, column_index):
+        """Return a single value of a row"""
+        if index < self.num_rows:
+            return self._generators[column_index](index)
+        return self.rows[index - self.num_rows][column_index]
+
+    def clear(self):
+        """Delete all rows
+        :returns: number of deleted rows
+        """
+        num_rows = len(self)
+        self.num_rows = 0
+        self.rows = []
+        return num_rows
+
+
+class _SqlError(Exception):
+    """Error which is sent to the client in an error segment"""
+
+    def __init__(self, code, message):
+        super(_SqlError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+    def part(self):
+        text = self.message.encode('utf-8')
+        payload = ERROR_STRUCT.pack(self.code, 0, len(text), 1, b"HY000") + text
+        return _ReplyPart(part_kinds.ERROR, 1, payload)
+
+
+class _ReplyPart(Part):
+    """Part of a reply message whose payload has already been packed"""
+
+    def __init__(self, kind, argument_count, payload, attribute=0):
+        self.kind = kind
+        self.argument_count = argument_count
+        self.payload = payload
+        self.attribute = attribute
+
+    def pack_data(self, remaining_size):
+        return self.argument_count, self.payload
+
+
+def _pack_length_indicated(data):
+    length = len(data)
+    if length <= 245:
+        return struct.pack('B', length) + data
+    elif length <= 32767:
+        return b"\xF6" + struct.pack('<h', length) + data
+    return b"\xF7" + struct.pack('<i', length) + data
+
+
+def pack_value(type_code, value):
+    """Pack a value (not a LOB) into the format of result sets"""
+    if value is None:
+        return NULL_VALUES[type_code]
+    if type_code in INT_TYPES:
+        return b"\x01" + types.by_type_code[type_code]._struct.pack(value)
+    elif type_code in STRING_TYPES:
+        return _pack_length_indicated(value.encode('cesu-8'))
+    elif type_code in BINARY_TYPES:
+        return _pack_length_indicated(bytes(value))
+    # Apart from the leading type code all other types have the same format in parameters and result sets.
+    # Some types are prepared as bytearray, which cannot be joined with bytes on Python 2.
+    return bytes(types.by_type_code[type_code].prepare(value)[1:])
+
+
+def _encode_lob(type_code, data):
+    if type_code == type_codes.BLOB:
+        return bytes(data)
+    return data.encode('ascii' if type_code == type_codes.CLOB else 'utf-8')
+
+
+def _decode_lob(type_code, data):
+    if type_code == type_codes.BLOB:
+        return bytes(data)
+    return bytes(data).decode('ascii' if type_code == type_codes.CLOB else 'utf-8')
+
+
+class _LobParameter(object):
+    """LOB value of a parameter row, its data might be completed by later WRITELOB requests"""
+
+    def __init__(self, type_code, options, length, position):
+        self.type_code = type_code
+        self.options = options
+        self.length = length
+        self.position = position
+        self.data = bytearray()
+
+    @property
+    def is_last_data(self):
+        return bool(self.options & ReadLobHeader.LOB_OPTION_LASTDATA)
+
+
+def _unpack_parameter(payload):
+    """Unpack a single value of a parameter row
+    :returns: the value, a _LobParameter instance for LOBs
+    """
+    type_code = struct.unpack('B', payload.read(1))[0]
+    if type_code & 0x80:
+        return None
+    if type_code in INT_TYPES:
+        int_struct = types.by_type_code[type_code]._struct
+        return int_struct.unpack(payload.read(int_struct.size))[0]
+    elif type_code in LOB_TYPES:
+        return _LobParameter(type_code, *LOB_PARAMETER_STRUCT.unpack(payload.read(LOB_PARAMETER_STRUCT.size)))
+    try:
+        _DataType = types.by_type_code[type_code]
+    except KeyError:
+        raise _SqlError(7, 'feature not supported: parameter type code %d' % type_code)
+    # Apart from the leading type code all other types have the same format in parameters and result sets
+    return _DataType.from_resultset(payload)
+
+
+def _unpack_parameter_rows(payload, num_rows, num_parameters):
+    """Unpack rows of a parameters part
+    :returns: list of rows (lists of values)
+    """
+    rows = []
+    for _ in iter_range(num_rows):
+        row_start = row_end = payload.tell()
+        row = []
+        for _ in iter_range(num_parameters):
+            value = _unpack_parameter(payload)
+            if isinstance(value, _LobParameter):
+                # LOB data follows the values of the row, its position counts from 1
+                start = row_start + value.position - 1
+                value.data.extend(payload.getbuffer()[start:start + value.length])
+                row_end = max(row_end, start + value.length)
+            row.append(value)
+        payload.seek(max(payload.tell(), row_end))
+        rows.append(row)
+    return rows
+
+
+# A very small subset of SQL is understood by the fake server
+_NAME = r'(?:"[^"]+"|[\w$#]+)'
+_TABLE = r'(?:%s\s*\.\s*)?(?P<table>%s)' % (_NAME, _NAME)
+_LITERAL = r"(?:'(?:[^']|'')*'|NULL|[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\?|:\d+)"
+SELECT_RE = re.compile(
+    r'SELECT\s+(?P<columns>.+?)\s+FROM\s+%s(?:\s+WHERE\s+(?P<where_column>%s)\s*=\s*(?P<where_value>%s))?'
+    r'(?:\s+LIMIT\s+(?P<limit>\d+))?$' % (_TABLE, _NAME, _LITERAL), re.I | re.S
+)
+INSERT_RE = re.compile(r'INSERT\s+INTO\s+%s\s*(?:\((?P<columns>[^)]*)\))?\s*VALUES\s*\((?P<values>.*)\)$' % _TABLE,
+                       re.I | re.S)
+DELETE_RE = re.compile(r'DELETE\s+FROM\s+%s$' % _TABLE, re.I)
+CREATE_RE = re.compile(r'CREATE\s+(?:(?:COLUMN|ROW)\s+)?TABLE\s+%s\s*\((?P<columns>.*)\)$' % _TABLE, re.I | re.S)
+DROP_RE = re.compile(r'DROP\s+TABLE\s+%s$' % _TABLE, re.I)
+SET_SCHEMA_RE = re.compile(r'SET\s+SCHEMA\s+(?P<schema>%s)$' % _NAME, re.I)
+COLUMN_DEFINITION_RE = re.compile(
+    r'\s*(?P<name>%s)\s+(?P<type>\w+)(?:\s*\(\s*(?P<length>\d+)(?:\s*,\s*(?P<fraction>\d+))?\s*\))?' % _NAME
+)
+VALUE_RE = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<null>NULL)|(?P<number>[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)|"
+    r"(?P<parameter>\?|:\d+))\s*(?:,|$)", re.I
+)
+PARAMETER = object()  # Placeholder for parameters within the values of insert statements
+
+
+def _name(identifier):
+    """Normalize SQL identifier: quoted names are case sensitive, unquoted ones are upper case"""
+    identifier = identifier.strip()
+    if identifier.startswith('"'):
+        return identifier[1:-1]
+    return identifier.upper()
+
+
+def _split_list(text):
+    """Split a comma separated list, ignoring commas within parentheses"""
+    items = []
+    depth = start = 0
+    for position, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            items.append(text[start:position])
+            start = position + 1
+    items.append(text[start:])
+    return [item.strip() for item in items]
+
+
+def _convert_literal(column, kind, text):
+    """Convert a literal of an insert or select statement to a value of the column"""
+    if kind == 'null':
+        return None
+    type_code = column.type_code
+    if kind == 'string':
+        text = text[1:-1].replace("''", "'")
+    if type_code in INT_TYPES:
+        return int(text)
+    elif type_code == type_codes.DECIMAL:
+        return decimal.Decimal(text)
+    elif type_code in (type_codes.REAL, type_codes.DOUBLE):
+        return float(text)
+    elif type_code in BINARY_TYPES or type_code == type_codes.BLOB:
+        return binascii.unhexlify(text)
+    elif type_code == type_codes.DATE:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    elif type_code == type_codes.TIME:
+        return datetime.datetime.strptime(text, "%H:%M:%S.%f" if "." in text else "%H:%M:%S").time()
+    elif type_code == type_codes.TIMESTAMP:
+        return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S.%f" if "." in text else "%Y-%m-%d %H:%M:%S")
+    return text
+
+
+class _Statement(object):
+    """Parsed SQL statement"""
+
+    def __init__(self, kind, function_code, table_name, columns=(), parameters=(), values=(), limit=None,
+                 where=None):
+        """
+        :param kind: 'select', 'insert', 'delete', 'create', 'drop' or 'set schema'
+        :param table_name: name of the table, name of the schema for set schema statements
+        :param columns: indexes of the selected or inserted columns, Column instances for create statements
+        :param parameters: Column instances of the parameters of the statement
+        :param values: values of insert statements, PARAMETER for values provided as parameters
+        :param where: (column index, value) of the condition of select statements, value might be PARAMETER
+        """
+        self.kind = kind
+        self.function_code = function_code
+        self.table_name = table_name
+        self.columns = columns
+        self.parameters = parameters
+        self.values = values
+        self.limit = limit
+        self.where = where
+
+
+def parse_statement(sql, tables):
+    """Parse a statement of the SQL subset supported by the fake server
+    :param tables: dictionary of the tables of the server
+    :returns: _Statement instance
+    """
+    sql = sql.strip().rstrip(';').strip()
+    if '%' in sql:
+        # HANA refuses Python style parameters, cursors then fall back to expanding them on the client
+        raise _SqlError(257, 'sql syntax error: incorrect syntax near "%%": line 1 col %d' % (sql.index('%') + 1))
+
+    match = CREATE_RE.match(sql)
+    if match:
+        columns = []
+        for definition in _split_list(match.group('columns')):
+            column_match = COLUMN_DEFINITION_RE.match(definition)
+            if column_match is None:
+                raise _SqlError(257, 'sql syntax error: invalid column definition %s' % definition)
+            spec = [_name(column_match.group('name')), column_match.group('type')]
+            if column_match.group('length'):
+                spec.append(int(column_match.group('length')))
+                if column_match.group('fraction'):
+                    spec.append(int(column_match.group('fraction')))
+            columns.append(make_column(spec))
+        return _Statement('create', function_codes.DDL, _name(match.group('table')), columns)
+
+    match = DROP_RE.match(sql)
+    if match:
+        return _Statement('drop', function_codes.DDL, _name(match.group('table')))
+
+    match = SET_SCHEMA_RE.match(sql)
+    if match:
+        # All tables of the fake server belong to every schema
+        return _Statement('set schema', function_codes.DDL, _name(match.group('schema')))
+
+    for kind, regex in (('select', SELECT_RE), ('insert', INSERT_RE), ('delete', DELETE_RE)):
+        match = regex.match(sql)
+        if match:
+            break
+    else:
+        raise _SqlError(257, 'sql syntax error: statement not supported by fake server: %s' % sql)
+
+    table_name = _name(match.group('table'))
+    try:
+        table = tables[table_name]
+    except KeyError:
+        raise _SqlError(259, 'invalid table name: Could not find table/view %s' % table_name)
+
+    if kind == 'delete':
+        return _Statement('delete', function_codes.DELETE, table_name)
+
+    if match.group('columns') in (None, '*'):
+        columns = list(iter_range(len(table.columns)))
+    else:
+        columns = [table.column_index(_name(name)) for name in _split_list(match.group('columns'))]
+
+    if kind == 'select':
+        limit = match.group('limit')
+        where = parameters = ()
+        if match.group('where_column') is not None:
+            column_index = table.column_index(_name(match.group('where_column')))
+            column = table.columns[column_index]
+            value = _parse_value(column, VALUE_RE.match(match.group('where_value')))
+            where = (column_index, value)
+            parameters = (column,) if value is PARAMETER else ()
+        return _Statement('select', function_codes.SELECT, table_name, columns, parameters,
+                          limit=int(limit) if limit is not None else None, where=where or None)
+
+    values = []
+    parameters = []
+    text = match.group('values')
+    position = 0
+    while position < len(text):
+        value_match = VALUE_RE.match(text, position)
+        if value_match is None:
+            raise _SqlError(257, 'sql syntax error: incorrect syntax near "%s"' % text[position:])
+        position = value_match.end()
+        column = table.columns[columns[len(values)]] if len(values) < len(columns) else None
+        if column is None:
+            raise _SqlError(257, 'sql syntax error: too many values')
+        value = _parse_value(column, value_match)
+        values.append(value)
+        if value is PARAMETER:
+            parameters.append(column)
+    if len(values) != len(columns):
+        raise _SqlError(257, 'sql syntax error: not enough values')
+    return _Statement('insert', function_codes.INSERT, table_name, columns, parameters, values)
+
+
+def _parse_value(column, value_match):
+    """Convert a value matched by VALUE_RE, PARAMETER for parameters"""
+    kind, token = [(key, value) for key, value in value_match.groupdict().items() if value is not None][0]
+    if kind == 'parameter':
+        return PARAMETER
+    return _convert_literal(column, kind, token)
+
+
+def _parameter_metadata_part(columns):
+    payload = b"".join(
+        PARAMETER_METADATA_STRUCT.pack(OPTION_NULLABLE, column.type_code, parameter_direction.IN, 0, NO_NAME,
+                                       min(column.length, 32767), column.fraction, 0)
+        for column in columns
+    )
+    return _ReplyPart(part_kinds.PARAMETERMETADATA, len(columns), payload)
+
+
+def _resultset_metadata_part(table_name, columns):
+    names = []
+    texts = []
+    text_size = 0
+    offsets = {}
+    for name in [table_name] + [column.name for column in columns]:
+        if name not in offsets:
+            encoded = name.encode('utf-8')
+            offsets[name] = text_size
+            texts.append(struct.pack('B', len(encoded)) + encoded)
+            text_size += len(encoded) + 1
+        names.append(offsets[name])
+
+    payload = b"".join(
+        RESULTSET_METADATA_STRUCT.pack(OPTION_NULLABLE, column.type_code, column.fraction, min(column.length, 32767),
+                                       0, names[0], NO_NAME, offset, offset)
+        for column, offset in zip(columns, names[1:])
+    )
+    return _ReplyPart(part_kinds.RESULTSETMETADATA, len(columns), payload + b"".join(texts))
+
+
+class _OpenResultSet(object):
+    """Result set of a query which has not yet been fetched completely"""
+
+    def __init__(self, table, columns, row_indexes):
+        """
+        :param row_indexes: sequence of the numbers of the table rows in the result set
+        """
+        self.table = table
+        self.columns = [(index, table.columns[index].type_code) for index in columns]
+        self.row_indexes = row_indexes
+        self.position = 0
+        self.end = len(row_indexes)
+
+
+class _Session(object):
+    """Connection of a single client to the fake server"""
+
+    def __init__(self, server, sock, session_id):
+        self.server = server
+        self.socket = sock
+        self.session_id = session_id
+        self.authenticated = False
+        self.compression = None
+        self.schema = None  # default schema set with SET SCHEMA
+        self._negotiated_compression = None
+        self._user = self._client_key = self._salt = self._server_key = None
+        self._ids = itertools.count(1)
+        self._statements = {}      # statement id -> _Statement
+        self._resultsets = {}      # result set id -> _OpenResultSet
+        self._lobs = {}            # locator id -> (type code, value) of LOBs not sent completely in result sets
+        self._unwritten_lobs = {}  # locator id -> (row, column index, _LobParameter) of incomplete inserted LOBs
+        self._handlers = {
+            message_types.AUTHENTICATE: self._authenticate,
+            message_types.CONNECT: self._connect,
+            message_types.DISCONNECT: self._disconnect,
+            message_types.COMMIT: self._commit,
+            message_types.ROLLBACK: self._rollback,
+            message_types.EXECUTEDIRECT: self._execute_direct,
+            message_types.PREPARE: self._prepare,
+            message_types.EXECUTE: self._execute,
+            message_types.DROPSTATEMENTID: self._drop_statement_id,
+            message_types.FETCHNEXT: self._fetch_next,
+            message_types.CLOSERESULTSET: self._close_resultset,
+            message_types.READLOB: self._read_lob,
+            message_types.WRITELOB: self._write_lob,
+        }
+
+    def _next_id(self):
+        """Return a new 8 byte identifier for statements, result sets and LOB locators"""
+        return LOCATOR_ID_STRUCT.pack(next(self._ids))
+
+    def run(self):
+        try:
+            if self._recv(len(INITIALIZATION_BYTES)) is not None:
+                self.socket.sendall(INITIALIZATION_REPLY)
+                while self._serve_message():
+                    pass
+        except socket.error as error:
+            debug('Session %d: connection lost (%r)', self.session_id, error)
+        except Exception:
+            logger.exception('Session %d: unexpected error, closing connection', self.session_id)
+        finally:
+            self.socket.close()
+            self.server._session_closed(self)
+
+    def _recv(self, size):
+        """Receive exactly size bytes, None if the client closed the connection"""
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            nbytes = self.socket.recv_into(view[received:])
+            if not nbytes:
+                return None
+            received += nbytes
+        return buf
+
+    def _serve_message(self):
+        """Receive a request message and send its reply
+        :returns: False if the session has ended
+        """
+        raw_header = self._recv(BaseMessage.header_size)
+        if raw_header is None:
+            return False
+        header = MessageHeader(*BaseMessage.header_struct.unpack(bytes(raw_header)))
+        payload = self._recv(header.payload_length)
+        if payload is None:
+            return False
+        if header.packet_options & general.PACKET_OPTION_COMPRESSED:
+            if self.compression is None:
+                raise socket.error("Compressed request without negotiated compression")
+            payload = self.compression.decompress(payload, header.varpartsize)
+
+        reader = BufferReader(payload)
+        replies = []
+        disconnect = False
+        for _ in iter_range(header.num_segments):
+            segment_header = RequestSegmentHeader(*RequestSegment.header_struct.unpack(
+                reader.read(RequestSegment.header_size)))
+            segment_payload = reader.subreader(segment_header.segment_length - RequestSegment.header_size)
+            parts = {}
+            for _ in iter_range(segment_header.num_parts):
+                part_header = PartHeader(*Part.header_struct.unpack(segment_payload.read(Part.header_size)))
+                parts[part_header.part_kind] = (part_header.argument_count,
+                                                segment_payload.subreader(part_header.payload_size))
+                segment_payload.read(-part_header.payload_size % 8)
+
+            message_type = segment_header.message_type
+            self.server._count_request(message_type)
+            try:
+                function_code, reply_parts = self._handle(message_type, parts)
+            except _SqlError as error:
+                # Segments following a failed one are not executed
+                replies.append((segment_kinds.ERROR, 0, [error.part()]))
+                break
+            except Exception as error:
+                # A bug of the fake server is reported to the client instead of dropping the connection
+                logger.exception('Session %d: unexpected error handling message type %d', self.session_id,
+                                 message_type)
+                replies.append((segment_kinds.ERROR, 0, [_SqlError(2, 'general error: %r' % error).part()]))
+                break
+            replies.append((segment_kinds.REPLY, function_code, reply_parts))
+            disconnect = message_type == message_types.DISCONNECT
+
+        self._send_reply(header.packet_count, replies)
+        if self._negotiated_compression is not None:
+            # The reply to the CONNECT request itself is never compressed
+            self.compression, self._negotiated_compression = self._negotiated_compression, None
+        return not disconnect
+
+    def _send_reply(self, packet_count, replies):
+        buffers = []
+        offset = 0
+        for number, (segment_kind, function_code, parts) in enumerate(replies, 1):
+            part_buffers = []
+            for index, part in enumerate(parts):
+                packed = part.pack_buffers(general.MAX_SEGMENT_SIZE)
+                # Like HANA the last part of a segment is sent without padding
+                part_buffers.extend(packed[:2] if index == len(parts) - 1 else packed)
+            segment_length = ReplySegment.header_size + sum(len(buf) for buf in part_buffers)
+            buffers.append(ReplySegment.header_struct.pack(segment_length, offset, len(parts), number,
+                                                           segment_kind, function_code))
+            buffers.extend(part_buffers)
+            offset += segment_length
+
+        # Parts of pyhdb (e.g. StatementId) may be packed into bytearrays, which cannot be joined on Python 2
+        payload = b"".join(bytes(buf) for buf in buffers)
+        packet_options = 0
+        varpartsize = len(payload)
+        if self.compression is not None and len(payload) >= self.compression.threshold:
+            compressed = self.compression.compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                packet_options = general.PACKET_OPTION_COMPRESSED
+        header = BaseMessage.header_struct.pack(self.session_id, packet_count, len(payload), varpartsize,
+                                                len(replies), packet_options)
+        self.socket.sendall(header + payload)
+
+    def _handle(self, message_type, parts):
+        try:
+            handler = self._handlers[message_type]
+        except KeyError:
+            raise _SqlError(7, 'feature not supported: message type %d' % message_type)
+        if not self.authenticated and message_type not in (message_types.AUTHENTICATE, message_types.CONNECT):
+            raise _SqlError(10, 'authentication failed: session not connected')
+        return handler(parts)
+
+    @staticmethod
+    def _part(parts, kind):
+        """Return (argument count, payload) of the part of given kind"""
+        try:
+            return parts[kind]
+        except KeyError:
+            raise _SqlError(7, 'feature not supported: request without part of kind %d' % kind)
+
+    def _authenticate(self, parts):
+        fields = Fields.unpack_data(self._part(parts, part_kinds.AUTHENTICATION)[1])
+        methods = dict(zip(fields[1::2], fields[2::2]))
+        if SCRAMSHA256 not in methods:
+            raise _SqlError(10, 'authentication failed: no supported authentication method')
+        self._user = fields[0].decode('cesu-8')
+        self._client_key = methods[SCRAMSHA256]
+        self._salt = os.urandom(SALT_SIZE)
+        self._server_key = os.urandom(SERVER_KEY_SIZE)
+        payload = Fields.pack_data([SCRAMSHA256, Fields.pack_data([self._salt, self._server_key])])
+        return 0, [_ReplyPart(part_kinds.AUTHENTICATION, 1, payload)]
+
+    def _connect(self, parts):
+        fields = Fields.unpack_data(self._part(parts, part_kinds.AUTHENTICATION)[1])
+        proof = dict(zip(fields[1::2], fields[2::2])).get(SCRAMSHA256)
+        if self._client_key is None or proof is None or not self.server._verify(self._user, self._client_key,
+                                                                               self._salt, self._server_key, proof):
+            raise _SqlError(10, 'authentication failed')
+
+        options = {}
+        if part_kinds.CONNECTOPTIONS in parts:
+            options = ConnectOptions.unpack_data(*parts[part_kinds.CONNECTOPTIONS])[0]
+        reply_options = {'connection_id': self.session_id}
+        compression = self.server._compression(options.get('compression_level_and_flags'))
+        if compression is not None:
+            reply_options['compression_level_and_flags'] = compression.option_value
+            self._negotiated_compression = compression
+
+        self.authenticated = True
+        return 0, [_ReplyPart(part_kinds.AUTHENTICATION, 1, Fields.pack_data([SCRAMSHA256, b""])),
+                   ConnectOptions(reply_options)]
+
+    def _disconnect(self, parts):
+        return function_codes.DISCONNECT, []
+
+    def _commit(self, parts):
+        return 0, [TransactionFlags({'commited': True})]
+
+    def _rollback(self, parts):
+        return 0, [TransactionFlags({'rolledback': True})]
+
+    def _execute_direct(self, parts):
+        statement = self.server._parse(self._command(parts))
+        return self._run(statement, include_metadata=True)
+
+    def _command(self, parts):
+        return self._part(parts, part_kinds.COMMAND)[1].read().decode('cesu-8')
+
+    def _prepare(self, parts):
+        statement = self.server._parse(self._command(parts))
+        statement_id = self._next_id()
+        self._statements[statement_id] = statement
+        reply_parts = [StatementId(statement_id), _parameter_metadata_part(statement.parameters)]
+        if statement.kind == 'select':
+            table = self.server.tables[statement.table_name]
+            reply_parts.append(_resultset_metadata_part(statement.table_name,
+                                                        [table.columns[index] for index in statement.columns]))
+        return statement.function_code, reply_parts
+
+    def _execute(self, parts):
+        statement_id = self._part(parts, part_kinds.STATEMENTID)[1].read(8)
+        try:
+            statement = self._statements[statement_id]
+        except KeyError:
+            raise _SqlError(213, 'invalid statement id')
+        return self._run(statement, parts.get(part_kinds.PARAMETERS))
+
+    def _drop_statement_id(self, parts):
+        statement_id = self._part(parts, part_kinds.STATEMENTID)[1].read(8)
+        if self._statements.pop(statement_id, None) is None:
+            raise _SqlError(213, 'invalid statement id')
+        return 0, []
+
+    def _run(self, statement, parameters=None, include_metadata=False):
+        """Execute statement
+        :param parameters: (argument count, payload) of the parameters part, None if there is no such part
+        """
+        if statement.parameters and parameters is None:
+            raise _SqlError(7, 'feature not supported: statement with parameters executed without parameters')
+
+        if statement.kind == 'select':
+            return self._select(statement, parameters, include_metadata)
+        elif statement.kind == 'insert':
+            return self._insert(statement, parameters)
+        elif statement.kind == 'set schema':
+            self.schema = statement.table_name
+            return statement.function_code, []
+
+        with self.server.lock:
+            if statement.kind == 'create':
+                if statement.table_name in self.server.tables:
+                    raise _SqlError(288, 'cannot use duplicate table name: %s' % statement.table_name)
+                self.server.tables[statement.table_name] = FakeTable(statement.columns)
+            elif statement.kind == 'drop':
+                if self.server.tables.pop(statement.table_name, None) is None:
+                    raise _SqlError(259, 'invalid table name: %s' % statement.table_name)
+            else:
+                num_rows = self.server._table(statement.table_name).clear()
+                return statement.function_code, [_ReplyPart(part_kinds.ROWSAFFECTED, 1,
+                                                            ROWS_AFFECTED_STRUCT.pack(num_rows))]
+        return statement.function_code, []
+
+    def _insert(self, statement, parameters):
+        if parameters is None:
+            parameter_rows = [[]]
+        else:
+            num_rows, payload = parameters
+            parameter_rows = _unpack_parameter_rows(payload, num_rows, len(statement.parameters))
+
+        locator_ids = []
+        with self.server.lock:
+            table = self.server._table(statement.table_name)
+            for parameter_row in parameter_rows:
+                parameter_values = iter(parameter_row)
+                row = [None] * len(table.columns)
+                for index, value in zip(statement.columns, statement.values):
+                    if value is PARAMETER:
+                        value = next(parameter_values)
+                    if isinstance(value, _LobParameter):
+                        if not value.is_last_data:
+                            # The rest of the LOB data is sent with WRITELOB requests
+                            locator_id = self._next_id()
+                            self._unwritten_lobs[locator_id] = (row, index, value)
+                            locator_ids.append(locator_id)
+                        value = _decode_lob(value.type_code, value.data) if value.is_last_data else None
+                    row[index] = value
+                table.rows.append(row)
+
+        reply_parts = [_ReplyPart(part_kinds.ROWSAFFECTED, len(parameter_rows),
+                                  ROWS_AFFECTED_STRUCT.pack(1) * len(parameter_rows))]
+        if locator_ids:
+            reply_parts.append(_ReplyPart(part_kinds.WRITELOBREPLY, len(locator_ids), b"".join(locator_ids)))
+        return statement.function_code, reply_parts
+
+    def _select(self, statement, parameters, include_metadata):
+        with self.server.lock:
+            table = self.server._table(statement.table_name)
+            if statement.where is None:
+                row_indexes = iter_range(len(table) if statement.limit is None else min(len(table), statement.limit))
+            else:
+                column_index, value = statement.where
+                if value is PARAMETER:
+                    num_rows, payload = parameters
+                    value = _unpack_parameter_rows(payload, num_rows, 1)[0][0]
+                # The fake server has no indexes, conditions are evaluated by scanning the table
+                row_indexes = [index for index in iter_range(len(table))
+                               if value is not None and table.value(index, column_index) == value]
+                if statement.limit is not None:
+                    row_indexes = row_indexes[:statement.limit]
+        resultset_id = self._next_id()
+        self._resultsets[resultset_id] = _OpenResultSet(table, statement.columns, row_indexes)
+
+        reply_parts = []
+        if include_metadata:
+            reply_parts.append(_resultset_metadata_part(statement.table_name,
+                                                        [table.columns[index] for index in statement.columns]))
+        reply_parts.append(ResultSetId(resultset_id))
+        reply_parts.append(self._fetch(resultset_id, self.server.fetch_size))
+        return statement.function_code, reply_parts
+
+    def _fetch(self, resultset_id, size):
+        """Return result set part with the next rows of an open result set"""
+        try:
+            resultset = self._resultsets[resultset_id]
+        except KeyError:
+            raise _SqlError(1000, 'invalid result set id')
+        start = resultset.position
+        end = min(start + min(size, MAX_ROWS_PER_PART), resultset.end)
+        rows = []
+        for position in iter_range(start, end):
+            row = resultset.table.row(resultset.row_indexes[position])
+            for index, type_code in resultset.columns:
+                if type_code in LOB_TYPES:
+                    rows.append(self._pack_lob(type_code, row[index]))
+                else:
+                    rows.append(pack_value(type_code, row[index]))
+        resultset.position = end
+
+        attribute = 0
+        if end == resultset.end:
+            attribute = RESULTSET_LAST_PACKET | RESULTSET_CLOSED
+            del self._resultsets[resultset_id]
+        return _ReplyPart(part_kinds.RESULTSET, end - start, b"".join(rows), attribute)
+
+    def _pack_lob(self, type_code, value):
+        lob_type = ReadLobHeader.LOB_TYPES[type_code]
+        if value is None:
+            return struct.pack('<BB', lob_type, ReadLobHeader.LOB_OPTION_ISNULL)
+        chunk = _encode_lob(type_code, value[:self.server.lob_chunk_size])
+        options = ReadLobHeader.LOB_OPTION_DATAINCLUDED if chunk else 0
+        locator_id = self._next_id()
+        if len(value) <= self.server.lob_chunk_size:
+            options |= ReadLobHeader.LOB_OPTION_LASTDATA
+        else:
+            # Remaining data is read with READLOB requests
+            self._lobs[locator_id] = (type_code, value)
+        byte_length = len(chunk) if len(value) <= self.server.lob_chunk_size else len(_encode_lob(type_code, value))
+        return READ_LOB_HEADER_STRUCT.pack(lob_type, options, b"\x00\x00", len(value), byte_length, locator_id,
+                                           len(chunk)) + chunk
+
+    def _fetch_next(self, parts):
+        resultset_id = self._part(parts, part_kinds.RESULTSETID)[1].read(8)
+        size = struct.unpack('i', self._part(parts, part_kinds.FETCHSIZE)[1].read(4))[0]
+        return function_codes.SELECT, [_ReplyPart(part_kinds.STATEMENTCONTEXT, 0, b""),
+                                       self._fetch(resultset_id, size)]
+
+    def _close_resultset(self, parts):
+        resultset_id = self._part(parts, part_kinds.RESULTSETID)[1].read(8)
+        if self._resultsets.pop(resultset_id, None) is None:
+            raise _SqlError(1000, 'invalid result set id')
+        return 0, []
+
+    def _read_lob(self, parts):
+        locator_id, offset, length, _ = ReadLobRequest.part_struct.unpack(
+            self._part(parts, part_kinds.READLOBREQUEST)[1].read(ReadLobRequest.part_struct.size))
+        try:
+            type_code, value = self._lobs[locator_id]
+        except KeyError:
+            raise _SqlError(1000, 'invalid LOB locator id')
+        # Offsets of LOBs count from 1
+        chunk = _encode_lob(type_code, value[offset - 1:offset - 1 + length])
+        options = ReadLobHeader.LOB_OPTION_DATAINCLUDED
+        if offset - 1 + length >= len(value):
+            options |= ReadLobHeader.LOB_OPTION_LASTDATA
+        payload = ReadLobReply.part_struct_p1.pack(locator_id, options) + \
+            ReadLobReply.part_struct_p2.pack(len(chunk), b"\x00" * 3) + chunk
+        return function_codes.READLOB, [_ReplyPart(part_kinds.STATEMENTCONTEXT, 0, b""),
+                                        _ReplyPart(part_kinds.READLOBREPLY, 1, payload)]
+
+    def _write_lob(self, parts):
+        num_lobs, payload = self._part(parts, part_kinds.WRITELOBREQUEST)
+        locator_ids = []
+        for _ in iter_range(num_lobs):
+            locator_id, options, _, length = WriteLobRequest.part_struct.unpack(
+                payload.read(WriteLobRequest.part_struct.size))
+            try:
+                row, index, lob = self._unwritten_lobs[locator_id]
+            except KeyError:
+                raise _SqlError(1000, 'invalid LOB locator id')
+            lob.data.extend(payload.read(length))
+            if options & ReadLobHeader.LOB_OPTION_LASTDATA:
+                with self.server.lock:
+                    row[index] = _decode_lob(lob.type_code, lob.data)
+                del self._unwritten_lobs[locator_id]
+            locator_ids.append(locator_id)
+        return function_codes.WRITELOB, [_ReplyPart(part_kinds.WRITELOBREPLY, len(locator_ids),
+                                                    b"".join(locator_ids))]
+
+
+class FakeHanaServer(object):
+    """
+    Fake HANA server speaking the wire protocol over a local TCP socket.
+
+    The server understands the initialization handshake, SCRAM authentication, CONNECT, PREPARE, EXECUTE,
+    EXECUTEDIRECT, FETCHNEXT, READLOB, WRITELOB, COMMIT, ROLLBACK and DISCONNECT. Statements are restricted to
+    a small subset of SQL working on in-memory tables (see FakeTable):
+
+        SELECT * | col1, col2, ... FROM table [LIMIT n]
+        INSERT INTO table [(col1, col2, ...)] VALUES (?, 'literal', 42, NULL, ...)
+        DELETE FROM table
+        CREATE TABLE table (col1 INTEGER, col2 NVARCHAR(20), ...)
+        DROP TABLE table
+
+    Every client connection is served by its own thread. Example:
+
+        with FakeHanaServer({'ORDERS': FakeTable([('ID', 'INTEGER'), ('NOTE', 'NVARCHAR', 50)], 10000)}) as server:
+            connection = server.connect()
+    """
+
+    def __init__(self, tables=None, user=DEFAULT_USER, password=DEFAULT_PASSWORD, host='127.0.0.1', port=0,
+                 fetch_size=DEFAULT_FETCH_SIZE, lob_chunk_size=DEFAULT_LOB_CHUNK_SIZE, compression=True):
+        """
+        :param tables: dictionary of table names and FakeTable instances, a DUMMY table is always available
+        :param user: name of the only user of the server
+        :param password: password of the user
+        :param port: port to listen on, by default a free port is chosen
+        :param fetch_size: number of rows sent with the reply of a query
+        :param lob_chunk_size: number of items (bytes or characters) of a LOB sent within a result set
+        :param compression: accept message compression if a client proposes it
+        """
+        dummy = FakeTable([('DUMMY', 'VARCHAR', 1)])
+        dummy.rows.append([u'X'])
+        self.tables = {'DUMMY': dummy}
+        self.tables.update(tables or {})
+        self.user = user
+        self.password = password
+        self.fetch_size = fetch_size
+        self.lob_chunk_size = lob_chunk_size
+        self.compression = compression
+        # Number of received request segments per message type
+        self.request_counts = collections.defaultdict(int)
+        self.lock = threading.RLock()
+        self._address = (host, port)
+        self._listener = None
+        self._thread = None
+        self._stopped = True
+        self._sessions = set()
+        self._session_ids = itertools.count(1)
+
+    def __repr__(self):
+        return '<FakeHanaServer host=%s port=%s>' % (self.host, self.port)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def host(self):
+        return self._address[0]
+
+    @property
+    def port(self):
+        return self._address[1]
+
+    def start(self):
+        """Start listening for connections in a background thread
+        :returns: the server itself
+        """
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(self._address)
+        self._listener.listen(16)
+        # Poll for new connections, so that stop() does not depend on closing a socket waking up accept()
+        self._listener.settimeout(0.1)
+        self._address = self._listener.getsockname()[:2]
+        self._stopped = False
+        self._thread = threading.Thread(target=self._serve, name='FakeHanaServer-%d' % self.port)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server and close all client connections"""
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self.lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            try:
+                session.socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def connect(self, **kwargs):
+        """Open a pyhdb connection to the server
+        :param kwargs: further arguments of pyhdb.connect(), e.g. autocommit or packet_size
+        """
+        return pyhdb.connect(self.host, self.port, self.user, self.password, **kwargs)
+
+    def _serve(self):
+        while not self._stopped:
+            try:
+                sock, address = self._listener.accept()
+            except socket.timeout:
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(self, sock, next(self._session_ids))
+            debug('Session %d: connection from %s', session.session_id, address)
+            with self.lock:
+                self._sessions.add(session)
+            thread = threading.Thread(target=session.run, name='FakeHanaSession-%d' % session.session_id)
+            thread.daemon = True
+            thread.start()
+
+    def _session_closed(self, session):
+        with self.lock:
+            self._sessions.discard(session)
+
+    def _count_request(self, message_type):
+        with self.lock:
+            self.request_counts[message_type] += 1
+
+    def _table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise _SqlError(259, 'invalid table name: Could not find table/view %s' % name)
+
+    def _parse(self, sql):
+        with self.lock:
+            return parse_statement(sql, self.tables)
+
+    def _verify(self, user, client_key, salt, server_key, proof):
+        """Verify the client proof of the SCRAM authentication"""
+        if user != self.user:
+            return False
+        auth_manager = AuthManager(None, self.user, self.password)
+        auth_manager.client_key = client_key
+        return auth_manager.calculate_client_proof([salt], server_key) == proof
+
+    def _compression(self, option_value):
+        """Return the compression for a proposed connect option value, None if compression is not accepted"""
+        if option_value is None or not self.compression:
+            return None
+        for codec in CODECS.values():
+            if codec.codec_id == option_value >> 8:
+                try:
+                    return codec(option_value & 0xFF, DEFAULT_COMPRESSION_THRESHOLD)
+                except InterfaceError:
+                    # Codec not available here
+                    return None
+        return None
@@ -39,8 +39,18 @@ setup(
     description="SAP HANA Database Client for Python",
     include_package_data=True,
     long_description=get_long_description(),
-    packages=find_packages(exclude=("tests", "tests.*",)),
+    packages=find_packages(exclude=("tests", "tests.*", "benchmarks", "benchmarks.*")),
     zip_safe=False,
+    extras_require={
+        "lz4": ["lz4"],
+        "numpy": ["numpy"],
+        "pandas": ["numpy", "pandas"]
+    },
+    entry_points={
+        "console_scripts": [
+            "pyhdb-bench = pyhdb.testing.bench:main",
+        ]
+    },
     tests_require=[
         "pytest>=2.5.2",
         "mock>=1.0.1"
@@ -50,7 +60,6 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4',
@@ -0,0 +1,66 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+from io import BytesIO
+from os import SEEK_CUR, SEEK_END
+
+import pytest
+
+from pyhdb.lib.buffer import BufferReader
+
+
+def test_read():
+    reader = BufferReader(bytearray(b'abcdef'))
+    assert reader.read(2) == b'ab'
+    assert reader.tell() == 2
+    assert reader.read() == b'cdef'
+    assert reader.read(1) == b''
+
+
+def test_read_returns_bytes():
+    reader = BufferReader(bytearray(b'abc'))
+    assert isinstance(reader.read(1), bytes)
+
+
+def test_seek():
+    reader = BufferReader(b'abcdef')
+    reader.seek(4)
+    assert reader.read(1) == b'e'
+    reader.seek(-3, SEEK_CUR)
+    assert reader.read(1) == b'c'
+    reader.seek(-1, SEEK_END)
+    assert reader.read() == b'f'
+
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+
+
+def test_subreader_shares_buffer():
+    data = bytearray(b'headpayloadtail')
+    reader = BufferReader(data)
+    reader.read(4)
+    sub = reader.subreader(7)
+    assert reader.tell() == 11
+    assert len(sub) == 7
+
+    data[4] = ord('P')
+    assert sub.read() == b'Payload'
+
+
+def test_from_payload_with_file_like_object():
+    payload = BytesIO(b'abcdef')
+    payload.read(1)
+    reader = BufferReader.from_payload(payload, 3)
+    assert reader.getvalue() == b'bcd'
+    assert payload.tell() == 4
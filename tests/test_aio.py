@@ -0,0 +1,168 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import sys
+
+import pytest
+
+if sys.version_info < (3, 5):
+    pytest.skip("asyncio support requires Python 3.5+", allow_module_level=True)
+
+import asyncio
+###
+from pyhdb.aio import AsyncConnection, AsyncCursor, connect
+from pyhdb.exceptions import OperationalError, Error
+from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.segments import RequestSegment, ReplySegment
+from pyhdb.protocol.constants import message_types, function_codes, segment_kinds
+from pyhdb.testing import FakeHanaServer, FakeTable
+
+
+def reply_message(function_code, session_id=4711):
+    segment = ReplySegment.header_struct.pack(ReplySegment.header_size, 0, 0, 1, segment_kinds.REPLY, function_code)
+    return ReplyMessage.header_struct.pack(session_id, 0, len(segment), len(segment), 1, 0) + segment
+
+
+class FakeWriter(object):
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def writelines(self, buffers):
+        self.data += b"".join(bytes(buf) for buf in buffers)
+
+    def drain(self):
+        return asyncio.sleep(0)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def loop(request):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def connection(loop):
+    connection = AsyncConnection("localhost", 30015, "Fuu", "Bar")
+    connection._reader = asyncio.StreamReader()
+    connection._writer = FakeWriter()
+    # Skip initialization handshake:
+    connection._protocol.initiate()
+    connection._protocol.receive_data(b"\x00" * 8)
+    return connection
+
+
+def test_send_request(loop, connection):
+    connection._reader.feed_data(reply_message(function_codes.DDL))
+    request = RequestMessage.new(connection, RequestSegment(message_types.COMMIT))
+
+    reply = loop.run_until_complete(connection.send_request(request))
+    assert reply.segments[0].function_code == function_codes.DDL
+    assert connection.session_id == 4711
+    assert connection._writer.data == b"".join(request.pack_buffers())
+
+
+def test_send_request_truncated_reply(loop, connection):
+    connection._reader.feed_data(reply_message(function_codes.DDL)[:40])
+    connection._reader.feed_eof()
+    writer = connection._writer
+
+    with pytest.raises(OperationalError):
+        loop.run_until_complete(connection.commit())
+    assert writer.closed
+    assert connection.closed
+
+
+def test_cancelled_request_closes_connection(loop, connection):
+    writer = connection._writer
+    task = loop.create_task(connection.commit())
+    # Wait until the request has been sent, its reply is never received
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert writer.data
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        loop.run_until_complete(task)
+    assert writer.closed
+    assert connection.closed
+
+
+def test_close(loop, connection):
+    connection._reader.feed_data(reply_message(function_codes.DISCONNECT))
+    loop.run_until_complete(connection.close())
+    assert connection.closed
+
+    with pytest.raises(Error):
+        connection.cursor()
+
+
+def test_cursor(connection):
+    cursor = connection.cursor()
+    assert isinstance(cursor, AsyncCursor)
+    assert cursor.connection is connection
+
+
+def collect(loop, iterator):
+    """Collect the items of an asynchronous iterator (like 'async for', which requires Python 3.5 syntax)"""
+    items = []
+    while True:
+        try:
+            items.append(loop.run_until_complete(iterator.__anext__()))
+        except StopAsyncIteration:
+            return items
+
+
+def test_async_iteration(loop, request):
+    server = FakeHanaServer({'NUMBERS': FakeTable([('ID', 'INTEGER')], num_rows=300)}, fetch_size=32).start()
+    request.addfinalizer(server.stop)
+    connection = loop.run_until_complete(connect(server.host, server.port, server.user, server.password))
+    cursor = connection.cursor()
+
+    loop.run_until_complete(cursor.execute("SELECT ID FROM NUMBERS"))
+    assert collect(loop, cursor.__aiter__()) == [(index,) for index in range(300)]
+
+    loop.run_until_complete(cursor.execute("SELECT ID FROM NUMBERS LIMIT 250"))
+    assert [len(batch) for batch in collect(loop, cursor.iter_batches(100))] == [100, 100, 50]
+
+    loop.run_until_complete(cursor.execute("SELECT ID FROM NUMBERS"))
+    batch = loop.run_until_complete(cursor.fetch_columns(100))
+    assert list(batch.values[0]) == list(range(100))
+    loop.run_until_complete(connection.close())
+
+
+def test_execute_and_fetch(loop, request):
+    server = FakeHanaServer({'NUMBERS': FakeTable([('ID', 'INTEGER')], num_rows=10)}, fetch_size=4).start()
+    request.addfinalizer(server.stop)
+    connection = loop.run_until_complete(connect(server.host, server.port, server.user, server.password))
+    cursor = connection.cursor()
+
+    loop.run_until_complete(cursor.execute("CREATE TABLE ITEMS (ID INTEGER, NAME NVARCHAR(10))"))
+    loop.run_until_complete(cursor.executemany("INSERT INTO ITEMS VALUES (?, ?)", [(1, u'a'), (2, u'b')]))
+    assert loop.run_until_complete(cursor.execute_batch([
+        ("INSERT INTO ITEMS VALUES (?, ?)", [3, u'c']),
+        "SELECT ID FROM NUMBERS",
+    ])) == [1, -1]
+    assert loop.run_until_complete(cursor.fetchone()) == (0,)
+    assert loop.run_until_complete(cursor.fetchall()) == [(index,) for index in range(1, 10)]
+
+    loop.run_until_complete(cursor.execute("SELECT ID FROM ITEMS WHERE ID = ?", [2]))
+    assert loop.run_until_complete(cursor.fetchmany(10)) == [(2,)]
+    loop.run_until_complete(connection.close())
+
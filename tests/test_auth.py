@@ -15,6 +15,9 @@
 import pytest
 
 from pyhdb.auth import AuthManager
+from pyhdb.protocol.segments import RequestSegment
+from pyhdb.protocol.parts import Part, Authentication
+from pyhdb.protocol.constants import message_types
 
 
 @pytest.fixture
@@ -31,22 +34,19 @@ def auth_manager():
 
 class TestSCRAMSHA256(object):
 
-    # Test disabled:
-    # Init request is not accessable anymore
-    #
-    # def test_init_request(self, auth_manager):
-    #     request = auth_manager.get_initial_request()
-    #     assert isinstance(request, RequestSegment)
-    #     assert request.message_type == message_types.AUTHENTICATE
-    #     assert len(request.parts) == 1
-    #
-    #     part = request.parts[0]
-    #     assert isinstance(part, Part)
-    #     assert part.kind == Authentication.kind
-    #     assert part.user == "TestUser"
-    #     assert part.methods == {
-    #         b"SCRAMSHA256": auth_manager.client_key
-    #     }
+    def test_init_request(self, auth_manager):
+        request = auth_manager.get_initial_request()
+        assert isinstance(request, RequestSegment)
+        assert request.message_type == message_types.AUTHENTICATE
+        assert len(request.parts) == 1
+
+        part = request.parts[0]
+        assert isinstance(part, Part)
+        assert part.kind == Authentication.kind
+        assert part.user == "TestUser"
+        assert part.methods == {
+            b"SCRAMSHA256": auth_manager.client_key
+        }
 
     def test_calculate_client_proof(self, auth_manager):
         salt = b"\x80\x96\x4f\xa8\x54\x28\xae\x3a\x81\xac" \
@@ -0,0 +1,44 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import json
+
+import pytest
+###
+from benchmarks import runner
+
+
+@pytest.mark.parametrize('bench', runner.load_benchmarks(), ids=lambda bench: bench.name)
+def test_benchmark_runs(bench):
+    function, items = bench.setup()
+    function()
+    assert items > 0
+
+
+def test_measure():
+    calls = []
+    loops, timings = runner.measure(lambda: calls.append(None), min_time=0.001, repeat=3)
+    assert len(timings) == 3
+    assert len(calls) >= 3 * loops
+
+
+def test_main_writes_json(tmpdir):
+    path = str(tmpdir.join('results.json'))
+    assert runner.main(['--filter', r'cesu8\.decode', '--min-time', '0.001', '--repeat', '1', '--json', path]) == 0
+    with open(path) as report_file:
+        report = json.load(report_file)
+    assert [result['name'] for result in report['benchmarks']] == \
+        ['cesu8.decode[ascii]', 'cesu8.decode[bmp]', 'cesu8.decode[supplementary]']
+    assert report['benchmarks'][0]['items_per_second'] > 0
+    assert 'python_version' in report['environment']
@@ -50,6 +50,11 @@ def test_cesu8_and_utf8_mixed_decode():
         u'\U0001f40d is a \u03c6\u03af\u03b4\u03b9'
 
 
+def test_utf8_and_cesu8_mixed_decode():
+    encoded = b"\xcf\x86\xce\xaf\xce\xb4\xce\xb9\x20\xed\xa0\xbd\xed\xb0\x8d\x20\xed\x95\x9c"
+    assert encoded.decode('cesu-8') == u'\u03c6\u03af\u03b4\u03b9 \U0001f40d \ud55c'
+
+
 @pytest.mark.parametrize("encoded,unicode_obj", [
     (b"\xed\xa6\x9d\xed\xbd\xb7", u"\U00077777"),
     (b"\xed\xa0\x80\xed\xb0\xb0", u"\U00010030"),
@@ -0,0 +1,137 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import os
+import sys
+import array
+import subprocess
+
+import mock
+import pytest
+###
+from pyhdb import columns
+from pyhdb.exceptions import InterfaceError
+from pyhdb.protocol.types import Int, BigInt, Double, String
+from pyhdb.testing import FakeHanaServer, FakeTable
+
+
+@pytest.fixture
+def fake_connection(request):
+    tables = {
+        'MEASUREMENTS': FakeTable([('ID', 'INTEGER'), ('COUNT', 'BIGINT'), ('VALUE', 'DOUBLE')], num_rows=100),
+        'NUMBERS': FakeTable([('ID', 'INTEGER'), ('NAME', 'NVARCHAR', 20)], num_rows=100),
+    }
+    server = FakeHanaServer(tables, fetch_size=32).start()
+    request.addfinalizer(server.stop)
+    connection = server.connect()
+    request.addfinalizer(connection.close)
+    return connection
+
+
+def test_column_builder_appends_rows():
+    builder = columns.ColumnBuilder((Int, String))
+    builder.append_rows([(1, u'a'), (None, None)])
+    batch = builder.result()
+    assert batch.values == [array.array('i', [1, 0]), [u'a', None]]
+    assert batch.nulls == [array.array('B', [0, 1]), array.array('B', [0, 1])]
+
+
+def test_resultset_dtype():
+    pytest.importorskip('numpy')
+    assert columns.resultset_dtype((Int, String)) is None
+    dtype = columns.resultset_dtype((Int, BigInt, Double))
+    assert dtype.names == ('n0', 'v0', 'n1', 'v1', 'v2')
+    assert dtype.itemsize == 1 + 4 + 1 + 8 + 8
+
+
+def test_missing_numpy_raises():
+    with mock.patch.dict('sys.modules', {'numpy': None}):
+        with pytest.raises(InterfaceError):
+            columns.NumpyColumnBuilder((Int,))
+
+
+def test_missing_pandas_raises_before_fetching(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID FROM MEASUREMENTS")
+    with mock.patch.dict('sys.modules', {'pandas': None}):
+        with pytest.raises(InterfaceError):
+            cursor.fetch_dataframe()
+    assert len(cursor.fetchall()) == 100
+
+
+def test_import_pyhdb_does_not_import_numpy():
+    code = "import sys, pyhdb; print('numpy' in sys.modules or 'pandas' in sys.modules)"
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert output.strip() == b'False'
+
+
+def fetch_rows(connection, statement):
+    cursor = connection.cursor()
+    cursor.execute(statement)
+    return cursor.fetchall()
+
+
+def test_fetch_numpy_fixed_size_rows(fake_connection):
+    numpy = pytest.importorskip('numpy')
+    rows = fetch_rows(fake_connection, "SELECT ID, COUNT, VALUE FROM MEASUREMENTS")
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID, COUNT, VALUE FROM MEASUREMENTS")
+    with mock.patch('pyhdb.protocol.parts.ResultSet.unpack_columns') as unpack_columns:
+        batch = cursor.fetch_numpy()
+    # All result set parts are decoded with the structured dtype
+    assert not unpack_columns.called
+    assert [values.dtype for values in batch.values] == [numpy.int32, numpy.int64, numpy.float64]
+    assert list(zip(*[values.tolist() for values in batch.values])) == rows
+    assert not any(nulls.any() for nulls in batch.nulls)
+
+
+def test_fetch_numpy_with_null_values(fake_connection):
+    numpy = pytest.importorskip('numpy')
+    cursor = fake_connection.cursor()
+    cursor.executemany("INSERT INTO MEASUREMENTS VALUES (?, ?, ?)", [(None, 5, None), (101, None, 2.5)])
+    rows = fetch_rows(fake_connection, "SELECT ID, COUNT, VALUE FROM MEASUREMENTS")
+
+    cursor.execute("SELECT ID, COUNT, VALUE FROM MEASUREMENTS")
+    assert len(cursor.fetch_numpy(10).values[0]) == 10
+    batch = cursor.fetch_numpy()
+    ids, counts, values = batch.values
+    assert ids.tolist()[-2:] == [0, 101]
+    assert [nulls.tolist()[-2:] for nulls in batch.nulls] == [[True, False], [False, True], [True, False]]
+    assert numpy.isnan(values[-2])
+    assert ids.tolist()[:-2] == [row[0] for row in rows[10:-2]]
+
+
+def test_fetch_numpy_mixed_columns(fake_connection):
+    numpy = pytest.importorskip('numpy')
+    rows = fetch_rows(fake_connection, "SELECT ID, NAME FROM NUMBERS")
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID, NAME FROM NUMBERS")
+    ids, names = cursor.fetch_numpy().values
+    assert ids.dtype == numpy.int32
+    assert names.dtype == object
+    assert list(zip(ids.tolist(), names.tolist())) == rows
+
+
+def test_fetch_dataframe(fake_connection):
+    pandas = pytest.importorskip('pandas')
+    cursor = fake_connection.cursor()
+    cursor.executemany("INSERT INTO MEASUREMENTS VALUES (?, ?, ?)", [(None, 5, 1.5)])
+    cursor.execute("SELECT ID, COUNT, VALUE FROM MEASUREMENTS")
+    frame = cursor.fetch_dataframe()
+    assert isinstance(frame, pandas.DataFrame)
+    assert list(frame.columns) == ['ID', 'COUNT', 'VALUE']
+    assert len(frame) == 101
+    # Integer columns with NULL values are converted to floating point
+    assert frame['ID'].isnull().tolist() == [False] * 100 + [True]
+    assert frame['COUNT'].dtype == 'int64'
@@ -0,0 +1,129 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import pytest
+import mock
+###
+from pyhdb.exceptions import InterfaceError, OperationalError
+from pyhdb.protocol.compression import get_compression, ZlibCompression
+from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.segments import RequestSegment, ReplySegment
+from pyhdb.protocol.parts import ConnectOptions
+from pyhdb.protocol.state import ProtocolState
+from pyhdb.protocol.constants import message_types, function_codes, segment_kinds, general
+
+
+def request_message(payload_size, compression):
+    part = mock.Mock()
+    part.pack_buffers.return_value = [b"\x00" * payload_size]
+    return RequestMessage(0, 0, RequestSegment(message_types.EXECUTE, part), compression=compression)
+
+
+def test_get_compression():
+    assert get_compression(None) is None
+    compression = get_compression('zlib', threshold=100)
+    assert isinstance(compression, ZlibCompression)
+    assert compression.threshold == 100
+
+
+def test_get_unknown_compression_raises():
+    with pytest.raises(InterfaceError):
+        get_compression('snappy')
+
+
+def test_zlib_roundtrip():
+    compression = ZlibCompression()
+    data = b"Hello HANA " * 100
+    assert compression.decompress(compression.compress(data), len(data)) == data
+
+
+@pytest.mark.parametrize("uncompressed_size", [10, 2000])
+def test_zlib_decompress_invalid_data_raises(uncompressed_size):
+    compression = ZlibCompression()
+    with pytest.raises(OperationalError):
+        compression.decompress(compression.compress(b"\x00" * 1000)[:-4], uncompressed_size)
+
+
+def test_small_message_is_not_compressed():
+    message = request_message(100, ZlibCompression(threshold=1024))
+    buffers = message.pack_buffers()
+
+    assert message.header.packet_options == 0
+    assert message.header.payload_length == sum(len(buf) for buf in buffers[1:])
+
+
+def test_large_message_is_compressed():
+    compression = ZlibCompression(threshold=1024)
+    message = request_message(4000, compression)
+    buffers = message.pack_buffers()
+    uncompressed = b"".join(request_message(4000, None).pack_buffers())[general.MESSAGE_HEADER_SIZE:]
+
+    assert message.header.packet_options == general.PACKET_OPTION_COMPRESSED
+    assert message.header.varpartsize == len(uncompressed)
+    assert message.header.payload_length == len(buffers[1]) < len(uncompressed)
+    assert compression.decompress(buffers[1], len(uncompressed)) == uncompressed
+
+    assert b"".join(buffers) == request_message(4000, compression).pack().getvalue()
+
+
+def compressed_reply(compression, padding=4000):
+    segment = ReplySegment.header_struct.pack(ReplySegment.header_size, 0, 0, 1, segment_kinds.REPLY,
+                                              function_codes.DDL) + b"\x00" * padding
+    payload = compression.compress(segment)
+    header = ReplyMessage.header_from_raw_header_data(
+        ReplyMessage.header_struct.pack(0, 0, len(payload), len(segment), 1, general.PACKET_OPTION_COMPRESSED)
+    )
+    return header, payload
+
+
+def test_unpack_compressed_reply():
+    compression = ZlibCompression()
+    header, payload = compressed_reply(compression)
+
+    reply = ReplyMessage.unpack_reply(header, mock.Mock(read=lambda: payload), compression)
+    assert reply.segments[0].function_code == function_codes.DDL
+
+
+def test_unpack_compressed_reply_without_compression_raises():
+    header, payload = compressed_reply(ZlibCompression())
+    with pytest.raises(InterfaceError):
+        ReplyMessage.unpack_reply(header, mock.Mock(read=lambda: payload))
+
+
+def connect_reply(options):
+    return ReplyMessage(0, 0, ReplySegment(function_codes.DDL, ConnectOptions(options)))
+
+
+def test_compression_is_negotiated():
+    state = ProtocolState(compression=ZlibCompression())
+    options = state.connect_options()
+    assert options['compression_level_and_flags'] == state.requested_compression.option_value
+
+    state.process_connect_reply(connect_reply({'compression_level_and_flags': options['compression_level_and_flags']}))
+    assert state.compression is state.requested_compression
+
+    # A new connection has to negotiate again:
+    state.initiate()
+    assert state.compression is None
+
+
+def test_compression_is_not_used_if_server_does_not_confirm():
+    state = ProtocolState(compression=ZlibCompression())
+    state.process_connect_reply(connect_reply({'connection_id': 4711}))
+    assert state.compression is None
+
+
+def test_no_compression_requested():
+    state = ProtocolState()
+    assert 'compression_level_and_flags' not in state.connect_options()
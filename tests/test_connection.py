@@ -15,9 +15,17 @@
 # Test additional features of pyhdb.Connection
 
 import os
+import socket
+import struct
 import pytest
+import mock
 
-from pyhdb.connection import Connection
+from pyhdb.connection import Connection, configure_socket
+from pyhdb.exceptions import InterfaceError, OperationalError
+from pyhdb.protocol import constants
+from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.segments import RequestSegment, ReplySegment
+from pyhdb.protocol.constants import message_types, function_codes, segment_kinds
 import pyhdb
 
 
@@ -59,7 +67,190 @@ def test_set_timeout_without_socket():
     assert connection.timeout == 10
 
 
+def test_default_packet_size():
+    connection = Connection("localhost", 30015, "Fuu", "Bar")
+    assert connection.packet_size == constants.MAX_MESSAGE_SIZE
+
+
+def test_set_packet_size_in_init():
+    connection = Connection("localhost", 30015, "Fuu", "Bar", packet_size=2**22)
+    assert connection.packet_size == 2**22
+
+    request = RequestMessage.new(connection, RequestSegment(message_types.COMMIT))
+    request.pack_buffers()
+    assert request.header.varpartsize == 2**22 - constants.general.MESSAGE_HEADER_SIZE
+
+
+@pytest.mark.parametrize("packet_size", [1024, 2**31])
+def test_invalid_packet_size_raises(packet_size):
+    with pytest.raises(InterfaceError):
+        Connection("localhost", 30015, "Fuu", "Bar", packet_size=packet_size)
+
+
 def test_make_connection_from_pytest_ini():
     if not os.path.isfile('pytest.ini'):
         pytest.skip("Requires pytest.ini file")
     connection = pyhdb.connect.from_ini('pytest.ini')
+
+
+def test_sendall_buffers_with_partial_sends():
+    connection = Connection("localhost", 30015, "Fuu", "Bar")
+    connection._socket = mock.Mock()
+    sent_data = []
+
+    def sendmsg(buffers):
+        # Send at most 5 bytes per call to simulate partial sends
+        data = b"".join(buf.tobytes() for buf in buffers)[:5]
+        sent_data.append(data)
+        return len(data)
+    connection._socket.sendmsg.side_effect = sendmsg
+
+    connection._sendall_buffers([b"abc", b"", bytearray(b"defgh"), b"ijklmn"])
+    assert b"".join(sent_data) == b"abcdefghijklmn"
+
+
+def test_sendall_buffers_without_sendmsg():
+    connection = Connection("localhost", 30015, "Fuu", "Bar")
+    connection._socket = mock.Mock(spec=['sendall'])
+
+    connection._sendall_buffers([b"abc", bytearray(b"def")])
+    connection._socket.sendall.assert_called_once_with(b"abcdef")
+
+
+def test_configure_socket_defaults():
+    sock = mock.Mock(spec=['setsockopt'])
+    configure_socket(sock)
+
+    sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt.assert_any_call(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    assert sock.setsockopt.call_count == 2
+
+
+def test_configure_socket_buffer_sizes():
+    sock = mock.Mock(spec=['setsockopt'])
+    configure_socket(sock, tcp_nodelay=None, tcp_keepalive=None, recv_buffer_size=2**22, send_buffer_size=2**20)
+
+    assert sock.setsockopt.call_args_list == [
+        mock.call(socket.SOL_SOCKET, socket.SO_RCVBUF, 2**22),
+        mock.call(socket.SOL_SOCKET, socket.SO_SNDBUF, 2**20),
+    ]
+
+
+@pytest.mark.skipif(not hasattr(socket, 'TCP_KEEPINTVL'), reason="Requires TCP keepalive socket options")
+def test_configure_socket_keepalive_intervals():
+    sock = mock.Mock(spec=['setsockopt'])
+    configure_socket(sock, keepalive_interval=10, keepalive_count=3)
+
+    sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+    sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+
+def test_configure_real_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        configure_socket(sock, recv_buffer_size=2**16)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 2**16
+    finally:
+        sock.close()
+
+
+def test_unknown_socket_option_raises():
+    with pytest.raises(TypeError):
+        Connection("localhost", 30015, "Fuu", "Bar", tcp_no_delay=False)
+
+
+def test_connect_from_ini_with_options(tmpdir):
+    ini_file = tmpdir.join('hana.ini')
+    ini_file.write("[hana]\nhana_host = localhost\nhana_port = 30015\nhana_user = Fuu\nhana_password = Bar\n"
+                   "hostname = ignored\npacket_size = 1048576\ntcp_nodelay = false\nrecv_buffer_size = 4194304\n")
+
+    with mock.patch('pyhdb.Connection') as connection_class:
+        pyhdb.connect.from_ini(str(ini_file))
+    connection_class.assert_called_once_with("localhost", 30015, "Fuu", "Bar", False, packet_size=1048576,
+                                             tcp_nodelay=False, recv_buffer_size=4194304)
+
+
+def _reply_message(function_code):
+    segment = ReplySegment.header_struct.pack(ReplySegment.header_size, 0, 0, 1, segment_kinds.REPLY, function_code)
+    return ReplyMessage.header_struct.pack(4711, 0, len(segment), len(segment), 1, 0) + segment
+
+
+def _connected_connection(received_data):
+    connection = Connection("localhost", 30015, "Fuu", "Bar")
+    connection._socket = mock.Mock(spec=['sendmsg', 'recv_into', 'close'])
+    connection._socket.sendmsg.side_effect = lambda buffers: sum(len(buf) for buf in buffers)
+    # Skip initialization handshake:
+    connection._protocol.initiate()
+    connection._protocol.receive_data(b"\x00" * 8)
+
+    def recv_into(buffer):
+        nbytes = min(len(buffer), len(received_data))
+        buffer[:nbytes] = received_data[:nbytes]
+        del received_data[:nbytes]
+        return nbytes
+    connection._socket.recv_into.side_effect = recv_into
+    return connection
+
+
+def test_small_reply_is_received_with_single_recv():
+    connection = _connected_connection(bytearray(_reply_message(function_codes.DDL)))
+
+    reply = connection.send_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+    assert reply.segments[0].function_code == function_codes.DDL
+    assert connection._socket.recv_into.call_count == 1
+
+
+def test_truncated_reply_raises_operational_error():
+    connection = _connected_connection(bytearray(_reply_message(function_codes.DDL)[:40]))
+
+    sock = connection._socket
+    pending = connection.submit_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+
+    with pytest.raises(OperationalError):
+        connection.send_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+    # The half-read stream is not used for further requests
+    assert connection.closed
+    assert not connection.isconnected()
+    assert sock.close.called
+    with pytest.raises(OperationalError):
+        connection.wait_for_reply(pending)
+
+
+def test_reply_unpack_error_is_raised_for_its_request():
+    connection = _connected_connection(bytearray(_reply_message(function_codes.DDL) +
+                                                 _reply_message(function_codes.INSERT)))
+    first = connection.submit_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+    second = connection.submit_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+
+    unpack_reply = ReplyMessage.unpack_reply
+    errors = [struct.error("unpack requires a buffer of 8 bytes")]
+
+    def failing_unpack_reply(*args):
+        if errors:
+            raise errors.pop()
+        return unpack_reply(*args)
+
+    with mock.patch.object(ReplyMessage, 'unpack_reply', side_effect=failing_unpack_reply):
+        with pytest.raises(struct.error):
+            connection.wait_for_reply(first)
+        # The following reply is still assigned to its request
+        assert connection.wait_for_reply(second).segments[0].function_code == function_codes.INSERT
+    assert not connection._pending_replies
+    assert not connection._protocol._requests
+
+
+def test_failed_send_closes_connection():
+    connection = _connected_connection(bytearray())
+    pending = connection.submit_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+    sock = connection._socket
+    sock.sendmsg.side_effect = ValueError("send failed")
+
+    with pytest.raises(ValueError):
+        connection.submit_request(RequestMessage.new(connection, RequestSegment(message_types.COMMIT)))
+    assert connection.closed
+    assert sock.close.called
+    # Requests sent before fail instead of waiting for replies which never arrive
+    with pytest.raises(OperationalError):
+        connection.wait_for_reply(pending)
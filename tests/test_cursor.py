@@ -13,9 +13,15 @@
 # language governing permissions and limitations under the License.
 
 import pytest
+import mock
 from decimal import Decimal
 
-from pyhdb.cursor import format_operation
+from pyhdb.cursor import Cursor, PreparedStatement, StatementCache, RequestFlow, FlowResult, format_operation, \
+    INITIAL_FETCH_SIZE, MAX_FETCH_SIZE
+from pyhdb.protocol.segments import RequestSegment
+from pyhdb.protocol.parts import ResultSetId, FetchSize
+from pyhdb.protocol import constants
+from pyhdb.protocol.constants import message_types
 from pyhdb.exceptions import ProgrammingError, IntegrityError
 import tests.helper
 
@@ -296,3 +302,188 @@ def test_prepared_decimal(connection, test_table_2):
     cursor.execute("SELECT * FROM PYHDB_TEST_2")
     result = cursor.fetchall()
     assert result == [(Decimal("3.14159265359"),)]
+
+
+@pytest.mark.hanatest
+def test_cursor_execute_batch(connection, test_table_1):
+    cursor = connection.cursor()
+
+    rowcounts = cursor.execute_batch([
+        "INSERT INTO %s VALUES('Statement 1')" % TABLE,
+        ("INSERT INTO %s VALUES(?)" % TABLE, ("Statement 2",)),
+        ("INSERT INTO %s VALUES(?)" % TABLE, ("Statement 3",)),
+        "UPDATE %s SET TEST = 'Statement' WHERE TEST <> 'Statement 3'" % TABLE,
+    ])
+    assert rowcounts == [1, 1, 1, 2]
+
+    cursor.execute("SELECT * FROM %s ORDER BY TEST" % TABLE)
+    assert cursor.fetchall() == [('Statement',), ('Statement',), ('Statement 3',)]
+
+
+@pytest.mark.hanatest
+def test_cursor_execute_batch_raises_error(connection, test_table_1):
+    cursor = connection.cursor()
+    cursor.execute("ALTER TABLE %s ADD CONSTRAINT prim_key PRIMARY KEY (TEST)" % TABLE)
+
+    with pytest.raises(IntegrityError):
+        cursor.execute_batch([
+            "INSERT INTO %s VALUES('Value 1')" % TABLE,
+            "INSERT INTO %s VALUES('Value 1')" % TABLE,
+        ])
+
+
+def test_cursor_split_batch():
+    segments = [(RequestSegment(message_types.FETCHNEXT, (ResultSetId(b"\x01" * 8), FetchSize(i))), i)
+                for i in range(3)]
+    segment_size = len(b"".join(segments[0][0].pack_buffers()))
+
+    assert list(Cursor._split_batch(segments, constants.MAX_SEGMENT_SIZE)) == [segments]
+    assert list(Cursor._split_batch(segments, 2 * segment_size)) == [segments[:2], segments[2:]]
+
+
+def test_request_flow_runs_nested_flows():
+    def inner(request):
+        reply = yield request
+        yield FlowResult(reply.upper())
+
+    def outer():
+        first = yield inner('a')
+        second = yield inner('b')
+        yield FlowResult(first + second)
+
+    flow = RequestFlow(outer())
+    assert flow.start() == 'a'
+    assert flow.send('x') == 'b'
+    assert flow.send('y') is None
+    assert flow.result == 'XY'
+
+
+def test_request_flow_without_requests():
+    def fetch():
+        yield FlowResult(42)
+
+    flow = RequestFlow(fetch())
+    assert flow.start() is None
+    assert flow.result == 42
+
+
+def test_request_flow_raises_request_error_in_yielding_flow():
+    released = []
+
+    def inner():
+        try:
+            yield 'request'
+        finally:
+            released.append(True)
+
+    def outer():
+        try:
+            yield inner()
+        except IntegrityError as error:
+            yield FlowResult(error)
+
+    error = IntegrityError("unique constraint violated")
+    flow = RequestFlow(outer())
+    assert flow.start() == 'request'
+    assert flow.throw(error) is None
+    assert flow.result is error
+    assert released == [True]
+
+    flow = RequestFlow(inner())
+    flow.start()
+    with pytest.raises(IntegrityError):
+        flow.throw(error)
+
+
+def test_statement_cache_evicts_least_recently_used():
+    cache = StatementCache(2)
+    statements = [PreparedStatement(None, statement_id, (), None) for statement_id in (b'1', b'2', b'3')]
+    for statement, prepared_statement in zip('AB', statements):
+        cache.release(cache.put(statement, prepared_statement))
+    cache.release(cache.get('A'))
+    cache.release(cache.put('C', statements[2]))
+    assert cache.take_dropped() == [statements[1]]
+    assert cache.take_dropped() == []
+    assert 'B' not in cache
+    assert cache.get('B') is None
+    assert len(cache) == 2
+
+
+def test_statement_cache_drops_evicted_statements_after_release():
+    cache = StatementCache(1)
+    statements = [PreparedStatement(None, statement_id, (), None) for statement_id in (b'1', b'2')]
+    first = cache.put('A', statements[0])
+    # Another cursor executes A while it is evicted
+    second = cache.get('A')
+    cache.release(cache.put('B', statements[1]))
+    cache.release(first)
+    assert cache.take_dropped() == []
+    cache.release(second)
+    assert [ps.statement_id for ps in cache.take_dropped()] == [b'1']
+
+
+def test_statement_cache_release_after_clear():
+    cache = StatementCache()
+    prepared_statement = cache.put('A', PreparedStatement(None, b'1', (), None))
+    # The connection is closed while the statement is executed
+    cache.clear()
+    cache.release(prepared_statement)
+    assert cache.take_dropped() == []
+
+
+def test_statement_cache_invalidate():
+    cache = StatementCache()
+    statements = [PreparedStatement(None, statement_id, (), None) for statement_id in (b'1', b'2')]
+    cache.release(cache.put('A', statements[0]))
+    in_use = cache.put('B', statements[1])
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.get('A') is None
+    assert [ps.statement_id for ps in cache.take_dropped()] == [b'1']
+    # A statement in use is dropped once it has been released
+    cache.release(in_use)
+    assert [ps.statement_id for ps in cache.take_dropped()] == [b'2']
+
+
+def test_statement_cache_returns_copies():
+    cache = StatementCache()
+    prepared_statement = PreparedStatement(None, b'1', (), None)
+    cache.release(cache.put('A', prepared_statement))
+    assert cache.get('A') is not prepared_statement
+    # A statement prepared concurrently by another cursor does not replace the cached one, it is dropped after use
+    duplicate = cache.put('A', PreparedStatement(None, b'2', (), None))
+    assert cache.get('A').statement_id == b'1'
+    assert cache.take_dropped() == []
+    cache.release(duplicate)
+    assert [ps.statement_id for ps in cache.take_dropped()] == [b'2']
+
+
+def test_statement_cache_disabled():
+    cache = StatementCache(0)
+    prepared_statement = cache.put('A', PreparedStatement(None, b'1', (), None))
+    assert cache.get('A') is None
+    cache.release(prepared_statement)
+    assert [ps.statement_id for ps in cache.take_dropped()] == [b'1']
+
+
+def test_fetch_size_grows_geometrically():
+    cursor = Cursor(mock.Mock(packet_size=2**17))
+    assert cursor._next_fetch_size(1) == INITIAL_FETCH_SIZE
+    assert cursor._next_fetch_size(1) == 2 * INITIAL_FETCH_SIZE
+    assert cursor._next_fetch_size(5000) == 5000
+    assert cursor._next_fetch_size(1) == 10000
+    assert cursor._next_fetch_size(1) == 20000
+    assert cursor._next_fetch_size(1) == MAX_FETCH_SIZE
+
+
+def test_fetch_size_limited_by_packet_size_and_cap():
+    cursor = Cursor(mock.Mock(packet_size=2**17))
+    cursor._bytes_per_row = 2**10
+    assert cursor._next_fetch_size(1000) == 2**7
+    cursor._bytes_per_row = 2**20
+    assert cursor._next_fetch_size(1000) == 1
+
+    cursor._handle_resultset_id(b"\x01" * 8)
+    cursor.max_fetch_size = 200
+    assert cursor._next_fetch_size(1) == INITIAL_FETCH_SIZE
+    assert cursor._next_fetch_size(1) == 200
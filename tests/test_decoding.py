@@ -0,0 +1,122 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+from io import BytesIO
+
+import pytest
+###
+from pyhdb.lib.buffer import BufferReader
+from pyhdb.protocol import decoding, types
+from pyhdb.protocol.parts import ResultSet
+from pyhdb.testing.server import FakeTable, pack_value
+
+COLUMNS = [
+    ('TINY', 'TINYINT'), ('SMALL', 'SMALLINT'), ('ID', 'INTEGER'), ('BIG', 'BIGINT'),
+    ('PRICE', 'DECIMAL', 18, 2), ('RATE', 'REAL'), ('VALUE', 'DOUBLE'), ('NAME', 'NVARCHAR', 20),
+    ('HASH', 'VARBINARY', 8), ('DAY', 'DATE'), ('TIME', 'TIME'), ('CREATED', 'TIMESTAMP'),
+]
+
+
+def build_rows(num_rows, null_every=None):
+    """Return the payload of num_rows synthetic rows, the rows and their column types"""
+    table = FakeTable(COLUMNS, num_rows)
+    rows = []
+    values = []
+    for index in range(num_rows):
+        row = table.row(index)
+        if null_every:
+            row = [None if (index + column_index) % null_every == 0 else value
+                   for column_index, value in enumerate(row)]
+        rows.append(row)
+        values.extend(pack_value(column.type_code, value) for column, value in zip(table.columns, row))
+    column_types = tuple(types.by_type_code[column.type_code] for column in table.columns)
+    return b"".join(values), rows, column_types
+
+
+def unpack_with_from_resultset(payload, num_rows, column_types):
+    payload = BytesIO(payload)
+    return [tuple(typ.from_resultset(payload) for typ in column_types) for _ in range(num_rows)]
+
+
+@pytest.mark.parametrize('null_every', [None, 3])
+def test_row_decoder_matches_from_resultset(null_every):
+    payload, rows, column_types = build_rows(20, null_every)
+    resultset = ResultSet(BufferReader(payload), 20)
+    assert list(resultset.unpack_rows(column_types, None)) == \
+        unpack_with_from_resultset(payload, 20, column_types)
+    assert resultset.payload.tell() == len(payload)
+
+
+def test_row_decoder_is_cached():
+    column_types = (types.Int, types.String)
+    assert decoding.row_decoder(column_types) is decoding.row_decoder((types.Int, types.String))
+    assert decoding.row_decoder(column_types) is not decoding.row_decoder((types.String, types.Int))
+
+
+def test_single_column_rows_are_tuples():
+    decode_row = decoding.compile_row_decoder((types.Double,))
+    view = memoryview(pack_value(types.Double.type_code, 1.5) + pack_value(types.Double.type_code, None))
+    assert decode_row(view, 0, None) == ((1.5,), 8)
+    assert decode_row(view, 8, None) == ((None,), 16)
+
+
+@pytest.mark.parametrize('typ, data', [
+    (types.String, b"\xf6\x2c\x01" + b"a" * 300),
+    (types.String, b"\xff"),
+    (types.Binary, b"\x03abc"),
+    (types.Timestamp, b"\x00\x00\x00\x00\x00\x00\x00\x00"),
+    (types.Decimal, b"\x00" * 15 + b"\x70"),
+])
+def test_from_buffer_matches_from_resultset(typ, data):
+    # Values are unpacked at an offset of a larger buffer
+    view = memoryview(b"\x00" * 3 + data + b"\x00" * 8)
+    assert typ.from_buffer(view, 3) == (typ.from_resultset(BytesIO(data)), 3 + len(data))
+
+
+def test_run_of_fixed_width_columns_with_null_integer_at_end_of_buffer():
+    # The struct of the run (Int, Int) exceeds the buffer if the last value is NULL
+    view = memoryview(pack_value(types.Int.type_code, 7) + pack_value(types.Int.type_code, None))
+    assert decoding.compile_row_decoder((types.Int, types.Int))(view, 0, None) == ((7, None), 6)
+
+
+@pytest.mark.parametrize('null_every', [None, 3])
+def test_lazy_rows_match_tuples(null_every):
+    payload, rows, column_types = build_rows(20, null_every)
+    lazy_rows = list(ResultSet(BufferReader(payload), 20).unpack_rows(column_types, None,
+                                                                        decoding.row_decoder(column_types, lazy=True)))
+    assert all(isinstance(row, decoding.LazyRow) for row in lazy_rows)
+    assert lazy_rows == unpack_with_from_resultset(payload, 20, column_types)
+
+
+def test_lazy_row_decodes_values_on_first_access():
+    payload, rows, column_types = build_rows(1)
+    row = decoding.compile_lazy_row_decoder(column_types)(memoryview(payload), 0, None)[0]
+    expected = unpack_with_from_resultset(payload, 1, column_types)[0]
+    with pytest.raises(IndexError):
+        row[len(column_types)]
+
+    decoders = row._decoders
+    row._decoders = [None] * len(column_types)
+    with pytest.raises(TypeError):
+        row[7]
+    row._decoders = decoders
+    assert row[7] == expected[7]
+    assert row[-1] == expected[-1]
+    assert row[2:4] == expected[2:4]
+
+    # Decoded values are cached
+    row._decoders = [None] * len(column_types)
+    assert row[7] == expected[7]
+    assert len(row) == len(expected)
+
@@ -0,0 +1,366 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import array
+import datetime
+import decimal
+import threading
+
+import pytest
+###
+import pyhdb
+from pyhdb.protocol.constants import message_types
+from pyhdb.protocol.decoding import LazyRow
+from pyhdb.testing import FakeHanaServer, FakeTable
+
+
+@pytest.fixture
+def server(request):
+    tables = {
+        'NUMBERS': FakeTable([('ID', 'INTEGER'), ('NAME', 'NVARCHAR', 20), ('PRICE', 'DECIMAL', 18, 2),
+                              ('DAY', 'DATE'), ('CREATED', 'TIMESTAMP')], num_rows=1000),
+        'DOCUMENTS': FakeTable([('ID', 'INTEGER'), ('CONTENT', 'NCLOB', 5000)], num_rows=3),
+    }
+    server = FakeHanaServer(tables, fetch_size=32).start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture
+def fake_connection(request, server):
+    connection = server.connect()
+    request.addfinalizer(connection.close)
+    return connection
+
+
+def test_connect_and_close(server):
+    connection = server.connect()
+    assert connection.session_id > 0
+    connection.close()
+    assert server.request_counts[message_types.DISCONNECT] == 1
+
+
+def test_connect_with_wrong_password(server):
+    with pytest.raises(pyhdb.DatabaseError) as excinfo:
+        pyhdb.connect(server.host, server.port, server.user, 'wrong password')
+    assert excinfo.value.code == 10
+
+
+def test_select_fetches_synthetic_rows(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT * FROM NUMBERS")
+    assert [column[0] for column in cursor.description] == ['ID', 'NAME', 'PRICE', 'DAY', 'CREATED']
+
+    rows = cursor.fetchall()
+    assert len(rows) == 1000
+    assert rows[42] == (42, u'name 42 name 42 name', decimal.Decimal('0.42'), datetime.date(2000, 2, 12),
+                        datetime.datetime(2000, 1, 1, 0, 0, 42))
+    # First 32 rows came with the reply of the query
+    assert server.request_counts[message_types.FETCHNEXT] == 1
+
+
+def test_abandoned_resultsets_are_closed(server, fake_connection):
+    session = list(server._sessions)[0]
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT * FROM NUMBERS")
+    cursor.fetchone()
+    assert len(session._resultsets) == 1
+
+    # The result set is closed together with the next request, not with a request of its own
+    cursor.execute("SELECT * FROM NUMBERS LIMIT 10")
+    assert server.request_counts[message_types.CLOSERESULTSET] == 1
+    assert len(session._resultsets) == 0
+    # The server already closed the completely fetched result set
+    cursor.close()
+    assert server.request_counts[message_types.CLOSERESULTSET] == 1
+
+    # Cursors are garbage collected without being closed
+    fake_connection.cursor().execute("SELECT * FROM NUMBERS")
+    fake_connection.commit()
+    assert server.request_counts[message_types.CLOSERESULTSET] == 2
+    assert len(session._resultsets) == 0
+
+
+def test_batch_keeps_only_last_resultset_open(server, fake_connection):
+    session = list(server._sessions)[0]
+    cursor = fake_connection.cursor()
+    cursor.execute_batch([("SELECT * FROM NUMBERS", None)] * 3)
+    # The result sets of the first two statements are closed with the next request
+    fake_connection.commit()
+    assert len(session._resultsets) == 1
+    assert cursor.fetchone()[0] == 0
+    cursor.close()
+    fake_connection.commit()
+    assert len(session._resultsets) == 0
+
+
+def test_iterate_cursor(fake_connection):
+    cursor = fake_connection.cursor()
+    with pytest.raises(pyhdb.ProgrammingError):
+        next(iter(cursor))
+    cursor.execute("SELECT ID FROM NUMBERS")
+    assert cursor.fetchone() == (0,)
+    assert [row[0] for row in cursor] == list(range(1, 1000))
+    assert cursor.fetchall() == []
+
+
+def test_iter_batches(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID FROM NUMBERS LIMIT 250")
+    assert [len(batch) for batch in cursor.iter_batches(100)] == [100, 100, 50]
+
+
+def test_fetch_columns(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID, NAME FROM NUMBERS")
+    assert cursor.fetchone() == (0, server.tables['NUMBERS'].value(0, 1))
+    # Rows of the first part and of a FETCHNEXT reply
+    batch = cursor.fetch_columns(50)
+    ids, names = batch.values
+    assert isinstance(ids, array.array)
+    assert list(ids) == list(range(1, 51))
+    assert names == [server.tables['NUMBERS'].value(index, 1) for index in range(1, 51)]
+    assert [list(nulls) for nulls in batch.nulls] == [[0] * 50, [0] * 50]
+    assert cursor.fetchone()[0] == 51
+
+
+def test_fetch_columns_with_null_values(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("CREATE TABLE MEASUREMENTS (ID INTEGER, VALUE DOUBLE, UNIT NVARCHAR(10))")
+    cursor.executemany("INSERT INTO MEASUREMENTS VALUES (?, ?, ?)", [(1, 0.5, None), (2, None, u'kg')])
+    cursor.execute("SELECT * FROM MEASUREMENTS")
+    batch = cursor.fetch_columns(10)
+    assert [list(values) for values in batch.values] == [[1, 2], [0.5, 0.0], [None, u'kg']]
+    assert [list(nulls) for nulls in batch.nulls] == [[0, 0], [0, 1], [1, 0]]
+    assert cursor.fetch_columns(10).values == [array.array('i'), array.array('d'), []]
+
+
+def test_lazy_rows(fake_connection):
+    expected = fake_connection.cursor()
+    expected.execute("SELECT * FROM NUMBERS")
+    cursor = fake_connection.cursor()
+    cursor.lazy_rows = True
+    cursor.execute("SELECT * FROM NUMBERS")
+    rows = cursor.fetchall()
+    assert isinstance(rows[0], LazyRow)
+    assert rows == expected.fetchall()
+
+    cursor.execute("SELECT ID, CONTENT FROM DOCUMENTS")
+    documents = list(cursor)
+    assert [row[0] for row in documents] == [0, 1, 2]
+    expected.execute("SELECT ID, CONTENT FROM DOCUMENTS")
+    assert [row[1].read() for row in documents] == [row[1].read() for row in expected]
+
+
+def test_fetch_size_cap(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.max_fetch_size = 100
+    cursor.execute("SELECT ID FROM NUMBERS")
+    # More rows than fit into a single FETCHNEXT reply
+    assert cursor.fetchmany(500) == [(index,) for index in range(500)]
+    assert len(cursor.fetchall()) == 500
+    # 32 rows are sent with the reply of the query
+    assert server.request_counts[message_types.FETCHNEXT] == 10
+
+
+def test_prefetch(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.prefetch = 2
+    cursor.execute("SELECT ID FROM NUMBERS")
+    assert cursor.fetchmany(100) == [(index,) for index in range(100)]
+    # Two further batches are on their way while the rows are processed
+    assert len(cursor._prefetched) == 2
+
+    # Replies to the prefetch requests are received before the replies of other requests
+    other = fake_connection.cursor()
+    other.execute("SELECT ID FROM NUMBERS WHERE ID = ?", [7])
+    assert other.fetchall() == [(7,)]
+
+    rows = cursor.fetchall()
+    assert rows == [(index,) for index in range(100, 1000)]
+    assert not cursor._prefetched
+    # Failing requests sent after the last rows do not disturb later requests
+    cursor.execute("SELECT ID FROM NUMBERS LIMIT 1")
+    assert cursor.fetchall() == [(0,)]
+
+
+def test_prefetch_abandoned_resultset(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.prefetch = 3
+    cursor.execute("SELECT ID FROM NUMBERS")
+    assert len(cursor.fetchmany(50)) == 50
+    cursor.execute("SELECT ID FROM NUMBERS LIMIT 2")
+    assert cursor.fetchall() == [(0,), (1,)]
+    assert server.request_counts[message_types.CLOSERESULTSET] == 1
+
+
+def test_select_columns_with_limit(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT id, name FROM numbers LIMIT 3")
+    assert cursor.fetchall() == [(0, u'name 0 name 0 name 0'), (1, u'name 1 name 1 name 1'),
+                                 (2, u'name 2 name 2 name 2')]
+
+
+def test_select_with_condition(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID, PRICE FROM NUMBERS WHERE ID = ?", [42])
+    assert cursor.fetchall() == [(42, decimal.Decimal('0.42'))]
+    cursor.execute("SELECT ID FROM NUMBERS WHERE DAY = '2000-01-03'")
+    assert cursor.fetchall() == [(2,)]
+    cursor.execute("SELECT ID FROM NUMBERS WHERE ID = NULL")
+    assert cursor.fetchall() == []
+
+
+def test_statement_cache_reuses_prepared_statements(server, fake_connection):
+    statement = "SELECT ID FROM NUMBERS WHERE ID = ?"
+    for value in (1, 2):
+        cursor = fake_connection.cursor()
+        cursor.execute(statement, [value])
+        assert cursor.fetchall() == [(value,)]
+    assert cursor.execute_batch([(statement, [3]), (statement, [4])]) == [-1, -1]
+    assert server.request_counts[message_types.PREPARE] == 1
+
+
+def test_statement_cache_invalidated_by_set_schema(server, fake_connection):
+    statement = "SELECT ID FROM NUMBERS WHERE ID = ?"
+    cursor = fake_connection.cursor()
+    cursor.execute(statement, [1])
+    cursor.execute("SET SCHEMA OTHER")
+    assert statement not in fake_connection._statement_cache
+    # The statement is prepared in the new schema, the old one is dropped together with the PREPARE request
+    assert cursor.execute(statement, [2]).fetchall() == [(2,)]
+    assert server.request_counts[message_types.PREPARE] == 2
+    assert server.request_counts[message_types.DROPSTATEMENTID] == 1
+    assert len(list(server._sessions)[0]._statements) == 1
+
+    cursor.execute_batch([(statement, [3]), "set schema PYHDB"])
+    assert statement not in fake_connection._statement_cache
+
+
+def test_statement_cache_drops_evicted_statements(server):
+    connection = server.connect(statement_cache_size=1)
+    cursor = connection.cursor()
+    cursor.execute("SELECT ID FROM NUMBERS WHERE ID = ?", [1])
+    cursor.execute("SELECT NAME FROM NUMBERS WHERE ID = ?", [1])
+    # The evicted statement is dropped together with the next request, not with a request of its own
+    assert server.request_counts[message_types.DROPSTATEMENTID] == 0
+    packet_count = connection.packet_count
+    # The evicted statement is prepared again
+    cursor.execute("SELECT ID FROM NUMBERS WHERE ID = ?", [2])
+    assert cursor.fetchall() == [(2,)]
+    assert connection.packet_count == packet_count + 2
+    assert server.request_counts[message_types.PREPARE] == 3
+    assert server.request_counts[message_types.DROPSTATEMENTID] == 1
+    connection.commit()
+    assert server.request_counts[message_types.DROPSTATEMENTID] == 2
+    connection.close()
+
+
+def test_statement_cache_shared_by_concurrent_cursors(server):
+    connection = server.connect(statement_cache_size=1)
+    statements = ["SELECT ID FROM NUMBERS WHERE ID = ?", "SELECT NAME FROM NUMBERS WHERE ID = ?"]
+    errors = []
+
+    def run(thread_index):
+        cursor = connection.cursor()
+        try:
+            for index in range(100):
+                cursor.execute(statements[(thread_index + index) % 2], [index % 10 + 1])
+                assert len(cursor.fetchall()) == 1
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(thread_index,)) for thread_index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Statements evicted while another cursor executes them are only dropped after that execution
+    assert errors == []
+    assert len(connection._statement_cache) == 1
+    connection.commit()
+    assert server.request_counts[message_types.DROPSTATEMENTID] == server.request_counts[message_types.PREPARE] - 1
+    connection.close()
+
+
+def test_unexpected_server_error_is_sent_as_error_reply(server, fake_connection):
+    session = list(server._sessions)[0]
+
+    def failing_commit(parts):
+        raise TypeError("sequence item 2: expected string, bytearray found")
+    session._handlers[message_types.COMMIT] = failing_commit
+
+    with pytest.raises(pyhdb.DatabaseError) as excinfo:
+        fake_connection.commit()
+    assert 'general error' in str(excinfo.value)
+    # The session is still usable
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT ID FROM NUMBERS LIMIT 1")
+    assert cursor.fetchall() == [(0,)]
+
+
+def test_select_dummy(fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT * FROM DUMMY")
+    assert cursor.fetchall() == [(u'X',)]
+
+
+def test_unknown_table_raises_error(fake_connection):
+    cursor = fake_connection.cursor()
+    with pytest.raises(pyhdb.DatabaseError) as excinfo:
+        cursor.execute("SELECT * FROM UNKNOWN")
+    assert excinfo.value.code == 259
+
+
+def test_read_lob(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("SELECT CONTENT FROM DOCUMENTS")
+    lob = cursor.fetchone()[0]
+    assert len(lob) == 5000
+    assert lob.read() == (u'content 0 ' * 500)
+    assert server.request_counts[message_types.READLOB] == 1
+
+
+def test_insert_and_select(server, fake_connection):
+    cursor = fake_connection.cursor()
+    cursor.execute("CREATE TABLE ITEMS (ID INTEGER, NAME NVARCHAR(10), DATA BLOB)")
+    cursor.executemany("INSERT INTO ITEMS VALUES (?, ?, ?)",
+                       [(1, u'first', b'\x01' * 10), (2, None, b'\x02' * 300000)])
+    # The second blob does not fit into the EXECUTE request and is sent with WRITELOB requests
+    assert server.request_counts[message_types.WRITELOB] > 0
+    cursor.execute("INSERT INTO ITEMS (ID, NAME) VALUES (3, 'it''s')")
+    assert cursor.rowcount == 1
+
+    cursor.execute("SELECT ID, NAME, DATA FROM ITEMS")
+    rows = cursor.fetchall()
+    assert [row[:2] for row in rows] == [(1, u'first'), (2, None), (3, u"it's")]
+    assert rows[0][2].read() == b'\x01' * 10
+    assert rows[1][2].read() == b'\x02' * 300000
+    assert rows[2][2] is None
+
+    cursor.execute("DELETE FROM ITEMS")
+    assert cursor.rowcount == 3
+    cursor.execute("DROP TABLE ITEMS")
+    assert 'ITEMS' not in server.tables
+
+
+def test_compression(server):
+    connection = server.connect(compression='zlib')
+    try:
+        assert connection.compression is not None
+        cursor = connection.cursor()
+        cursor.execute("SELECT * FROM NUMBERS")
+        assert len(cursor.fetchall()) == 1000
+    finally:
+        connection.close()
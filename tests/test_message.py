@@ -19,6 +19,8 @@ from io import BytesIO
 from pyhdb.connection import Connection
 from pyhdb.protocol.segments import RequestSegment
 from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.parts import ResultSetId, FetchSize
+from pyhdb.protocol.constants import message_types
 
 
 class DummySegment(RequestSegment):
@@ -121,6 +123,35 @@ class TestRequestRequestMessage(object):
         # payload
         assert packed[32:42] == b"\x00" * 10
 
+    def test_pack_buffers_matches_pack(self):
+        segment = RequestSegment(message_types.FETCHNEXT, (ResultSetId(b"\x01" * 8), FetchSize(3)))
+
+        packed = RequestMessage(0, 0, [segment]).pack().getvalue()
+        buffers = RequestMessage(0, 0, [segment]).pack_buffers()
+        assert len(buffers) > 1
+        assert b"".join(buffers) == packed
+
+    def test_pack_multiple_segments(self):
+        segments = [RequestSegment(message_types.FETCHNEXT, (ResultSetId(b"\x01" * 8), FetchSize(i)))
+                    for i in range(3)]
+
+        packed = RequestMessage(0, 0, segments).pack().getvalue()
+        assert b"".join(RequestMessage(0, 0, segments).pack_buffers()) == packed
+
+        offset = 0
+        for number, segment in enumerate(segments, 1):
+            assert segment.header.segment_number == number
+            assert segment.header.segment_offset == offset
+            offset += segment.header.segment_length
+        assert len(packed) == 32 + offset
+
+    def test_packet_size_limits_segment_payload(self):
+        part = mock.Mock()
+        part.pack_buffers.return_value = [b"\x00" * 16]
+
+        RequestMessage(0, 0, [RequestSegment(message_types.EXECUTE, part)], packet_size=2**20).pack_buffers()
+        part.pack_buffers.assert_called_once_with(2**20 - RequestMessage.header_size - RequestSegment.header_size)
+
 
 class TestReplyRequestMessage(object):
 
@@ -16,6 +16,7 @@ import pytest
 from io import BytesIO
 ###
 from pyhdb.protocol.parts import Part, PART_MAPPING
+from pyhdb.lib.buffer import BufferReader
 from pyhdb.exceptions import InterfaceError
 
 
@@ -148,3 +149,17 @@ class TestPartMetaClass(object):
         gc.collect()
 
         assert 124 not in PART_MAPPING
+
+
+class TestBufferedPart(object):
+
+    def test_unpack_part_from_buffer_reader(self):
+        packed = BufferReader(bytearray(
+            b'\x7F\x00\x0A\x00\x00\x00\x00\x00\x0A\x00\x00\x00\x00\x00\x00\x00' +
+            b'\x00' * 16
+        ))
+
+        unpacked = tuple(DummyPart.unpack_from(packed, 1))
+        assert len(unpacked) == 1
+        assert unpacked[0].zeros == 10
+        assert packed.tell() == 32
@@ -0,0 +1,156 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import pytest
+import mock
+###
+from pyhdb.pool import ConnectionPool
+from pyhdb.exceptions import PoolTimeoutError, InterfaceError, OperationalError
+
+
+def _mock_connection(*args, **kwargs):
+    connection = mock.Mock()
+    connection.closed = False
+    return connection
+
+
+@pytest.fixture
+def pool(request):
+    patcher = mock.patch('pyhdb.pool.Connection', side_effect=_mock_connection)
+    patcher.start()
+    request.addfinalizer(patcher.stop)
+    return ConnectionPool("localhost", 30015, "Fuu", "Bar", max_size=2, checkout_timeout=0)
+
+
+def test_pool_opens_min_size_connections():
+    with mock.patch('pyhdb.pool.Connection', side_effect=_mock_connection):
+        pool = ConnectionPool("localhost", 30015, "Fuu", "Bar", min_size=2, max_size=3)
+    assert pool.size == 2
+    assert pool.idle == 2
+
+
+def test_pool_invalid_size():
+    with pytest.raises(InterfaceError):
+        ConnectionPool("localhost", 30015, "Fuu", "Bar", min_size=3, max_size=2)
+
+
+def test_pool_checkout_is_lifo(pool):
+    conn1 = pool.get_connection()
+    conn2 = pool.get_connection()
+    pool.release(conn1)
+    pool.release(conn2)
+
+    assert pool.get_connection() is conn2
+    assert pool.get_connection() is conn1
+
+
+def test_pool_checkout_timeout(pool):
+    pool.get_connection()
+    pool.get_connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection()
+
+
+def test_pool_reset_on_return(pool):
+    connection = pool.get_connection()
+    pool.release(connection)
+
+    connection._close_cursors.assert_called_once_with()
+    connection.rollback.assert_called_once_with()
+    assert pool.idle == 1
+
+
+def test_pool_discards_connection_when_reset_fails(pool):
+    connection = pool.get_connection()
+    connection.rollback.side_effect = OperationalError("Lost connection")
+    pool.release(connection)
+
+    assert pool.idle == 0
+    assert pool.size == 0
+
+
+def test_pool_release_unknown_connection(pool):
+    with pytest.raises(InterfaceError):
+        pool.release(_mock_connection())
+
+
+def test_pool_validates_idle_connection(pool):
+    pool.validation_interval = 0
+    connection = pool.get_connection()
+    pool.release(connection)
+
+    connection.cursor.return_value.execute.side_effect = OperationalError("Lost connection")
+    new_connection = pool.get_connection()
+    assert new_connection is not connection
+    connection.close.assert_called_once_with()
+    assert pool.size == 1
+
+
+def test_pool_discards_connections_after_fork(pool):
+    connection = pool.get_connection()
+    pool.release(connection)
+
+    with mock.patch('os.getpid', return_value=-1):
+        new_connection = pool.get_connection()
+    assert new_connection is not connection
+    assert not connection.close.called
+    assert pool.size == 1
+
+
+def test_pool_refills_to_min_size():
+    with mock.patch('pyhdb.pool.Connection', side_effect=_mock_connection):
+        pool = ConnectionPool("localhost", 30015, "Fuu", "Bar", min_size=2, max_size=3, validation_interval=0)
+        connection = pool.get_connection()
+        connection.rollback.side_effect = OperationalError("Lost connection")
+        pool.release(connection)
+        assert pool.size == 2
+        assert pool.idle == 2
+
+        # Idle connections failing validation are replaced
+        for idle_connection, _ in pool._idle:
+            idle_connection.cursor.return_value.execute.side_effect = OperationalError("Lost connection")
+        pool.get_connection()
+        pool.release(pool.get_connection())
+        assert pool.size == 2
+
+        with mock.patch('os.getpid', return_value=-1):
+            connection = pool.get_connection()
+            assert pool.size == 2
+            assert pool.idle == 1
+
+
+def test_pool_refill_failure_is_ignored(pool):
+    pool.min_size = 1
+    connection = pool.get_connection()
+    connection.closed = True
+    with mock.patch('pyhdb.pool.Connection', side_effect=OperationalError("Connection refused")):
+        pool.release(connection)
+    assert pool.size == 0
+
+
+def test_pool_close(pool):
+    with pool.connection() as connection:
+        pass
+    pool.close()
+
+    connection.close.assert_called_once_with()
+    assert pool.size == 0
+    assert pool.closed
+
+
+def test_pool_passes_connection_options():
+    with mock.patch('pyhdb.pool.Connection', side_effect=_mock_connection) as connection_class:
+        ConnectionPool("localhost", 30015, "Fuu", "Bar", min_size=1, packet_size=2**20, tcp_nodelay=False)
+    connection_class.assert_called_once_with("localhost", 30015, "Fuu", "Bar", False, None,
+                                             packet_size=2**20, tcp_nodelay=False)
@@ -0,0 +1,166 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import pytest
+###
+from pyhdb.exceptions import InterfaceError
+from pyhdb.protocol.state import ProtocolState, INITIALIZATION_BYTES, READ_BUFFER_SIZE
+from pyhdb.protocol.message import RequestMessage, ReplyMessage
+from pyhdb.protocol.segments import RequestSegment, ReplySegment
+from pyhdb.protocol.constants import message_types, function_codes, segment_kinds
+
+INIT_REPLY = b"\x04\x14\x00\x04\x01\x00\x00\x00"
+
+
+def reply_message(function_code, session_id=4711, padding=0):
+    segment = ReplySegment.header_struct.pack(ReplySegment.header_size, 0, 0, 1, segment_kinds.REPLY, function_code)
+    segment += b"\x00" * padding
+    return ReplyMessage.header_struct.pack(session_id, 0, len(segment), len(segment), 1, 0) + segment
+
+
+def receive(state, data):
+    """Receive data like a transport with recv_into(), returns number of calls"""
+    calls = 0
+    while data:
+        buf = state.get_buffer()
+        nbytes = min(len(buf), len(data))
+        buf[:nbytes] = data[:nbytes]
+        state.buffer_updated(nbytes)
+        data = data[nbytes:]
+        calls += 1
+    return calls
+
+
+@pytest.fixture
+def state():
+    state = ProtocolState()
+    state.initiate()
+    state.receive_data(INIT_REPLY)
+    return state
+
+
+def test_initialization_handshake():
+    state = ProtocolState()
+    assert state.initiate() == bytes(INITIALIZATION_BYTES)
+    assert not state.handshake_done
+    assert state.bytes_expected == 8
+
+    state.receive_data(INIT_REPLY)
+    assert state.handshake_done
+    assert state.product_version == (4, 20)
+    assert state.protocol_version == (4, 1)
+
+
+def test_pack_request_before_handshake_raises():
+    state = ProtocolState()
+    with pytest.raises(InterfaceError):
+        state.pack_request(RequestMessage(0, 0, RequestSegment(message_types.COMMIT)))
+
+
+def test_receive_data_byte_by_byte(state):
+    request = RequestMessage(0, state.get_next_packet_count(), RequestSegment(message_types.COMMIT))
+    buffers = state.pack_request(request)
+    assert b"".join(buffers) == request.pack().getvalue()
+    assert state.pending_replies == 1
+
+    data = reply_message(function_codes.DDL)
+    for i in range(len(data)):
+        assert state.next_reply() is None
+        state.receive_data(data[i:i + 1])
+
+    reply = state.next_reply()
+    assert reply.segments[0].function_code == function_codes.DDL
+    assert state.next_reply() is None
+    assert state.pending_replies == 0
+    assert state.session_id == 4711
+    assert state.packet_count == -1
+
+
+def test_close_resultset_is_piggybacked(state):
+    state.close_resultset(b"\x01" * 8)
+    request = RequestMessage(0, state.get_next_packet_count(), RequestSegment(message_types.COMMIT))
+    state.pack_request(request)
+    assert [segment.message_type for segment in request.segments] == \
+        [message_types.COMMIT, message_types.CLOSERESULTSET]
+
+    segments = b"".join(
+        ReplySegment.header_struct.pack(ReplySegment.header_size, 0, 0, number, segment_kinds.REPLY, 0)
+        for number in (1, 2)
+    )
+    state.receive_data(ReplyMessage.header_struct.pack(4711, 0, len(segments), len(segments), 2, 0) + segments)
+    # The reply to the piggybacked segment is skipped
+    assert len(state.next_reply().segments) == 1
+
+    request = RequestMessage(0, state.get_next_packet_count(), RequestSegment(message_types.COMMIT))
+    state.pack_request(request)
+    assert len(request.segments) == 1
+
+
+def test_drop_statement_is_piggybacked(state):
+    state.close_resultset(b"\x01" * 8)
+    state.drop_statement(b"\x02" * 8)
+    request = RequestMessage(0, state.get_next_packet_count(), RequestSegment(message_types.COMMIT))
+    state.pack_request(request)
+    assert [segment.message_type for segment in request.segments] == \
+        [message_types.COMMIT, message_types.CLOSERESULTSET, message_types.DROPSTATEMENTID]
+    assert request.segments[2].parts[0].statement_id == b"\x02" * 8
+
+
+def test_close_resultset_not_piggybacked_onto_disconnect(state):
+    state.close_resultset(b"\x01" * 8)
+    request = RequestMessage(0, state.get_next_packet_count(), RequestSegment(message_types.DISCONNECT))
+    state.pack_request(request)
+    assert len(request.segments) == 1
+
+
+def test_receive_multiple_replies_at_once(state):
+    state.receive_data(reply_message(function_codes.DDL) + reply_message(function_codes.DISCONNECT))
+
+    assert state.next_reply().segments[0].function_code == function_codes.DDL
+    assert state.next_reply().segments[0].function_code == function_codes.DISCONNECT
+    assert state.next_reply() is None
+
+
+def test_receive_into_buffer(state):
+    assert receive(state, reply_message(function_codes.DDL)) == 1
+    assert state.next_reply().segments[0].function_code == function_codes.DDL
+
+
+def test_receive_into_buffer_reuses_read_buffer(state):
+    read_buffer = state._read_buffer
+    assert len(state.get_buffer()) == READ_BUFFER_SIZE
+
+    assert receive(state, reply_message(function_codes.DDL) + reply_message(function_codes.DISCONNECT)) == 1
+    assert state.next_reply().segments[0].function_code == function_codes.DDL
+    assert state.next_reply().segments[0].function_code == function_codes.DISCONNECT
+
+    assert len(state.get_buffer()) == READ_BUFFER_SIZE
+    assert state._read_buffer is read_buffer
+
+
+def test_receive_large_payload_directly(state):
+    data = reply_message(function_codes.DDL, padding=3 * READ_BUFFER_SIZE)
+
+    # Header and start of payload are read ahead, the rest is received into the payload buffer:
+    state.receive_data(data[:100])
+    assert state.bytes_expected == len(data) - 100
+    buffer = state.get_buffer()
+    assert len(buffer) == len(data) - 100
+    buffer[:] = data[100:]
+    state.buffer_updated(len(buffer))
+
+    reply = state.next_reply()
+    assert reply.segments[0].function_code == function_codes.DDL
+    # The next header is read ahead again
+    assert len(state.get_buffer()) == READ_BUFFER_SIZE
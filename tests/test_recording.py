@@ -0,0 +1,91 @@
+# Copyright 2014, 2015 SAP SE.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http: //www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+# either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+import pytest
+###
+from pyhdb.exceptions import InterfaceError, OperationalError
+from pyhdb.protocol.constants import function_codes
+from pyhdb.testing import FakeHanaServer, FakeTable, Recording, RecordingConnection, ReplayConnection
+from pyhdb.testing.recording import SENT, RECEIVED
+
+
+@pytest.fixture(scope='module')
+def recorded_session(request):
+    tables = {'DOCUMENTS': FakeTable([('ID', 'INTEGER'), ('CONTENT', 'NCLOB', 3000)], num_rows=100)}
+    with FakeHanaServer(tables) as server:
+        connection = RecordingConnection(server.host, server.port, server.user, server.password)
+        connection.connect()
+        cursor = connection.cursor()
+        cursor.execute("SELECT * FROM DOCUMENTS")
+        rows = cursor.fetchall()
+        content = rows[0][1].read()
+        connection.close()
+    return connection.recording, rows, content
+
+
+def _replay_session(recording):
+    connection = ReplayConnection(recording)
+    connection.connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT * FROM DOCUMENTS")
+    rows = cursor.fetchall()
+    content = rows[0][1].read()
+    connection.close()
+    return rows, content
+
+
+def test_recording_alternates_requests_and_replies(recorded_session):
+    recording = recorded_session[0]
+    directions = [direction for direction, _ in recording.records]
+    assert directions == [SENT, RECEIVED] * (len(directions) // 2)
+
+
+def test_recording_replies(recorded_session):
+    replies = list(recorded_session[0].replies())
+    # Authenticate, connect, select, fetchnext, readlob, disconnect
+    assert len(replies) == 6
+    assert replies[2].segments[0].function_code == function_codes.SELECT
+    assert replies[-1].segments[0].function_code == function_codes.DISCONNECT
+
+
+def test_replay_session(recorded_session):
+    recording, rows, content = recorded_session
+    replayed_rows, replayed_content = _replay_session(recording)
+    assert [row[0] for row in replayed_rows] == [row[0] for row in rows]
+    assert replayed_content == content
+
+
+@pytest.mark.parametrize('filename', ['session.rec', 'session.rec.gz'])
+def test_save_and_load_recording(tmpdir, recorded_session, filename):
+    recording = recorded_session[0]
+    path = str(tmpdir.join(filename))
+    recording.save(path)
+
+    loaded = Recording.load(path)
+    assert loaded.records == recording.records
+    assert _replay_session(path)[1] == recorded_session[2]
+
+
+def test_load_invalid_recording(tmpdir):
+    path = tmpdir.join('invalid.rec')
+    path.write('no recording')
+    with pytest.raises(InterfaceError):
+        Recording.load(str(path))
+
+
+def test_replay_beyond_recording(recorded_session):
+    recording = Recording(recorded_session[0].records[:4])  # handshake and authentication only
+    connection = ReplayConnection(recording)
+    with pytest.raises(OperationalError):
+        connection.connect()
@@ -79,6 +79,11 @@ def test_all_types_with_code_has_method_from_resultset():
         assert callable(typ.from_resultset)
 
 
+def test_all_types_with_code_has_method_from_buffer():
+    for typ in types.by_type_code.values():
+        assert callable(getattr(typ, "from_buffer", None))
+
+
 def test_all_types_with_python_type_has_method_to_sql():
     for typ in types.by_python_type.values():
         assert hasattr(typ, "to_sql")
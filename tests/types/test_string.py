@@ -85,6 +85,15 @@ def test_escape_binary(given, expected):
     assert types.Binary.to_sql(given) == expected
 
 
+@pytest.mark.parametrize("given,expected", [
+    (None, b"\x0D\xFF"),
+    (byte_type(b"\xFF\x00\xFF\xA3\x5B"), b"\x0D\x05\xFF\x00\xFF\xA3\x5B"),
+    (b"\x75\x08\x15", b"\x0D\x03\x75\x08\x15"),
+])
+def test_pack_binary(given, expected):
+    assert types.Binary.prepare(given) == expected
+
+
 # ########################## Test value packing #####################################
 
 @pytest.mark.parametrize("given,expected", [